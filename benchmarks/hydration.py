@@ -0,0 +1,98 @@
+#! -*- coding: utf-8 -*-
+'''
+Cost of turning stored items into models, microseconds per item.
+
+"two pass" is the former path, the field values read into a dict then
+passed to the model constructor; "load" is Table.load, one model filled in
+from the item. Both engines are measured on the items of the in-memory
+backend, numbers as Decimal for the resource layer and wire values for the
+client.
+
+    python benchmarks/hydration.py [items]
+'''
+from __future__ import print_function
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dynamodb import connection
+from dynamodb.model import Model
+from dynamodb.fields import (CharField, IntegerField, FloatField,
+                             DictField, ListField)
+from dynamodb.table import get_table
+
+ROUNDS = 5
+
+
+class Movies(Model):
+
+    __table_name__ = 'Movies'
+    ReadCapacityUnits = 10
+    WriteCapacityUnits = 10
+
+    year = IntegerField(name='year', hash_key=True)
+    title = CharField(name='title', range_key=True)
+    rating = FloatField(name='rating')
+    rank = IntegerField(name='rank')
+    plot = CharField(name='plot')
+    genres = ListField(name='genres', default=[])
+    info = DictField(name='info', default={})
+
+
+def stored_items():
+    # every item of the table, as the engine of Movies reads them
+    table = get_table(Movies())
+    items, params = [], {}
+    while True:
+        response = table.scan(**params)
+        items.extend(response['Items'])
+        if not response.get('LastEvaluatedKey'):
+            return table, items
+        params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def best(func, items):
+    samples = []
+    for _ in range(ROUNDS):
+        start = time.time()
+        func(items)
+        samples.append(time.time() - start)
+    return min(samples) / len(items) * 1e6
+
+
+def two_pass(table):
+    def run(items):
+        for item in items:
+            Movies(**table.read_values(item))
+    return run
+
+
+def single_pass(table):
+    def run(items):
+        for item in items:
+            table.load(item)
+    return run
+
+
+def main(count=10000):
+    connection.configure(mode='memory', endpoint='benchmark')
+    from dynamodb import memory
+    memory.backend('benchmark', page_size=None)
+    get_table(Movies()).create()
+    Movies.batch_write(
+        dict(year=1992, title=u'title %d' % i, rating=7.5, rank=i,
+             plot=u'plot', genres=[u'drama'], info={u'votes': i})
+        for i in range(count))
+    for engine in ('resource', 'client'):
+        Movies.__engine__ = engine
+        table, items = stored_items()
+        print('%-8s two pass %6.1f us/item  load %6.1f us/item' % (
+            engine, best(two_pass(table), items),
+            best(single_pass(table), items)))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
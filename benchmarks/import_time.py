@@ -0,0 +1,53 @@
+#! -*- coding: utf-8 -*-
+'''
+Cold start cost of `import dynamodb.model`.
+
+Every sample runs in a fresh interpreter. "import" only declares a model,
+"import + connect" also builds the boto3 resource, which is what importing
+the package used to cost before the connection became lazy.
+
+    python benchmarks/import_time.py [rounds]
+'''
+from __future__ import print_function
+
+import os
+import sys
+import subprocess
+
+DECLARE = '''
+import time
+t = time.time()
+from dynamodb.model import Model
+from dynamodb.fields import CharField, IntegerField
+
+class Movies(Model):
+    __table_name__ = 'Movies'
+    year = IntegerField(name='year', hash_key=True)
+    title = CharField(name='title', range_key=True)
+%s
+print(time.time() - t)
+'''
+
+CASES = [
+    ('import', ''),
+    ('import + connect', 'from dynamodb.connection import connect; connect()'),
+]
+
+
+def run(code):
+    env = dict(os.environ, AWS_DEFAULT_REGION='us-west-2', PYTHONWARNINGS='ignore')
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.check_output([sys.executable, '-c', code],
+                                     cwd=root, env=env)
+    return float(output.strip().splitlines()[-1])
+
+
+def main(rounds=10):
+    for label, extra in CASES:
+        samples = sorted(run(DECLARE % extra) for _ in range(rounds))
+        print('%-18s min %7.1f ms  median %7.1f ms' % (
+            label, samples[0] * 1000, samples[len(samples) // 2] * 1000))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10)
@@ -0,0 +1,80 @@
+#! -*- coding: utf-8 -*-
+'''
+Memory of model instances, bytes per item.
+
+Every case builds `items` models in a fresh interpreter from values made
+beforehand, and reports the growth of its resident memory divided by the
+number of models: what a model adds to its values. "container" is the
+size of one instance and of its __dict__, compact models have slots
+instead.
+
+    python benchmarks/model_memory.py [items]
+'''
+from __future__ import print_function
+
+import os
+import sys
+import subprocess
+
+BUILD = '''
+from __future__ import print_function
+import gc
+import sys
+import resource
+from datetime import datetime
+from dynamodb.model import Model
+from dynamodb.fields import CharField, IntegerField, FloatField, DateTimeField
+
+class Movies(Model):
+    __table_name__ = 'Movies'
+    __compact__ = %s
+    year = IntegerField(name='year', hash_key=True)
+    title = CharField(name='title', range_key=True)
+    rating = FloatField(name='rating')
+    rank = IntegerField(name='rank')
+    release_date = DateTimeField(name='release_date')
+    plot = CharField(name='plot')
+
+def rss():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+items = %d
+date = datetime(1992, 1, 1)
+values = [dict(year=1992, title=u'title %%d' %% i, rating=7.5, rank=i,
+               release_date=date, plot=u'plot') for i in range(items)]
+gc.collect()
+before = rss()
+models = [Movies(**value) for value in values]
+gc.collect()
+after = rss()
+model = models[0]
+container = sys.getsizeof(model)
+if hasattr(model, '__dict__'):
+    container += sys.getsizeof(model.__dict__)
+print((after - before) / float(items), container)
+'''
+
+CASES = [
+    ('Model', False),
+    ('__compact__ Model', True),
+]
+
+
+def run(code):
+    env = dict(os.environ, AWS_DEFAULT_REGION='us-west-2', PYTHONWARNINGS='ignore')
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.check_output([sys.executable, '-c', code],
+                                     cwd=root, env=env)
+    per_item, container = output.strip().splitlines()[-1].split()
+    return float(per_item), int(container)
+
+
+def main(items=200000):
+    for label, compact in CASES:
+        per_item, container = run(BUILD % (compact, items))
+        print('%-18s %7.0f bytes/item  container %4d bytes' % (
+            label, per_item, container))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200000)
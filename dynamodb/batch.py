@@ -0,0 +1,342 @@
+#! -*- coding: utf-8 -*-
+'''
+Batch operations.
+
+BatchGetItem takes at most 100 keys and returns at most 16MB, the keys
+it could not read (throttling, size limit) come back in UnprocessedKeys
+and must be asked again. batch_get splits the keys in requests of 100,
+runs up to `concurrency` of them at once on a worker pool
+(DYNAMODB_BATCH_WORKERS threads, 32 by default) and retries unprocessed
+keys and throttled requests with jittered exponential backoff.
+
+    movies = Movies.batch_get(*keys, concurrency=8)
+
+BatchWriteItem takes at most 25 puts and deletes. batch_write streams
+requests from any iterable to `workers` threads; every primary key goes
+to the same worker so writes to a key keep their order, and the producer
+blocks when the workers fall behind. Unprocessed items and throttled
+requests are retried with backoff, the counters come back in a
+BatchWriteStats.
+
+    stats = Movies.batch_write(rows, workers=8)
+    stats = Movies.batch_write([Delete(year=1992, title='Aladdin'), ...])
+'''
+from __future__ import print_function
+
+import time
+import random
+import threading
+from collections import OrderedDict
+
+from six.moves import queue
+
+from botocore.exceptions import ClientError
+
+from .table import get_table
+from .helpers import WorkerPool
+from .errors import ClientException, ParameterException
+
+__all__ = ['batch_get', 'batch_write', 'Put', 'Delete', 'BatchWriteStats',
+           'backoff', 'set_executor', 'get_executor']
+
+# BatchGetItem limit
+GET_CHUNK_SIZE = 100
+# chunks of one batch_get in flight
+GET_CONCURRENCY = 4
+# BatchWriteItem limit
+WRITE_CHUNK_SIZE = 25
+WRITE_WORKERS = 4
+# requests waiting for a write worker
+WRITE_QUEUE_SIZE = 4 * WRITE_CHUNK_SIZE
+MAX_ATTEMPTS = 10
+BACKOFF_BASE = 0.05
+BACKOFF_CAP = 5
+
+THROTTLING_ERRORS = ('ProvisionedThroughputExceededException',
+                     'ThrottlingException', 'RequestLimitExceeded')
+RETRYABLE_ERRORS = ('ProvisionedThroughputExceededException',
+                    'ThrottlingException', 'RequestLimitExceeded',
+                    'InternalServerError', 'ServiceUnavailable')
+
+_pool = WorkerPool('DYNAMODB_BATCH_WORKERS', 32)
+set_executor = _pool.set
+get_executor = _pool.get
+
+
+def backoff(attempt, base=BACKOFF_BASE, cap=BACKOFF_CAP):
+    '''seconds to wait before retry attempt (1, 2...), "full jitter"'''
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def is_throttling(error):
+    return error.response.get('Error', {}).get('Code') in THROTTLING_ERRORS
+
+
+def is_retryable(error):
+    return error.response.get('Error', {}).get('Code') in RETRYABLE_ERRORS
+
+
+def chunked(values, size):
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+
+def _run(func, chunks, concurrency):
+    # func(chunk) for every chunk, at most concurrency at once; results
+    # in completion order. A single chunk runs in the calling thread.
+    chunks = list(chunks)
+    if len(chunks) <= 1 or concurrency <= 1:
+        for chunk in chunks:
+            yield func(chunk)
+        return
+    from concurrent.futures import wait, FIRST_COMPLETED
+    executor = get_executor()
+    pending = set()
+    chunks = iter(chunks)
+    try:
+        for chunk in chunks:
+            pending.add(executor.submit(func, chunk))
+            if len(pending) >= concurrency:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def _get_chunk(instance, keys, params, max_attempts):
+    # the worker's own connection, boto3 resources are per thread
+    table = get_table(instance)
+    items = []
+    attempt = 0
+    while keys:
+        try:
+            found, keys = table.batch_get_chunk(keys, **params)
+            items.extend(found)
+        except ClientError as e:
+            if not is_retryable(e) or attempt >= max_attempts:
+                raise ClientException(e.response['Error']['Message'])
+        if keys:
+            attempt += 1
+            if attempt > max_attempts:
+                raise ClientException('%s keys still unprocessed after %s '
+                                      'attempts' % (len(keys), attempt))
+            time.sleep(backoff(attempt))
+    return items
+
+
+def batch_get(table, primary_keys, concurrency=GET_CONCURRENCY,
+              consistent=False, max_attempts=MAX_ATTEMPTS,
+              chunk_size=GET_CHUNK_SIZE):
+    '''
+    Items of primary_keys (dicts of key values) read with BatchGetItem,
+    in the order of primary_keys with None for missing items. Duplicate
+    keys are read once. chunk_size keys a request (at most 100), smaller
+    requests get smaller responses if items are large.
+    '''
+    if not 0 < chunk_size <= GET_CHUNK_SIZE:
+        raise ParameterException('chunk_size must be between 1 and %s'
+                                 % GET_CHUNK_SIZE)
+    positions = OrderedDict()
+    for position, primary_key in enumerate(primary_keys):
+        key = table.encode_batch_key(primary_key)
+        identity = table.key_identity(key)
+        if identity in positions:
+            positions[identity][1].append(position)
+        else:
+            positions[identity] = (key, [position])
+    params = {}
+    if consistent:
+        params['ConsistentRead'] = True
+    keys = [key for key, _ in positions.values()]
+
+    def get(chunk):
+        return _get_chunk(table.instance, chunk, params, max_attempts)
+
+    results = [None] * len(primary_keys)
+    for items in _run(get, chunked(keys, chunk_size), concurrency):
+        for item in items:
+            for position in positions[table.key_identity(item)][1]:
+                results[position] = item
+    return results
+
+
+class Put(object):
+    '''
+    Put request of batch_write, item: storage values (Model.item)
+    '''
+    __slots__ = ('item',)
+    action = 'put'
+
+    def __init__(self, item):
+        self.item = item
+
+
+class Delete(object):
+    '''
+    Delete request of batch_write: Delete(year=1992, title='Aladdin')
+    '''
+    __slots__ = ('item',)
+    action = 'delete'
+
+    def __init__(self, **primary_key):
+        self.item = primary_key
+
+
+class BatchWriteStats(object):
+
+    def __init__(self):
+        self.puts = 0
+        self.deletes = 0
+        self.requests = 0
+        self.retries = 0
+        self.throttles = 0
+        self.unprocessed = 0
+        self.consumed_wcu = 0
+        self.elapsed = 0
+
+    @property
+    def items_written(self):
+        return self.puts + self.deletes
+
+    def add(self, other):
+        for name in ('puts', 'deletes', 'requests', 'retries', 'throttles',
+                     'unprocessed', 'consumed_wcu'):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+
+    def __repr__(self):
+        return ('<BatchWriteStats items_written=%s puts=%s deletes=%s '
+                'requests=%s retries=%s throttles=%s unprocessed=%s '
+                'consumed_wcu=%s elapsed=%.3f>' % (
+                    self.items_written, self.puts, self.deletes,
+                    self.requests, self.retries, self.throttles,
+                    self.unprocessed, self.consumed_wcu, self.elapsed))
+
+
+_DONE = object()
+
+
+class _WriteWorker(threading.Thread):
+    '''
+    Sends the requests of its queue 25 at a time, in order.
+    '''
+
+    def __init__(self, instance, overwrite, max_attempts):
+        super(_WriteWorker, self).__init__()
+        self.daemon = True
+        self.instance = instance
+        self.overwrite = overwrite
+        self.max_attempts = max_attempts
+        self.queue = queue.Queue(WRITE_QUEUE_SIZE)
+        self.stats = BatchWriteStats()
+        self.error = None
+
+    def run(self):
+        table = None
+        chunk = OrderedDict()
+        while True:
+            request = self.queue.get()
+            if self.error is not None:
+                # keep draining, the producer may be blocked on put()
+                if request is _DONE:
+                    return
+                continue
+            try:
+                if table is None:
+                    table = get_table(self.instance)
+                if request is _DONE:
+                    self._send(table, list(chunk.values()))
+                    return
+                encoded = table.encode_write_request(request)
+                key = table.write_request_key(encoded)
+                if key in chunk and not self.overwrite:
+                    # same key twice in a request is rejected, and the
+                    # second write must land last
+                    self._send(table, list(chunk.values()))
+                    chunk.clear()
+                chunk[key] = encoded
+                if len(chunk) >= WRITE_CHUNK_SIZE:
+                    self._send(table, list(chunk.values()))
+                    chunk.clear()
+            except Exception as e:
+                self.error = e
+                if request is _DONE:
+                    return
+
+    def _send(self, table, requests):
+        if not requests:
+            return
+        stats = self.stats
+        attempt = 0
+        while requests:
+            stats.requests += 1
+            try:
+                unprocessed, units = table.batch_write_chunk(requests)
+            except ClientError as e:
+                if not is_retryable(e) or attempt >= self.max_attempts:
+                    raise ClientException(e.response['Error']['Message'])
+                if is_throttling(e):
+                    stats.throttles += 1
+                unprocessed, units = requests, 0
+            else:
+                stats.unprocessed += len(unprocessed)
+                written = len(requests) - len(unprocessed)
+                puts = sum(1 for r in requests if 'PutRequest' in r) - \
+                    sum(1 for r in unprocessed if 'PutRequest' in r)
+                stats.puts += puts
+                stats.deletes += written - puts
+            stats.consumed_wcu += units
+            requests = unprocessed
+            if requests:
+                attempt += 1
+                if attempt > self.max_attempts:
+                    raise ClientException('%s items still unprocessed after %s '
+                                          'attempts' % (len(requests), attempt))
+                stats.retries += 1
+                time.sleep(backoff(attempt))
+
+
+def batch_write(table, items, overwrite=False, workers=WRITE_WORKERS,
+                max_attempts=MAX_ATTEMPTS):
+    '''
+    Write items (storage dicts to put, Put or Delete requests) from any
+    iterable with BatchWriteItem on `workers` threads. Requests of a key
+    are sent in order; with overwrite, a request replaces the one of the
+    same key still waiting to be sent instead of going in the next call.
+    Returns a BatchWriteStats, raises ClientException when a request
+    fails or stays unprocessed after max_attempts retries.
+    '''
+    if workers < 1:
+        raise ParameterException('workers must be >= 1')
+    start = time.time()
+    threads = [_WriteWorker(table.instance, overwrite, max_attempts)
+               for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    try:
+        for item in items:
+            if not isinstance(item, (Put, Delete)):
+                item = Put(item)
+            key = tuple(item.item.get(k) for k in table.schema.key_names)
+            thread = threads[hash(key) % workers]
+            if thread.error is not None:
+                break
+            thread.queue.put(item)
+    finally:
+        for thread in threads:
+            thread.queue.put(_DONE)
+        for thread in threads:
+            thread.join()
+    stats = BatchWriteStats()
+    for thread in threads:
+        stats.add(thread.stats)
+    stats.elapsed = time.time() - start
+    for thread in threads:
+        if thread.error is not None:
+            raise thread.error
+    return stats
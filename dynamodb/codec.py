@@ -0,0 +1,244 @@
+#! -*- coding: utf-8 -*-
+'''
+DynamoDB wire format codec.
+
+The resource layer turns every attribute into python values (numbers as
+Decimal) and the fields then typecast them again for reading. ModelCodec
+is compiled once per model and maps wire values ({'S': ...}, {'N': ...})
+straight to field values in one pass, and storage values back to the wire;
+load builds the model of a wire item with them, in the same pass.
+'''
+from __future__ import unicode_literals
+
+from decimal import Decimal
+
+import six
+
+from .helpers import str_to_time
+from .fields import (CharField, IntegerField, FloatField, BooleanField,
+                     DateTimeField, DictField, ListField)
+
+__all__ = ['ModelCodec', 'codec_for', 'serialize', 'deserialize']
+
+_serializer = None
+_deserializer = None
+
+
+def serialize(value):
+    '''python value to wire value, as boto3 does'''
+    global _serializer
+    if _serializer is None:
+        from boto3.dynamodb.types import TypeSerializer
+        _serializer = TypeSerializer()
+    return _serializer.serialize(value)
+
+
+def deserialize(value):
+    '''wire value to python value, as boto3 does'''
+    global _deserializer
+    if _deserializer is None:
+        from boto3.dynamodb.types import TypeDeserializer
+        _deserializer = TypeDeserializer()
+    return _deserializer.deserialize(value)
+
+
+def _number(s):
+    # numbers nested in dicts and lists read as int or float, like
+    # fields.DecimalEncoder does
+    try:
+        return int(s)
+    except ValueError:
+        d = Decimal(s)
+        return float(d) if d % 1 else int(d)
+
+
+def _plain(value):
+    # nested wire value to the json friendly value the dict/list fields read
+    (t, v), = value.items()
+    if t == 'S' or t == 'BOOL' or t == 'B':
+        return v
+    if t == 'N':
+        return _number(v)
+    if t == 'M':
+        return dict((k, _plain(sub)) for k, sub in v.items())
+    if t == 'L':
+        return [_plain(sub) for sub in v]
+    if t == 'NULL':
+        return None
+    return deserialize(value)
+
+
+def _overrides(field, base, method):
+    # a subclass that changes the typecast gets the generic path
+    own = getattr(type(field), method)
+    return getattr(own, '__func__', own) is not \
+        getattr(getattr(base, method), '__func__', getattr(base, method))
+
+
+def _generic_decoder(field):
+    typecast = field.typecast_for_read
+
+    def decode(value):
+        return typecast(deserialize(value))
+    return decode
+
+
+def _char_decoder(field):
+    def decode(value):
+        s = value.get('S')
+        if s is None:
+            return field.typecast_for_read(deserialize(value))
+        return '' if s == 'None' else s
+    return decode
+
+
+def _integer_decoder(field):
+    def decode(value):
+        n = value.get('N')
+        if n is None:
+            return field.typecast_for_read(deserialize(value))
+        try:
+            return int(n)
+        except ValueError:
+            return int(Decimal(n))
+    return decode
+
+
+def _float_decoder(field):
+    def decode(value):
+        n = value.get('N')
+        if n is None:
+            return field.typecast_for_read(deserialize(value))
+        return float(n)
+    return decode
+
+
+def _bool_decoder(field):
+    def decode(value):
+        if 'BOOL' in value:
+            return value['BOOL']
+        return field.typecast_for_read(deserialize(value))
+    return decode
+
+
+def _datetime_decoder(field):
+    def decode(value):
+        s = value.get('S')
+        if s is None:
+            return field.typecast_for_read(deserialize(value))
+        try:
+            return str_to_time(s)
+        except (TypeError, ValueError):
+            return None
+    return decode
+
+
+def _dict_decoder(field):
+    def decode(value):
+        m = value.get('M')
+        if m is None:
+            return field.typecast_for_read(deserialize(value))
+        return dict((k, _plain(v)) for k, v in m.items())
+    return decode
+
+
+def _list_decoder(field):
+    def decode(value):
+        l = value.get('L')
+        if l is None:
+            return field.typecast_for_read(deserialize(value))
+        return [_plain(v) for v in l]
+    return decode
+
+
+def _generic_encoder(field):
+    return serialize
+
+
+def _string_encoder(field):
+    def encode(value):
+        if isinstance(value, six.string_types):
+            return {'S': value}
+        return serialize(value)
+    return encode
+
+
+def _number_encoder(field):
+    def encode(value):
+        if (isinstance(value, six.integer_types + (Decimal,)) and
+                not isinstance(value, bool)):
+            return {'N': str(value)}
+        return serialize(value)
+    return encode
+
+
+def _bool_encoder(field):
+    def encode(value):
+        if isinstance(value, bool):
+            return {'BOOL': value}
+        return serialize(value)
+    return encode
+
+
+# field class: (decoder factory, encoder factory)
+CODECS = [
+    (CharField, _char_decoder, _string_encoder),
+    (IntegerField, _integer_decoder, _number_encoder),
+    (FloatField, _float_decoder, _number_encoder),
+    (BooleanField, _bool_decoder, _bool_encoder),
+    (DateTimeField, _datetime_decoder, _string_encoder),
+    (DictField, _dict_decoder, _generic_encoder),
+    (ListField, _list_decoder, _generic_encoder),
+]
+
+
+def _compile(field):
+    for base, decoder, encoder in CODECS:
+        if isinstance(field, base):
+            if _overrides(field, base, 'typecast_for_read'):
+                decoder = _generic_decoder
+            if _overrides(field, base, 'typecast_for_storage'):
+                encoder = _generic_encoder
+            return decoder(field), encoder(field)
+    return _generic_decoder(field), _generic_encoder(field)
+
+
+class ModelCodec(object):
+    '''
+    Precompiled wire encoder/decoder of a model.
+    '''
+
+    def __init__(self, model_class):
+        self.decoders = {}
+        self.encoders = {}
+        for name, field in model_class._attributes.items():
+            self.decoders[name], self.encoders[name] = _compile(field)
+        self.load = model_class._loader(self.decoders)
+
+    def decode(self, item):
+        '''wire item to field values, the _get_values_for_read result'''
+        decoders = self.decoders
+        return dict((name, decoders[name](value))
+                    for name, value in item.items() if name in decoders)
+
+    def encode(self, item):
+        '''storage values (Model.item) to a wire item'''
+        encoders = self.encoders
+        return dict((name, encoders[name](value) if name in encoders
+                     else serialize(value))
+                    for name, value in item.items())
+
+    def decode_key(self, key):
+        '''wire key to python values, as returned by the resource layer'''
+        return dict((name, deserialize(value)) for name, value in key.items())
+
+    def encode_key(self, key):
+        return dict((name, serialize(value)) for name, value in key.items())
+
+
+def codec_for(model_class):
+    codec = model_class.__dict__.get('_codec')
+    if codec is None:
+        codec = ModelCodec(model_class)
+        model_class._codec = codec
+    return codec
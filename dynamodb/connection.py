@@ -1,64 +1,351 @@
 #! -*- coding: utf-8 -*-
+'''
+DynamoDB connections.
 
+Nothing is created at import time: models can be declared without
+credentials and the boto3 session/resource is built by the first
+operation that needs it.
+
+    from dynamodb import connection
+
+    connection.configure(mode='local', endpoint='localhost', port='8000')
+    connection.configure('logs', config={'region_name': 'us-west-2'})
+    connection.configure('tests', mode='memory')   # in-process tables
+    db = connection.connect()   # optional, the first request connects too
+
+When nothing is configured the settings are read from the environment
+(DEBUG, DEV_END, AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY,
+AWS_DEFAULT_REGION) at connect time.
+
+HTTP client options go with the other settings, or come from
+DYNAMODB_<OPTION> environment variables:
+
+    connection.configure(config={'region_name': 'us-west-2'},
+                         max_pool_connections=64, tcp_keepalive=True,
+                         connect_timeout=1, read_timeout=2,
+                         retry_mode='adaptive', max_attempts=5)
+
+boto3 resources are neither thread safe nor fork safe, so every thread
+gets its own resource (built from one boto3 Session per process and
+connection) and a forked child drops the connections of its parent.
+Models can be imported before a pre-fork server forks its workers.
+'''
+
+import os
 from os import environ
-import boto3
+from threading import RLock, local
 
+import six
+
+from .helpers import Promise
 from .errors import ParameterException
 
+__all__ = ['ConnectionManager', 'configure', 'connect', 'disconnect',
+           'get_db', 'db', 'DEFAULT_ALIAS']
+
+DEFAULT_ALIAS = 'default'
+
+
+# botocore client options, with the type used to read them from the
+# environment (DYNAMODB_MAX_POOL_CONNECTIONS, DYNAMODB_READ_TIMEOUT, ...)
+CLIENT_OPTIONS = {
+    'max_pool_connections': int,
+    'connect_timeout': float,
+    'read_timeout': float,
+    'tcp_keepalive': bool,
+    'retry_mode': str,
+    'max_attempts': int,
+    'proxies': dict,
+}
+
+MANAGER_ARGUMENTS = ('mode', 'config', 'endpoint', 'port',
+                     'use_instance_metadata')
+
+RETRY_MODES = ('legacy', 'standard', 'adaptive')
+
+# service mode defaults, local mode keeps botocore's
+SERVICE_OPTIONS = {
+    'connect_timeout': 1,
+    'read_timeout': 2,
+}
+
+
+def _cast_option(name, value):
+    cast = CLIENT_OPTIONS[name]
+    if cast is bool:
+        return value.lower() in ('1', 'true', 'yes', 'on')
+    if cast is dict:
+        raise ParameterException('%s cannot be read from environ' % name)
+    try:
+        return cast(value)
+    except ValueError:
+        raise ParameterException('Invalid %s: %s' % (name, value))
+
+
+def options_from_environ():
+    options = {}
+    for name in CLIENT_OPTIONS:
+        if name == 'proxies':
+            continue
+        value = environ.get('DYNAMODB_%s' % name.upper())
+        if value not in (None, ''):
+            options[name] = _cast_option(name, value)
+    return options
+
+
+def validate_options(options):
+    for name, value in options.items():
+        if name not in CLIENT_OPTIONS:
+            raise ParameterException('Unknown connection option: %s' % name)
+        if value is None:
+            continue
+        if name in ('max_pool_connections', 'max_attempts'):
+            minimum = 1 if name == 'max_pool_connections' else 0
+            if (isinstance(value, bool) or not isinstance(value, six.integer_types)
+                    or value < minimum):
+                raise ParameterException('%s must be an integer >= %s'
+                                         % (name, minimum))
+        elif name in ('connect_timeout', 'read_timeout'):
+            if (isinstance(value, bool) or
+                    not isinstance(value, six.integer_types + (float,)) or
+                    value <= 0):
+                raise ParameterException('%s must be a positive number' % name)
+        elif name == 'tcp_keepalive':
+            if not isinstance(value, bool):
+                raise ParameterException('tcp_keepalive must be a bool')
+        elif name == 'retry_mode':
+            if value not in RETRY_MODES:
+                raise ParameterException('retry_mode must be one of %s'
+                                         % ', '.join(RETRY_MODES))
+        elif name == 'proxies':
+            if not isinstance(value, dict):
+                raise ParameterException('proxies must be a dict')
+    return options
+
 
 class ConnectionManager:
 
     def __init__(self, mode=None, config=None, endpoint=None,
-                 port=None, use_instance_metadata=False):
+                 port=None, use_instance_metadata=False, session=None,
+                 **options):
         self.db = None
+        validate_options(options)
         if mode == "local":
             if config is not None:
                 raise ParameterException('Cannot specify config when in local mode')
             endpoint = endpoint or 'localhost'
             port = port or '8000'
             self.db = self.getDynamoDBConnection(
-                endpoint=endpoint, port=port, local=True)
+                endpoint=endpoint, port=port, local=True, session=session,
+                **options)
         elif mode == "service":
             self.db = self.getDynamoDBConnection(
                 config=config,
                 endpoint=endpoint,
-                use_instance_metadata=use_instance_metadata)
+                use_instance_metadata=use_instance_metadata,
+                session=session,
+                **options)
+        elif mode == "memory":
+            # in-process tables, endpoint names the store
+            from .memory import backend
+            self.db = backend(endpoint or 'default')
         else:
             raise ParameterException("Invalid arguments, please refer to usage.")
 
+    def getClientConfig(self, local=False, **options):
+        from botocore.config import Config
+
+        if not local:
+            options = dict(SERVICE_OPTIONS, **options)
+        kwargs = {}
+        for name in ('max_pool_connections', 'connect_timeout',
+                     'read_timeout', 'proxies'):
+            if options.get(name) is not None:
+                kwargs[name] = options[name]
+        retries = {}
+        if options.get('retry_mode') is not None:
+            retries['mode'] = options['retry_mode']
+        if options.get('max_attempts') is not None:
+            retries['max_attempts'] = options['max_attempts']
+        if retries:
+            kwargs['retries'] = retries
+        if options.get('tcp_keepalive') is not None:
+            if 'tcp_keepalive' not in Config.OPTION_DEFAULTS:
+                raise ParameterException(
+                    'tcp_keepalive is not supported by this botocore')
+            kwargs['tcp_keepalive'] = options['tcp_keepalive']
+        return Config(**kwargs)
+
     def getDynamoDBConnection(self, config=None, endpoint=None, port=None,
-                              local=False, use_instance_metadata=False):
+                              local=False, use_instance_metadata=False,
+                              session=None, **options):
+        import boto3
+
+        # boto3.resource uses the default session, which is not thread safe
+        session = session or boto3
         if not config:
             config = {'region_name': 'us-west-2'}
         params = {
-            'region_name': config.get('region_name', 'cn-north-1')
+            'region_name': config.get('region_name', 'cn-north-1'),
+            'config': self.getClientConfig(local=local, **options)
         }
         if local:
             endpoint_url = 'http://{endpoint}:{port}'.format(endpoint=endpoint,
                                                              port=port)
             params['endpoint_url'] = endpoint_url
-            db = boto3.resource('dynamodb', **params)
+            db = session.resource('dynamodb', **params)
         else:
             if not config or not isinstance(config, dict):
                 raise ParameterException("Invalid config")
             params.update(config)
-            db = boto3.resource('dynamodb', **params)
-            db.meta.client.meta.config.connect_timeout = environ.get(
-                'DYNAMODB_CONNECT_TIMEOUT', 1)
-            db.meta.client.meta.config.read_timeout = environ.get(
-                'DYNAMODB_READ_TIMEOUT', 2)
+            db = session.resource('dynamodb', **params)
         return db
 
 
-config = {
-    'aws_access_key_id': environ.get('AWS_ACCESS_KEY_ID'),
-    'aws_secret_access_key': environ.get('AWS_SECRET_ACCESS_KEY'),
-    'region_name': environ.get('AWS_DEFAULT_REGION', 'cn-north-1')
-}
+def _client_options(settings):
+    return dict((name, value) for name, value in settings.items()
+                if name not in MANAGER_ARGUMENTS)
+
+
+def _settings_from_environ():
+    if environ.get('DEBUG') != '1':
+        config = {
+            'aws_access_key_id': environ.get('AWS_ACCESS_KEY_ID'),
+            'aws_secret_access_key': environ.get('AWS_SECRET_ACCESS_KEY'),
+            'region_name': environ.get('AWS_DEFAULT_REGION', 'cn-north-1')
+        }
+        return {'mode': 'service', 'config': config}
+    return {'mode': 'local', 'endpoint': environ.get('DEV_END', 'localhost')}
+
+
+class ConnectionRegistry(object):
+    '''
+    Named connections, created on first use, one per thread and process.
+    '''
+
+    def __init__(self):
+        self._settings = {}
+        # bumped by a drop of every alias, and of one alias
+        self._generation = 0
+        self._generations = {}
+        self._reset()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        # also runs in a forked child: the parent's lock may be held and
+        # its sessions and sockets must not be shared
+        self._pid = os.getpid()
+        self._lock = RLock()
+        self._sessions = {}
+        self._local = local()
+
+    def _thread_connections(self):
+        if self._pid != os.getpid():
+            self._reset()
+        state = self._local
+        if not hasattr(state, 'connections'):
+            # {key: (generation of the alias, connection)}
+            state.connections = {}
+        return state.connections
+
+    def _generation_of(self, alias):
+        return self._generation, self._generations.get(alias, 0)
+
+    def configure(self, alias=DEFAULT_ALIAS, **settings):
+        '''
+        Register the ConnectionManager arguments for alias, client options
+        (max_pool_connections, tcp_keepalive, timeouts, retries, proxies)
+        included. Existing connections are dropped and rebuilt on next use.
+        '''
+        mode = settings.get('mode', 'service')
+        if mode not in ('local', 'service', 'memory'):
+            raise ParameterException('Invalid mode: %s' % mode)
+        settings['mode'] = mode
+        validate_options(_client_options(settings))
+        with self._lock:
+            self._settings[alias] = settings
+            self._drop(alias)
+
+    def settings(self, alias=DEFAULT_ALIAS, **options):
+        settings = self._settings.get(alias)
+        if settings is None:
+            if alias != DEFAULT_ALIAS:
+                raise ParameterException('Connection not configured: %s' % alias)
+            settings = _settings_from_environ()
+        settings = dict(options_from_environ(), **settings)
+        settings.update(validate_options(options))
+        return settings
+
+    def _session(self, key):
+        import boto3
+
+        session = self._sessions.get(key)
+        if session is None:
+            session = self._sessions[key] = boto3.session.Session()
+        return session
+
+    def connect(self, alias=DEFAULT_ALIAS, **options):
+        '''
+        Return the connection of alias for the current thread, creating
+        it if needed. Client options given here override the configured
+        ones and get a connection of their own
+        (see Model.__connection_options__).
+        '''
+        key = (alias, repr(sorted(options.items()))) if options else (alias,)
+        connections = self._thread_connections()
+        generation = self._generation_of(alias)
+        cached = connections.get(key)
+        if cached is not None and cached[0] == generation:
+            return cached[1]
+        settings = self.settings(alias, **options)
+        with self._lock:
+            # sessions are shared by the threads, not thread safe either
+            session = None
+            if settings['mode'] != 'memory':
+                session = self._session(key)
+            db = ConnectionManager(session=session, **settings).db
+        connections[key] = (generation, db)
+        return db
+
+    def _drop(self, alias=None):
+        for key in list(self._sessions):
+            if alias is None or key[0] == alias:
+                del self._sessions[key]
+        # the other threads see it on their next connect()
+        if alias is None:
+            self._generation += 1
+        else:
+            self._generations[alias] = self._generations.get(alias, 0) + 1
+
+    def disconnect(self, alias=None):
+        '''
+        Drop the connections of alias (all when None) in every thread.
+        '''
+        with self._lock:
+            self._drop(alias)
+
+
+registry = ConnectionRegistry()
+configure = registry.configure
+connect = registry.connect
+get_db = registry.connect
+disconnect = registry.disconnect
+
+
+class LazyConnection(Promise):
+    '''
+    Stands in for the boto3 resource of alias until it is really used.
+    '''
+
+    def __init__(self, alias=DEFAULT_ALIAS):
+        self._alias = alias
+
+    def __getattr__(self, name):
+        return getattr(get_db(self._alias), name)
+
+    def __repr__(self):
+        return '<LazyConnection %s>' % self._alias
 
 
-if environ.get('DEBUG') is not '1':
-    db = ConnectionManager(mode='service', config=config).db
-else:
-    dev_endpoint = environ.get('DEV_END', 'localhost')
-    db = ConnectionManager(mode='local', endpoint=dev_endpoint).db
+db = LazyConnection()
@@ -0,0 +1,115 @@
+#! -*- coding: utf-8 -*-
+'''
+Pagination cursors.
+
+A cursor is a LastEvaluatedKey packed in a short URL-safe string, to hand
+to HTTP clients instead of the key itself:
+
+    movies, cursor = Movies.query().where(Movies.year.eq(1992)).page(20)
+    movies, cursor = (Movies.query().where(Movies.year.eq(1992))
+                      .page(20, cursor=cursor))
+
+The key values are written as compact JSON, numbers as strings, and read
+back with the type of their field (N: Decimal, S: unicode).
+With a secret (argument or DYNAMODB_CURSOR_SECRET) the cursor carries an
+HMAC-SHA256 signature and a cursor that was changed is refused.
+'''
+from __future__ import print_function
+
+import os
+import hmac
+import base64
+import hashlib
+from decimal import Decimal
+
+import six
+
+from .json_import import json
+from .helpers import get_attribute_type
+from .errors import ParameterException
+
+__all__ = ['encode_cursor', 'decode_cursor']
+
+SECRET_VARIABLE = 'DYNAMODB_CURSOR_SECRET'
+# bytes of the signature kept in the cursor
+SIGNATURE_SIZE = 16
+
+
+def _secret(secret):
+    secret = secret or os.environ.get(SECRET_VARIABLE)
+    if isinstance(secret, six.text_type):
+        secret = secret.encode('utf-8')
+    return secret
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def _b64decode(data):
+    data = data.encode('ascii') if isinstance(data, six.text_type) else data
+    return base64.urlsafe_b64decode(data + b'=' * (-len(data) % 4))
+
+
+def _sign(payload, secret):
+    return hmac.new(secret, payload, hashlib.sha256).digest()[:SIGNATURE_SIZE]
+
+
+def encode_cursor(key, secret=None):
+    '''
+    cursor of key (a LastEvaluatedKey), None for no key
+    '''
+    if not key:
+        return None
+    values = {}
+    for name, value in key.items():
+        if isinstance(value, (Decimal, float) + six.integer_types):
+            value = str(value)
+        values[name] = value
+    payload = json.dumps(values, separators=(',', ':'), sort_keys=True,
+                         ensure_ascii=False)
+    payload = payload.encode('utf-8')
+    cursor = _b64encode(payload)
+    secret = _secret(secret)
+    if secret:
+        cursor += '.' + _b64encode(_sign(payload, secret))
+    return cursor
+
+
+def decode_cursor(cursor, model_class, secret=None):
+    '''
+    the ExclusiveStartKey of cursor, the values typed by the fields of
+    model_class. Raises ParameterException for a bad cursor.
+    '''
+    if not cursor:
+        return None
+    secret = _secret(secret)
+    try:
+        if secret:
+            payload, signature = cursor.split('.', 1)
+            payload = _b64decode(payload)
+            if not hmac.compare_digest(_sign(payload, secret),
+                                       _b64decode(signature)):
+                raise ParameterException('Invalid cursor signature')
+        else:
+            payload = _b64decode(cursor)
+        values = json.loads(payload.decode('utf-8'))
+    except ParameterException:
+        raise
+    except Exception:
+        raise ParameterException('Invalid cursor')
+    if not isinstance(values, dict):
+        raise ParameterException('Invalid cursor')
+    attributes = model_class._attributes
+    key = {}
+    for name, value in values.items():
+        field = attributes.get(name)
+        if field is None:
+            raise ParameterException('Invalid cursor field %s' % name)
+        try:
+            if get_attribute_type(field) == 'N':
+                value = Decimal(value)
+        except Exception:
+            raise ParameterException('Invalid cursor value of %s' % name)
+        key[name] = value
+    return key
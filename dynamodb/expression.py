@@ -7,12 +7,43 @@ http://boto3.readthedocs.io/en/stable/reference/customizations/dynamodb.html#ref
 from __future__ import print_function
 
 from decimal import Decimal
-from boto3.dynamodb.conditions import Key, Attr
 
 from .errors import ValidationException
 from .helpers import smart_unicode
 
-__all__ = ['Expression']
+__all__ = ['Expression', 'Condition', 'Bind', 'bind']
+
+
+class Bind(object):
+    '''
+    Placeholder of a query condition value, given when a prepared query
+    runs (see Query.prepare): Movies.year.eq(bind('year'))
+    '''
+    __slots__ = ('name', 'field')
+
+    def __init__(self, name, field=None):
+        self.name = name
+        self.field = field  # typecasts the value, see Expression._bind
+
+    def __repr__(self):
+        return 'bind(%r)' % self.name
+
+
+bind = Bind
+
+
+class Condition(tuple):
+    '''
+    A query condition, (field, boto3 condition, is_key) for where(); op
+    and values (storage values) are what it was built from, to build it
+    again as a key condition of an index or as a filter.
+    '''
+
+    def __new__(cls, field, condition, is_key, op=None, values=()):
+        self = tuple.__new__(cls, (field, condition, is_key))
+        self.op = op
+        self.values = tuple(values)
+        return self
 
 
 class Expression(object):
@@ -148,10 +179,9 @@ class Expression(object):
         return smart_unicode(value)
 
     def _expression_func(self, op, *values, **kwargs):
-        # for use by index ... bad
-        values = map(self.typecast_for_storage, values)
-        self.op = op
-        self.express_args = values
+        from boto3.dynamodb.conditions import Key, Attr
+        values = [self._bind(v) if isinstance(v, Bind)
+                  else self.typecast_for_storage(v) for v in values]
         use_key = kwargs.get('use_key', False)
         if self.hash_key and op != 'eq':
             raise ValidationException('Query key condition not supported')
@@ -162,7 +192,11 @@ class Expression(object):
             func = getattr(Attr(self.name), op, None)
         if not func:
             raise ValidationException('Query key condition not supported')
-        return self, func(*values), use_key
+        return Condition(self, func(*values), use_key, op, values)
+
+    def _bind(self, placeholder):
+        # a copy a condition: a placeholder may be given to several fields
+        return Bind(placeholder.name, field=self)
 
     def _expression(self, op, value):
         if self.use_decimal_types:
@@ -216,10 +250,14 @@ class Expression(object):
 
     def is_in(self, value):
         # Creates a condition where the attribute is in the value
-        # Attr
-        if self.hash_key or self.range_key:
+        # Attr, on the hash key: a query a partition (see fanout.py)
+        if self.hash_key:
+            return Condition(self, None, True, 'is_in',
+                             [self.typecast_for_storage(v) for v in value])
+        if self.range_key:
             # ValidationException
             raise ValidationException('Query key condition not supported')
+        from boto3.dynamodb.conditions import Attr
         return self.name, Attr(self.name).is_in(value), False
 
     def contains(self, value):
@@ -228,6 +266,7 @@ class Expression(object):
         if self.hash_key or self.range_key:
             # ValidationException
             raise ValidationException('Query key condition not supported')
+        from boto3.dynamodb.conditions import Attr
         return self.name, Attr(self.name).contains(value), False
 
     def exists(self):
@@ -236,6 +275,7 @@ class Expression(object):
         if self.hash_key or self.range_key:
             # ValidationException
             raise ValidationException('Query key condition not supported')
+        from boto3.dynamodb.conditions import Attr
         return self.name, Attr(self.name).exists(), False
 
     def not_exists(self):
@@ -244,4 +284,5 @@ class Expression(object):
         if self.hash_key or self.range_key:
             # ValidationException
             raise ValidationException('Query key condition not supported')
+        from boto3.dynamodb.conditions import Attr
         return self.name, Attr(self.name).not_exists(), False
@@ -0,0 +1,166 @@
+#! -*- coding: utf-8 -*-
+'''
+Queries over several partitions.
+
+A query reads one partition (one hash key value). With is_in on the hash
+key, Query runs one query a partition on a worker pool
+(DYNAMODB_QUERY_WORKERS threads, 32 by default) and merges them on the
+sort key, the range key or the order_by() index, in the query order:
+
+    latest = (Posts.query()
+              .where(Posts.user_id.is_in(followed))
+              .order_by(Posts.created_at, asc=False)
+              .limit(50))
+    for post in latest.all():
+        ...
+
+Every partition reads the next page while its current one is merged;
+nothing more is read once the limit is reached.
+'''
+from __future__ import print_function
+
+import heapq
+
+from .table import get_table
+from .helpers import WorkerPool
+
+__all__ = ['FanOutIterator', 'set_executor', 'get_executor']
+
+_pool = WorkerPool('DYNAMODB_QUERY_WORKERS', 32)
+set_executor = _pool.set
+get_executor = _pool.get
+
+
+def _fetch(instance, params, hydrate):
+    # in a worker: its own connection
+    table = get_table(instance)
+    response = table.query(**params)
+    if hydrate:
+        response['Items'] = table.hydrate(
+            response['Items'], consistent=params.get('ConsistentRead', False))
+    return response
+
+
+class _Reversed(object):
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+
+class _Partition(object):
+    '''
+    Items of one partition, a page requested ahead.
+    '''
+
+    def __init__(self, query, executor, sort_key):
+        self.instance = query.instance
+        self.table = get_table(query.instance)
+        self.params = query._get_query_params()
+        projection = self.params.get('ProjectionExpression')
+        if sort_key and projection and sort_key not in projection:
+            # the items are merged on it
+            self.params['ProjectionExpression'] = projection + (sort_key,)
+        self.hydrate = query._hydrates(self.params)
+        if self.hydrate:
+            self.params.pop('ProjectionExpression', None)
+        self.Limit = self.params.get('Limit')
+        self.executor = executor
+        self.fetched = 0
+        self.items = iter(())
+        self.future = self._request()
+
+    def _request(self):
+        params = self.params
+        if self.Limit:
+            params = dict(params, Limit=self.Limit - self.fetched)
+        return self.executor.submit(_fetch, self.instance, params,
+                                    self.hydrate)
+
+    def next(self):
+        # the next stored item, None after the last one
+        while True:
+            for item in self.items:
+                return item
+            if self.future is None:
+                return None
+            response = self.future.result()
+            items = response['Items']
+            self.fetched += len(items)
+            LastEvaluatedKey = response.get('LastEvaluatedKey')
+            if LastEvaluatedKey and not (self.Limit and
+                                         self.fetched >= self.Limit):
+                self.params = dict(self.params,
+                                   ExclusiveStartKey=LastEvaluatedKey)
+                self.future = self._request()
+            else:
+                self.future = None
+            self.items = iter(items)
+
+    def cancel(self):
+        if self.future is not None:
+            self.future.cancel()
+            self.future = None
+
+
+class FanOutIterator(object):
+    '''
+    Results of query (hash key is_in) merged from one query a partition on
+    the sort key; limit() caps the total.
+    '''
+
+    def __init__(self, query):
+        self.query = query
+        self.Limit = query.Limit
+        self.sort_key = query.instance._schema.index_keys(
+            query._choose_index()[1])[1]
+        # ScanIndexForward defaults to True
+        self.reverse = query.ScanIndexForward is False
+        self.count = 0
+        self._iterator = self._merge()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._iterator)
+
+    next = __next__
+
+    def close(self):
+        self._iterator.close()
+
+    def _push(self, heap, position, partition, sort_key):
+        item = partition.next()
+        if item is None:
+            return
+        key = sort_key(item)[0] if sort_key else None
+        if self.reverse:
+            key = _Reversed(key)
+        heapq.heappush(heap, (key, position, item))
+
+    def _merge(self):
+        executor = get_executor()
+        # every first page is requested before waiting for one
+        partitions = [_Partition(query, executor, self.sort_key)
+                      for query in self.query._partitions()]
+        table = get_table(self.query.instance)
+        results = self.query._results(table)
+        sort_key = self.sort_key and table.value_reader((self.sort_key,))
+        heap = []
+        try:
+            for position, partition in enumerate(partitions):
+                self._push(heap, position, partition, sort_key)
+            while heap:
+                _, position, item = heapq.heappop(heap)
+                self.count += 1
+                yield results(item)
+                if self.Limit and self.count >= self.Limit:
+                    return
+                self._push(heap, position, partitions[position], sort_key)
+        finally:
+            for partition in partitions:
+                partition.cancel()
@@ -29,7 +29,7 @@ class DecimalEncoder(json.JSONEncoder):
 
     def default(self, obj):
         if isinstance(obj, decimal.Decimal):
-            if obj % 1 > 0:
+            if obj % 1 != 0:
                 return float(obj)
             else:
                 return int(obj)
@@ -76,6 +76,8 @@ class Attribute(Expression):
                  **kwargs):
         super(Attribute, self).__init__(**kwargs)
         self.name = name
+        # where the value is kept on instances, a slot of compact models
+        self.attname = '_' + name if name else None
         self.unique = unique
         self.indexed = indexed
         self.default = default
@@ -86,7 +88,7 @@ class Attribute(Expression):
 
     def __get__(self, instance, owner):
         try:
-            return getattr(instance, '_' + self.name)
+            return getattr(instance, self.attname)
         except AttributeError:
             if callable(self.default):
                 default = self.default()
@@ -98,7 +100,7 @@ class Attribute(Expression):
             return default
 
     def __set__(self, instance, value):
-        setattr(instance, '_' + self.name, value)
+        setattr(instance, self.attname, value)
 
     def typecast_for_read(self, value):
         """Typecasts the value for reading from DynamoDB."""
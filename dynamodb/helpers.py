@@ -4,11 +4,11 @@ try:
 except ImportError:
     import pickle
 
+import os
+import threading
 from functools import wraps
 
 import six
-import pytz
-import dateutil.parser
 from decimal import Decimal
 from datetime import datetime, date, time
 
@@ -20,6 +20,7 @@ def str_time(dt):
         raise TypeError('dt should be date object, and not a %s' % type(dt))
     if not dt.tzinfo:
         # update dt with utc zone
+        import pytz
         dt = pytz.utc.localize(dt)
     return dt.isoformat()
 
@@ -30,6 +31,7 @@ def str_date(dt):
         raise TypeError('dt should be date object, and not a %s' % type(dt))
     if not dt.tzinfo:
         # update dt with utc zone
+        import pytz
         dt = pytz.utc.localize(dt)
     return dt.date.isoformat()
 
@@ -38,6 +40,7 @@ def str_to_time(s):
     """str time to datetime"""
     if not s:
         return None
+    import dateutil.parser
     try:
         dt = dateutil.parser.parse(s)
         return dt
@@ -57,6 +60,7 @@ def date2timestamp(dt):
 def timestamp2date(timestamp):
     if not isinstance(timestamp, (int, float)):
         return timestamp
+    import pytz
     date = datetime.utcfromtimestamp(timestamp)
     utcdt = pytz.utc.localize(date)
     return utcdt
@@ -247,3 +251,32 @@ def get_items_for_storage(model_class, items):
         instance = model_class(**item)
         results.append(instance.item)
     return results
+
+
+class WorkerPool(object):
+    """
+    A ThreadPoolExecutor created on first use, environ[variable] threads
+    (default workers) unless set() was called. A forked child builds a
+    new one.
+    """
+
+    def __init__(self, variable, workers):
+        self.variable = variable
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+
+    def set(self, executor):
+        with self._lock:
+            self._executor, self._pid = executor, os.getpid()
+
+    def get(self):
+        if self._executor is None or self._pid != os.getpid():
+            from concurrent.futures import ThreadPoolExecutor
+            with self._lock:
+                if self._executor is None or self._pid != os.getpid():
+                    workers = int(os.environ.get(self.variable, self.workers))
+                    self._executor = ThreadPoolExecutor(max_workers=workers)
+                    self._pid = os.getpid()
+        return self._executor
@@ -0,0 +1,1817 @@
+#! -*- coding: utf-8 -*-
+'''
+In-process DynamoDB for tests and benchmarks.
+
+MemoryResource stands in for boto3.resource('dynamodb'): Table handles,
+create_table, batch_get_item, batch_write_item and a low-level client on
+meta.client speaking the wire format. Items live in sorted structures per
+partition for the table and each of its secondary indexes; key condition,
+filter, condition, projection and update expressions are parsed and
+evaluated, Limit/ExclusiveStartKey/LastEvaluatedKey paginate like the
+service does. Reserved words are rejected as attribute names of
+expressions.
+
+    from dynamodb import connection
+    connection.configure(mode='memory')
+
+Connections configured with the same endpoint share one store. Its
+faults exercise the retry paths of the callers:
+
+    store = backend().store
+    store.fail('BatchWriteItem', times=2)  # throttled twice
+    store.leave_unprocessed('BatchGetItem', 10)
+'''
+from __future__ import print_function
+
+import re
+import functools
+import zlib
+import math
+import copy
+from bisect import bisect_left, bisect_right
+from decimal import Decimal
+from threading import RLock
+
+import six
+from botocore.exceptions import ClientError
+
+from .codec import serialize, deserialize
+from .errors import ParameterException
+
+__all__ = ['MemoryResource', 'MemoryClient', 'backend', 'reset']
+
+
+def _error(code, message, operation='Request'):
+    return ClientError({'Error': {'Code': code, 'Message': message},
+                        'ResponseMetadata': {'HTTPStatusCode': 400}},
+                       operation)
+
+
+def _validation(message):
+    return _error('ValidationException', message)
+
+
+FAULT_MESSAGES = {
+    'ProvisionedThroughputExceededException':
+        'The level of configured provisioned throughput for the table was '
+        'exceeded. Consider increasing your provisioning level with the '
+        'UpdateTable API.',
+    'ThrottlingException': 'Rate of requests exceeds the allowed throughput.',
+    'InternalServerError': 'Internal server error',
+}
+
+
+def _operation(name):
+    # errors are raised with the name of the API call, as botocore does
+    def decorator(method):
+        @functools.wraps(method)
+        def call(store, *args, **kwargs):
+            try:
+                error = store._fault(store.errors, name)
+                if error:
+                    raise _error(error, FAULT_MESSAGES.get(error, error))
+                return method(store, *args, **kwargs)
+            except ClientError as e:
+                raise ClientError(e.response, name)
+        return call
+    return decorator
+
+
+def _load(value):
+    # python value as boto3 would send it and read it back
+    try:
+        return deserialize(serialize(value))
+    except TypeError as e:
+        raise _validation(str(e))
+
+
+def _load_item(item):
+    return dict((k, _load(v)) for k, v in item.items())
+
+
+def _wire_item(item):
+    return dict((k, serialize(v)) for k, v in item.items())
+
+
+def _python_item(item):
+    return dict((k, deserialize(v)) for k, v in item.items())
+
+
+def _type_of(value):
+    if isinstance(value, bool):
+        return 'BOOL'
+    if value is None:
+        return 'NULL'
+    if isinstance(value, Decimal):
+        return 'N'
+    if isinstance(value, six.string_types):
+        return 'S'
+    if isinstance(value, (set, frozenset)):
+        for v in value:
+            return {'N': 'NS', 'S': 'SS'}.get(_type_of(v), 'BS')
+        return 'SS'
+    if isinstance(value, list):
+        return 'L'
+    if isinstance(value, dict):
+        return 'M'
+    return 'B'
+
+
+def _sort_value(value):
+    if _type_of(value) == 'B':
+        return bytes(getattr(value, 'value', value))
+    return value
+
+
+def _size(value):
+    t = _type_of(value)
+    if t == 'S':
+        return len(value.encode('utf-8') if isinstance(value, six.text_type)
+                   else value)
+    if t == 'N':
+        return len(str(value)) // 2 + 1
+    if t == 'B':
+        return len(_sort_value(value))
+    if t in ('BOOL', 'NULL'):
+        return 1
+    if t == 'L':
+        return 3 + sum(_size(v) + 1 for v in value)
+    if t == 'M':
+        return 3 + sum(len(k) + _size(v) + 1 for k, v in value.items())
+    return sum(_size(v) for v in value)
+
+
+def _item_size(item):
+    return sum(len(k) + _size(v) for k, v in item.items()) if item else 0
+
+
+# expressions
+
+MISSING = object()
+
+_TOKEN = re.compile(r'''\s*(?:
+    (?P<name>\#[A-Za-z0-9_]+) |
+    (?P<value>:[A-Za-z0-9_]+) |
+    (?P<number>[0-9]+) |
+    (?P<ident>[A-Za-z_][A-Za-z0-9_]*) |
+    (?P<op><>|<=|>=|=|<|>|\(|\)|\[|\]|,|\.|\+|-)
+)''', re.X)
+
+COMPARATORS = ('=', '<>', '<', '<=', '>', '>=')
+CONDITION_FUNCTIONS = ('attribute_exists', 'attribute_not_exists',
+                       'attribute_type', 'begins_with', 'contains')
+UPDATE_CLAUSES = ('SET', 'REMOVE', 'ADD', 'DELETE')
+
+# attribute names an expression can only give through a #placeholder
+RESERVED_WORDS = frozenset('''
+ABORT ABSOLUTE ACTION ADD AFTER AGENT AGGREGATE ALL ALLOCATE ALTER ANALYZE
+AND ANY ARCHIVE ARE ARRAY AS ASC ASCII ASENSITIVE ASSERTION ASYMMETRIC AT
+ATOMIC ATTACH ATTRIBUTE AUTH AUTHORIZATION AUTHORIZE AUTO AVG BACK BACKUP
+BASE BATCH BEFORE BEGIN BETWEEN BIGINT BINARY BIT BLOB BLOCK BOOLEAN BOTH
+BREADTH BUCKET BULK BY BYTE CALL CALLED CALLING CAPACITY CASCADE CASCADED
+CASE CAST CATALOG CHAR CHARACTER CHECK CLASS CLOB CLOSE CLUSTER CLUSTERED
+CLUSTERING CLUSTERS COALESCE COLLATE COLLATION COLLECTION COLUMN COLUMNS
+COMBINE COMMENT COMMIT COMPACT COMPILE COMPRESS CONDITION CONFLICT CONNECT
+CONNECTION CONSISTENCY CONSISTENT CONSTRAINT CONSTRAINTS CONSTRUCTOR
+CONSUMED CONTINUE CONVERT COPY CORRESPONDING COUNT COUNTER CREATE CROSS
+CUBE CURRENT CURSOR CYCLE DATA DATABASE DATE DATETIME DAY DEALLOCATE DEC
+DECIMAL DECLARE DEFAULT DEFERRABLE DEFERRED DEFINE DEFINED DEFINITION
+DELETE DELIMITED DEPTH DEREF DESC DESCRIBE DESCRIPTOR DETACH DETERMINISTIC
+DIAGNOSTICS DIRECTORIES DISABLE DISCONNECT DISTINCT DISTRIBUTE DO DOMAIN
+DOUBLE DROP DUMP DURATION DYNAMIC EACH ELEMENT ELSE ELSEIF EMPTY ENABLE
+END EQUAL EQUALS ERROR ESCAPE ESCAPED EVAL EVALUATE EXCEEDED EXCEPT
+EXCEPTION EXCEPTIONS EXCLUSIVE EXEC EXECUTE EXISTS EXIT EXPLAIN EXPLODE
+EXPORT EXPRESSION EXTENDED EXTERNAL EXTRACT FAIL FALSE FAMILY FETCH FIELDS
+FILE FILTER FILTERING FINAL FINISH FIRST FIXED FLATTERN FLOAT FOR FORCE
+FOREIGN FORMAT FORWARD FOUND FREE FROM FULL FUNCTION FUNCTIONS GENERAL
+GENERATE GET GLOB GLOBAL GO GOTO GRANT GREATER GROUP GROUPING HANDLER HASH
+HAVE HAVING HEAP HIDDEN HOLD HOUR IDENTIFIED IDENTITY IF IGNORE IMMEDIATE
+IMPORT IN INCLUDING INCLUSIVE INCREMENT INCREMENTAL INDEX INDEXED INDEXES
+INDICATOR INFINITE INITIALLY INLINE INNER INNTER INOUT INPUT INSENSITIVE
+INSERT INSTEAD INT INTEGER INTERSECT INTERVAL INTO INVALIDATE IS ISOLATION
+ITEM ITEMS ITERATE JOIN KEY KEYS LAG LANGUAGE LARGE LAST LATERAL LEAD
+LEADING LEAVE LEFT LENGTH LESS LEVEL LIKE LIMIT LIMITED LINES LIST LOAD
+LOCAL LOCALTIME LOCALTIMESTAMP LOCATION LOCATOR LOCK LOCKS LOG LOGED LONG
+LOOP LOWER MAP MATCH MATERIALIZED MAX MAXLEN MEMBER MERGE METHOD METRICS
+MIN MINUS MINUTE MISSING MOD MODE MODIFIES MODIFY MODULE MONTH MULTI
+MULTISET NAME NAMES NATIONAL NATURAL NCHAR NCLOB NEW NEXT NO NONE NOT NULL
+NULLIF NUMBER NUMERIC OBJECT OF OFFLINE OFFSET OLD ON ONLINE ONLY OPAQUE
+OPEN OPERATOR OPTION OR ORDER ORDINALITY OTHER OTHERS OUT OUTER OUTPUT
+OVER OVERLAPS OVERRIDE OWNER PAD PARALLEL PARAMETER PARAMETERS PARTIAL
+PARTITION PARTITIONED PARTITIONS PATH PERCENT PERCENTILE PERMISSION
+PERMISSIONS PIPE PIPELINED PLAN POOL POSITION PRECISION PREPARE PRESERVE
+PRIMARY PRIOR PRIVATE PRIVILEGES PROCEDURE PROCESSED PROJECT PROJECTION
+PROPERTY PROVISIONING PUBLIC PUT QUERY QUIT QUORUM RAISE RANDOM RANGE RANK
+RAW READ READS REAL REBUILD RECORD RECURSIVE REDUCE REF REFERENCE
+REFERENCES REFERENCING REGEXP REGION RENAME REPAIR REPEAT REPLACE REQUEST
+RESET RESIGNAL RESOURCE RESPONSE RESTORE RESTRICT RESULT RETURN RETURNING
+RETURNS REVERSE REVOKE RIGHT ROLE ROLES ROLLBACK ROLLUP ROUTINE ROW ROWS
+RULE RULES SAMPLE SATISFIES SAVE SAVEPOINT SCAN SCHEMA SCOPE SCROLL SEARCH
+SECOND SECTION SEGMENT SEGMENTS SELECT SELF SEMI SENSITIVE SEPARATE
+SEQUENCE SERIALIZABLE SESSION SET SETS SHARD SHARE SHARED SHORT SHOW
+SIGNAL SIMILAR SIZE SKEWED SMALLINT SNAPSHOT SOME SOURCE SPACE SPACES
+SPARSE SPECIFIC SPECIFICTYPE SPLIT SQL SQLCODE SQLERROR SQLEXCEPTION
+SQLSTATE SQLWARNING START STATE STATIC STATUS STORAGE STORE STORED STREAM
+STRING STRUCT STYLE SUB SUBMULTISET SUBPARTITION SUBSTRING SUBTYPE SUM
+SUPER SYMMETRIC SYNONYM SYSTEM TABLE TABLESAMPLE TEMP TEMPORARY TERMINATED
+TEXT THAN THEN THROUGHPUT TIME TIMESTAMP TIMEZONE TINYINT TO TOKEN TOTAL
+TOUCH TRAILING TRANSACTION TRANSFORM TRANSLATE TRANSLATION TREAT TRIGGER
+TRIM TRUE TRUNCATE TTL TUPLE TYPE UNDER UNDO UNION UNIQUE UNIT UNKNOWN
+UNLOGGED UNNEST UNPROCESSED UNSIGNED UNTIL UPDATE UPPER URL USAGE USE USER
+USERS USING UUID VACUUM VALUE VALUED VALUES VARCHAR VARIABLE VARIANCE
+VARINT VARYING VIEW VIEWS VIRTUAL VOID WAIT WHEN WHENEVER WHERE WHILE
+WINDOW WITH WITHIN WITHOUT WORK WRAPPED WRITE YEAR ZONE
+'''.split())
+
+
+def _tokenize(expression):
+    tokens = []
+    pos = 0
+    expression = expression.rstrip()
+    while pos < len(expression):
+        match = _TOKEN.match(expression, pos)
+        if not match or match.end() == pos:
+            raise _validation('Invalid expression: syntax error near "%s"'
+                              % expression[pos:pos + 10])
+        kind = match.lastgroup
+        tokens.append((kind, match.group(kind)))
+        pos = match.end()
+    return tokens
+
+
+class _Parser(object):
+    '''
+    Parses condition, projection and update expressions to tuples:
+        ('path', [name, 0, name]), ('value', v), ('size', path),
+        ('cmp', op, a, b), ('between', a, low, high), ('in', a, [values]),
+        ('func', name, [args]), ('and', a, b), ('or', a, b), ('not', a)
+    '''
+
+    def __init__(self, expression, names=None, values=None):
+        self.tokens = _tokenize(expression)
+        self.pos = 0
+        self.names = names or {}
+        self.values = values or {}
+        self.used_names = set()
+        self.used_values = set()
+
+    def peek(self, offset=0):
+        pos = self.pos + offset
+        if pos < len(self.tokens):
+            return self.tokens[pos]
+        return (None, None)
+
+    def next(self):
+        token = self.peek()
+        if token[0] is None:
+            raise _validation('Invalid expression: unexpected end')
+        self.pos += 1
+        return token
+
+    def expect(self, text):
+        kind, value = self.next()
+        if value != text:
+            raise _validation('Invalid expression: expected "%s" got "%s"'
+                              % (text, value))
+
+    def keyword(self, *words):
+        kind, value = self.peek()
+        return kind == 'ident' and value.upper() in words
+
+    def done(self):
+        return self.pos >= len(self.tokens)
+
+    def finish(self):
+        if not self.done():
+            raise _validation('Invalid expression: unexpected "%s"'
+                              % self.peek()[1])
+
+    def name(self):
+        kind, value = self.next()
+        if kind == 'name':
+            if value not in self.names:
+                raise _validation('An expression attribute name used in the '
+                                  'document path is not defined; attribute '
+                                  'name: %s' % value)
+            self.used_names.add(value)
+            return self.names[value]
+        if kind == 'ident':
+            if value.upper() in RESERVED_WORDS:
+                raise _validation('Invalid expression: Attribute name is a '
+                                  'reserved keyword; reserved keyword: %s'
+                                  % value)
+            return value
+        raise _validation('Invalid expression: bad attribute name "%s"' % value)
+
+    def path(self):
+        elements = [self.name()]
+        while True:
+            kind, value = self.peek()
+            if value == '.':
+                self.next()
+                elements.append(self.name())
+            elif value == '[':
+                self.next()
+                kind, number = self.next()
+                if kind != 'number':
+                    raise _validation('Invalid expression: bad list index')
+                self.expect(']')
+                elements.append(int(number))
+            else:
+                return ('path', elements)
+
+    def value(self):
+        kind, value = self.next()
+        if value not in self.values:
+            raise _validation('An expression attribute value used in '
+                              'expression is not defined; attribute value: %s'
+                              % value)
+        self.used_values.add(value)
+        return ('value', self.values[value])
+
+    def operand(self):
+        kind, value = self.peek()
+        if kind == 'value':
+            return self.value()
+        if kind == 'ident' and value == 'size' and self.peek(1)[1] == '(':
+            self.next()
+            self.expect('(')
+            path = self.path()
+            self.expect(')')
+            return ('size', path)
+        return self.path()
+
+    # conditions
+
+    def condition(self):
+        node = self.conjunction()
+        while self.keyword('OR'):
+            self.next()
+            node = ('or', node, self.conjunction())
+        return node
+
+    def conjunction(self):
+        node = self.negation()
+        while self.keyword('AND'):
+            self.next()
+            node = ('and', node, self.negation())
+        return node
+
+    def negation(self):
+        if self.keyword('NOT'):
+            self.next()
+            return ('not', self.negation())
+        return self.comparison()
+
+    def comparison(self):
+        kind, value = self.peek()
+        if value == '(':
+            self.next()
+            node = self.condition()
+            self.expect(')')
+            return node
+        if kind == 'ident' and value in CONDITION_FUNCTIONS and \
+                self.peek(1)[1] == '(':
+            self.next()
+            self.expect('(')
+            args = [self.operand()]
+            while self.peek()[1] == ',':
+                self.next()
+                args.append(self.operand())
+            self.expect(')')
+            return ('func', value, args)
+        left = self.operand()
+        kind, value = self.peek()
+        if value in COMPARATORS:
+            self.next()
+            return ('cmp', value, left, self.operand())
+        if self.keyword('BETWEEN'):
+            self.next()
+            low = self.operand()
+            if not self.keyword('AND'):
+                raise _validation('Invalid expression: BETWEEN needs AND')
+            self.next()
+            return ('between', left, low, self.operand())
+        if self.keyword('IN'):
+            self.next()
+            self.expect('(')
+            options = [self.operand()]
+            while self.peek()[1] == ',':
+                self.next()
+                options.append(self.operand())
+            self.expect(')')
+            return ('in', left, options)
+        raise _validation('Invalid expression: syntax error near "%s"' % value)
+
+    def parse_condition(self):
+        node = self.condition()
+        self.finish()
+        return node
+
+    def parse_projection(self):
+        paths = [self.path()]
+        while self.peek()[1] == ',':
+            self.next()
+            paths.append(self.path())
+        self.finish()
+        return paths
+
+    # updates
+
+    def update_operand(self):
+        kind, value = self.peek()
+        if kind == 'ident' and self.peek(1)[1] == '(' and \
+                value in ('if_not_exists', 'list_append'):
+            self.next()
+            self.expect('(')
+            if value == 'if_not_exists':
+                first = self.path()
+            else:
+                first = self.update_value()
+            self.expect(',')
+            second = self.update_value()
+            self.expect(')')
+            return (value, first, second)
+        return self.operand()
+
+    def update_value(self):
+        node = self.update_operand()
+        kind, value = self.peek()
+        if value in ('+', '-'):
+            self.next()
+            return (value, node, self.update_operand())
+        return node
+
+    def parse_update(self):
+        actions = []
+        seen = set()
+        while not self.done():
+            kind, clause = self.next()
+            clause = (clause or '').upper()
+            if kind != 'ident' or clause not in UPDATE_CLAUSES:
+                raise _validation('Invalid UpdateExpression: syntax error '
+                                  'near "%s"' % clause)
+            if clause in seen:
+                raise _validation('Invalid UpdateExpression: The "%s" section '
+                                  'can only be used once' % clause)
+            seen.add(clause)
+            while True:
+                path = self.path()
+                if clause == 'SET':
+                    self.expect('=')
+                    actions.append((clause, path, self.update_value()))
+                elif clause == 'REMOVE':
+                    actions.append((clause, path, None))
+                else:
+                    actions.append((clause, path, self.operand()))
+                if self.peek()[1] != ',':
+                    break
+                self.next()
+        return actions
+
+
+def _resolve(item, path):
+    value = item
+    for element in path[1]:
+        if isinstance(element, int):
+            if not isinstance(value, list) or element >= len(value):
+                return MISSING
+        elif not isinstance(value, dict) or element not in value:
+            return MISSING
+        value = value[element]
+    return value
+
+
+def _operand(node, item):
+    kind = node[0]
+    if kind == 'value':
+        return node[1]
+    if kind == 'path':
+        return _resolve(item, node)
+    if kind == 'size':
+        value = _resolve(item, node[1])
+        if value is MISSING or _type_of(value) in ('N', 'BOOL', 'NULL'):
+            return MISSING
+        return Decimal(_size(value) if _type_of(value) in ('S', 'B')
+                       else len(value))
+    raise _validation('Invalid operand')
+
+
+def _comparable(a, b):
+    if a is MISSING or b is MISSING:
+        return False
+    return _type_of(a) == _type_of(b) and _type_of(a) in ('N', 'S', 'B')
+
+
+def _compare(op, a, b):
+    if op == '=':
+        return a is not MISSING and b is not MISSING and \
+            _type_of(a) == _type_of(b) and a == b
+    if op == '<>':
+        return not _compare('=', a, b)
+    if not _comparable(a, b):
+        return False
+    a, b = _sort_value(a), _sort_value(b)
+    if op == '<':
+        return a < b
+    if op == '<=':
+        return a <= b
+    if op == '>':
+        return a > b
+    return a >= b
+
+
+def _evaluate(node, item):
+    kind = node[0]
+    if kind == 'and':
+        return _evaluate(node[1], item) and _evaluate(node[2], item)
+    if kind == 'or':
+        return _evaluate(node[1], item) or _evaluate(node[2], item)
+    if kind == 'not':
+        return not _evaluate(node[1], item)
+    if kind == 'cmp':
+        return _compare(node[1], _operand(node[2], item),
+                        _operand(node[3], item))
+    if kind == 'between':
+        value = _operand(node[1], item)
+        return (_compare('>=', value, _operand(node[2], item)) and
+                _compare('<=', value, _operand(node[3], item)))
+    if kind == 'in':
+        value = _operand(node[1], item)
+        return any(_compare('=', value, _operand(option, item))
+                   for option in node[2])
+    if kind == 'func':
+        name, args = node[1], node[2]
+        value = _operand(args[0], item)
+        if name == 'attribute_exists':
+            return value is not MISSING
+        if name == 'attribute_not_exists':
+            return value is MISSING
+        if value is MISSING:
+            return False
+        other = _operand(args[1], item)
+        if name == 'attribute_type':
+            return _type_of(value) == other
+        if name == 'begins_with':
+            return (_comparable(value, other) and _type_of(value) != 'N' and
+                    _sort_value(value).startswith(_sort_value(other)))
+        if name == 'contains':
+            t = _type_of(value)
+            if t in ('S', 'B'):
+                return (_type_of(other) == t and
+                        _sort_value(other) in _sort_value(value))
+            if t in ('SS', 'NS', 'BS', 'L'):
+                return other in value
+            return False
+    raise _validation('Invalid condition')
+
+
+def _project(item, paths):
+    result = {}
+    for path in paths:
+        value = _resolve(item, path)
+        if value is MISSING:
+            continue
+        target = result
+        elements = path[1]
+        source = item
+        for i, element in enumerate(elements[:-1]):
+            source = source[element]
+            if isinstance(element, int):
+                # list elements are projected into a compact list
+                break
+            target = target.setdefault(element, {} if isinstance(source, dict)
+                                       else [])
+        else:
+            if isinstance(target, list):
+                target.append(value)
+            else:
+                target[elements[-1]] = value
+            continue
+        target.append(value)
+    return result
+
+
+def _unused(parser, names, values):
+    unused_names = set(names or {}) - parser.used_names
+    if unused_names:
+        raise _validation('Value provided in ExpressionAttributeNames unused '
+                          'in expressions: keys: {%s}'
+                          % ', '.join(sorted(unused_names)))
+    unused_values = set(values or {}) - parser.used_values
+    if unused_values:
+        raise _validation('Value provided in ExpressionAttributeValues unused '
+                          'in expressions: keys: {%s}'
+                          % ', '.join(sorted(unused_values)))
+
+
+class _Expressions(object):
+    '''
+    All the expressions of a request, sharing its names and values.
+    '''
+
+    def __init__(self, params):
+        self.names = params.get('ExpressionAttributeNames') or {}
+        self.values = dict((k, _load(v)) for k, v in
+                           (params.get('ExpressionAttributeValues') or {}).items())
+        self.used_names = set()
+        self.used_values = set()
+
+    def _parse(self, expression, method):
+        parser = _Parser(expression, self.names, self.values)
+        node = getattr(parser, method)()
+        self.used_names |= parser.used_names
+        self.used_values |= parser.used_values
+        return node
+
+    def condition(self, expression):
+        if not expression:
+            return None
+        return self._parse(expression, 'parse_condition')
+
+    def projection(self, expression):
+        if not expression:
+            return None
+        return self._parse(expression, 'parse_projection')
+
+    def update(self, expression):
+        if not expression:
+            return []
+        return self._parse(expression, 'parse_update')
+
+    def check(self):
+        _unused(self, self.names, self.values)
+
+
+# updates
+
+def _container(item, elements):
+    target = item
+    for element in elements:
+        if isinstance(element, int):
+            if not isinstance(target, list) or element >= len(target):
+                return MISSING
+        elif not isinstance(target, dict) or element not in target:
+            return MISSING
+        target = target[element]
+    return target
+
+
+def _set_path(item, path, value):
+    elements = path[1]
+    parent = _container(item, elements[:-1])
+    last = elements[-1]
+    if isinstance(last, int):
+        if not isinstance(parent, list):
+            raise _validation('The document path provided in the update '
+                              'expression is invalid for update')
+        if last >= len(parent):
+            parent.append(value)
+        else:
+            parent[last] = value
+    else:
+        if not isinstance(parent, dict):
+            raise _validation('The document path provided in the update '
+                              'expression is invalid for update')
+        parent[last] = value
+
+
+def _update_value(node, item):
+    kind = node[0]
+    if kind == 'if_not_exists':
+        value = _resolve(item, node[1])
+        if value is MISSING:
+            return _update_value(node[2], item)
+        return value
+    if kind == 'list_append':
+        first = _update_value(node[1], item)
+        second = _update_value(node[2], item)
+        if _type_of(first) != 'L' or _type_of(second) != 'L':
+            raise _validation('Incorrect operand type for operator or '
+                              'function; operator or function: list_append')
+        return list(first) + list(second)
+    if kind in ('+', '-'):
+        first = _update_value(node[1], item)
+        second = _update_value(node[2], item)
+        if first is MISSING or second is MISSING:
+            raise _validation('The provided operand for an arithmetic '
+                              'operation is missing')
+        if _type_of(first) != 'N' or _type_of(second) != 'N':
+            raise _validation('Incorrect operand type for operator or '
+                              'function; operator: %s' % kind)
+        return first + second if kind == '+' else first - second
+    value = _operand(node, item)
+    if value is MISSING:
+        raise _validation('The provided expression refers to an attribute '
+                          'that does not exist in the item')
+    return value
+
+
+def _apply_update(item, actions):
+    '''
+    Apply the parsed update to a copy of item. Every operand is read from
+    the item as it was before the update. Returns the new item and the
+    names of the updated top level attributes.
+    '''
+    old = item
+    item = copy.deepcopy(item)
+    updated = set()
+    removals = []
+    for clause, path, operand in actions:
+        updated.add(path[1][0])
+        if clause == 'SET':
+            _set_path(item, path, copy.deepcopy(_update_value(operand, old)))
+        elif clause == 'REMOVE':
+            removals.append(path[1])
+        elif clause == 'ADD':
+            value = _operand(operand, old)
+            current = _resolve(old, path)
+            t = _type_of(value)
+            if current is MISSING:
+                new = value
+            elif t == 'N' and _type_of(current) == 'N':
+                new = current + value
+            elif t in ('SS', 'NS', 'BS') and _type_of(current) == t:
+                new = set(current) | set(value)
+            else:
+                raise _validation('An operand in the update expression has an '
+                                  'incorrect data type')
+            _set_path(item, path, new)
+        elif clause == 'DELETE':
+            value = _operand(operand, old)
+            current = _resolve(old, path)
+            if current is MISSING:
+                continue
+            if _type_of(value) not in ('SS', 'NS', 'BS'):
+                raise _validation('An operand in the update expression has an '
+                                  'incorrect data type')
+            new = set(current) - set(value)
+            if new:
+                _set_path(item, path, new)
+            else:
+                removals.append(path[1])
+    # list elements are removed by their position before the update
+    for elements in sorted(removals, key=lambda e: e[-1] if
+                           isinstance(e[-1], int) else -1, reverse=True):
+        parent = _container(item, elements[:-1])
+        last = elements[-1]
+        if isinstance(last, int):
+            if isinstance(parent, list) and last < len(parent):
+                del parent[last]
+        elif isinstance(parent, dict):
+            parent.pop(last, None)
+    return item, updated
+
+
+# storage
+
+class _Index(object):
+    '''
+    Items of a table (or of one of its indexes) sorted per partition.
+    '''
+
+    def __init__(self, table, name, key_schema, projection=None,
+                 throughput=None, is_global=False):
+        self.table = table
+        self.name = name
+        self.key_schema = key_schema
+        self.projection = projection or {'ProjectionType': 'ALL'}
+        self.throughput = throughput
+        self.is_global = is_global
+        self.hash_key = self.range_key = None
+        for key in key_schema:
+            if key['KeyType'] == 'HASH':
+                self.hash_key = key['AttributeName']
+            else:
+                self.range_key = key['AttributeName']
+        self.partitions = {}
+        self._hashes = None
+
+    def sort_key(self, item):
+        # position of the item in its partition, None when not indexed
+        if self.hash_key not in item:
+            return None
+        key = ()
+        if self.range_key:
+            if self.range_key not in item:
+                return None
+            key = (_sort_value(item[self.range_key]),)
+        if self.name is not None:
+            key += self.table.primary_key(item)
+        return key
+
+    def add(self, item):
+        key = self.sort_key(item)
+        if key is None:
+            return
+        hash_value = _sort_value(item[self.hash_key])
+        if hash_value not in self.partitions:
+            self.partitions[hash_value] = ([], [])
+            self._hashes = None
+        keys, pks = self.partitions[hash_value]
+        i = bisect_left(keys, key)
+        keys.insert(i, key)
+        pks.insert(i, self.table.primary_key(item))
+
+    def discard(self, item):
+        key = self.sort_key(item)
+        if key is None:
+            return
+        hash_value = _sort_value(item[self.hash_key])
+        keys, pks = self.partitions[hash_value]
+        i = bisect_left(keys, key)
+        if i < len(keys) and keys[i] == key:
+            del keys[i]
+            del pks[i]
+        if not keys:
+            del self.partitions[hash_value]
+            self._hashes = None
+
+    def hashes(self):
+        if self._hashes is None:
+            self._hashes = sorted(self.partitions)
+        return self._hashes
+
+    def key_names(self):
+        names = [self.table.hash_key]
+        if self.table.range_key:
+            names.append(self.table.range_key)
+        for name in (self.hash_key, self.range_key):
+            if name and name not in names:
+                names.append(name)
+        return names
+
+    def projected(self, item):
+        projection_type = self.projection.get('ProjectionType', 'ALL')
+        if projection_type == 'ALL':
+            return item
+        names = self.key_names()
+        if projection_type == 'INCLUDE':
+            names += self.projection.get('NonKeyAttributes', [])
+        return dict((k, item[k]) for k in names if k in item)
+
+    def description(self):
+        description = {
+            'IndexName': self.name,
+            'KeySchema': self.key_schema,
+            'Projection': self.projection,
+            'IndexStatus': 'ACTIVE',
+            'ItemCount': sum(len(keys) for keys, _ in self.partitions.values()),
+        }
+        if self.is_global and self.throughput:
+            description['ProvisionedThroughput'] = dict(self.throughput)
+        return description
+
+
+class _Table(object):
+
+    def __init__(self, params):
+        self.name = params['TableName']
+        self.key_schema = params['KeySchema']
+        self.attribute_definitions = params['AttributeDefinitions']
+        self.throughput = dict(params.get('ProvisionedThroughput') or
+                               {'ReadCapacityUnits': 0,
+                                'WriteCapacityUnits': 0})
+        self.stream = params.get('StreamSpecification')
+        self.types = dict((d['AttributeName'], d['AttributeType'])
+                          for d in self.attribute_definitions)
+        self.primary = _Index(self, None, self.key_schema)
+        self.hash_key = self.primary.hash_key
+        self.range_key = self.primary.range_key
+        self._check_keys(self.key_schema)
+        self.items = {}
+        self.indexes = {}
+        for index in params.get('LocalSecondaryIndexes') or []:
+            self.add_index(index, is_global=False)
+        for index in params.get('GlobalSecondaryIndexes') or []:
+            self.add_index(index, is_global=True)
+
+    def _check_keys(self, key_schema):
+        for key in key_schema:
+            if key['AttributeName'] not in self.types:
+                raise _validation('One or more parameter values were invalid: '
+                                  'Some index key attributes are not defined '
+                                  'in AttributeDefinitions.')
+
+    def add_index(self, params, is_global):
+        self._check_keys(params['KeySchema'])
+        name = params['IndexName']
+        if name in self.indexes:
+            raise _validation('One or more parameter values were invalid: '
+                              'Duplicate index name: %s' % name)
+        index = _Index(self, name, params['KeySchema'],
+                       params.get('Projection'),
+                       params.get('ProvisionedThroughput'), is_global)
+        if not is_global and index.hash_key != self.hash_key:
+            raise _validation('Local secondary index must have the same hash '
+                              'key as the table')
+        for item in self.items.values():
+            index.add(item)
+        self.indexes[name] = index
+        return index
+
+    def primary_key(self, item):
+        key = (_sort_value(item[self.hash_key]),)
+        if self.range_key:
+            key += (_sort_value(item[self.range_key]),)
+        return key
+
+    def key(self, item):
+        names = [self.hash_key] + ([self.range_key] if self.range_key else [])
+        return dict((k, item[k]) for k in names)
+
+    def check_key(self, key, exact=True):
+        names = [self.hash_key] + ([self.range_key] if self.range_key else [])
+        for name in names:
+            if name not in key:
+                raise _validation('One or more parameter values were invalid: '
+                                  'Missing the key %s in the item' % name)
+            if _type_of(key[name]) != self.types[name]:
+                raise _validation('One or more parameter values were invalid: '
+                                  'Type mismatch for key %s expected: %s '
+                                  'actual: %s' % (name, self.types[name],
+                                                  _type_of(key[name])))
+            if self.types[name] in ('S', 'B') and not _sort_value(key[name]):
+                raise _validation('One or more parameter values are not valid. '
+                                  'The AttributeValue for a key attribute '
+                                  'cannot contain an empty string value. '
+                                  'Key: %s' % name)
+        if exact and len(key) != len(names):
+            raise _validation('The provided key element does not match the '
+                              'schema')
+        return self.primary_key(key)
+
+    def check_item(self, item):
+        self.check_key(item, exact=False)
+        for index in self.indexes.values():
+            for name in (index.hash_key, index.range_key):
+                if name in item and _type_of(item[name]) != self.types[name]:
+                    raise _validation('One or more parameter values were '
+                                      'invalid: Type mismatch for Index Key '
+                                      '%s Expected: %s Actual: %s IndexName: '
+                                      '%s' % (name, self.types[name],
+                                              _type_of(item[name]),
+                                              index.name))
+        return self.primary_key(item)
+
+    def get(self, pk):
+        return self.items.get(pk)
+
+    def put(self, item):
+        pk = self.primary_key(item)
+        old = self.items.get(pk)
+        if old is not None:
+            self.remove(old)
+        self.items[pk] = item
+        self.primary.add(item)
+        for index in self.indexes.values():
+            index.add(item)
+        return old
+
+    def remove(self, item):
+        pk = self.primary_key(item)
+        self.items.pop(pk, None)
+        self.primary.discard(item)
+        for index in self.indexes.values():
+            index.discard(item)
+
+    def size(self):
+        return sum(_item_size(item) for item in self.items.values())
+
+    def description(self):
+        description = {
+            'TableName': self.name,
+            'TableStatus': 'ACTIVE',
+            'KeySchema': self.key_schema,
+            'AttributeDefinitions': self.attribute_definitions,
+            'ProvisionedThroughput': dict(self.throughput,
+                                          NumberOfDecreasesToday=0),
+            'ItemCount': len(self.items),
+            'TableSizeBytes': self.size(),
+        }
+        local_indexes = [i.description() for i in self.indexes.values()
+                         if not i.is_global]
+        global_indexes = [i.description() for i in self.indexes.values()
+                          if i.is_global]
+        if local_indexes:
+            description['LocalSecondaryIndexes'] = local_indexes
+        if global_indexes:
+            description['GlobalSecondaryIndexes'] = global_indexes
+        if self.stream:
+            description['StreamSpecification'] = self.stream
+        return description
+
+
+def _capacity(table, units, params):
+    if params.get('ReturnConsumedCapacity', 'NONE') in (None, 'NONE'):
+        return None
+    return {'TableName': table, 'CapacityUnits': units}
+
+
+def _read_units(size, consistent):
+    units = max(1, int(math.ceil(size / 4096.0)))
+    return float(units) if consistent else units / 2.0
+
+
+def _write_units(*items):
+    size = max(_item_size(item) for item in items)
+    return float(max(1, int(math.ceil(size / 1024.0))))
+
+
+def _segment_of(hash_value, total):
+    return zlib.crc32(repr(hash_value).encode('utf-8')) % total
+
+
+class MemoryStore(object):
+    '''
+    The tables and the operations on them, with python values (as the
+    boto3 resource layer sends and reads them) and string expressions.
+    '''
+
+    def __init__(self, page_size=None):
+        # page_size: items read per page at most, stands in for the 1MB
+        # limit of the service
+        self.page_size = page_size
+        self.lock = RLock()
+        self.tables = {}
+        # injected faults, a list a API call name
+        self.errors = {}
+        self.unprocessed = {}
+
+    def clear(self):
+        with self.lock:
+            self.tables.clear()
+            self.errors.clear()
+            self.unprocessed.clear()
+
+    # faults
+
+    def fail(self, operation, times=1,
+             error='ProvisionedThroughputExceededException'):
+        '''
+        The next `times` calls of operation (the API call name, e.g.
+        'BatchWriteItem') raise a ClientError with the code error.
+        '''
+        with self.lock:
+            self.errors.setdefault(operation, []).extend([error] * times)
+
+    def leave_unprocessed(self, operation, count, times=1):
+        '''
+        The next `times` calls of operation ('BatchGetItem' or
+        'BatchWriteItem') leave their last count keys or requests
+        unprocessed, returned in UnprocessedKeys or UnprocessedItems.
+        '''
+        if operation not in ('BatchGetItem', 'BatchWriteItem'):
+            raise ParameterException('%s has nothing to leave unprocessed'
+                                     % operation)
+        with self.lock:
+            self.unprocessed.setdefault(operation, []).extend(
+                [count] * times)
+
+    def _fault(self, faults, operation):
+        with self.lock:
+            pending = faults.get(operation)
+            return pending.pop(0) if pending else None
+
+    def table(self, name):
+        table = self.tables.get(name)
+        if table is None:
+            raise _error('ResourceNotFoundException',
+                         'Requested resource not found')
+        return table
+
+    def _response(self, **response):
+        response['ResponseMetadata'] = {'HTTPStatusCode': 200,
+                                        'RetryAttempts': 0}
+        return response
+
+    # tables
+
+    @_operation('CreateTable')
+    def create_table(self, **params):
+        with self.lock:
+            if params['TableName'] in self.tables:
+                raise _error('ResourceInUseException',
+                             'Cannot create preexisting table')
+            table = _Table(params)
+            self.tables[table.name] = table
+            return self._response(TableDescription=table.description())
+
+    @_operation('DescribeTable')
+    def describe_table(self, TableName):
+        with self.lock:
+            table = self.table(TableName)
+            return self._response(Table=table.description())
+
+    @_operation('DeleteTable')
+    def delete_table(self, TableName):
+        with self.lock:
+            table = self.table(TableName)
+            del self.tables[TableName]
+            description = table.description()
+            description['TableStatus'] = 'DELETING'
+            return self._response(TableDescription=description)
+
+    @_operation('UpdateTable')
+    def update_table(self, TableName, **params):
+        with self.lock:
+            table = self.table(TableName)
+            for definition in params.get('AttributeDefinitions') or []:
+                table.types[definition['AttributeName']] = \
+                    definition['AttributeType']
+                if definition not in table.attribute_definitions:
+                    table.attribute_definitions.append(definition)
+            if params.get('ProvisionedThroughput'):
+                table.throughput = dict(params['ProvisionedThroughput'])
+            if 'StreamSpecification' in params:
+                table.stream = params['StreamSpecification']
+            for update in params.get('GlobalSecondaryIndexUpdates') or []:
+                if 'Create' in update:
+                    table.add_index(update['Create'], is_global=True)
+                elif 'Delete' in update:
+                    name = update['Delete']['IndexName']
+                    if name not in table.indexes:
+                        raise _error('ResourceNotFoundException',
+                                     'Requested resource not found: '
+                                     'Index: %s' % name)
+                    del table.indexes[name]
+                elif 'Update' in update:
+                    name = update['Update']['IndexName']
+                    if name not in table.indexes:
+                        raise _error('ResourceNotFoundException',
+                                     'Requested resource not found: '
+                                     'Index: %s' % name)
+                    table.indexes[name].throughput = \
+                        update['Update']['ProvisionedThroughput']
+            return self._response(TableDescription=table.description())
+
+    @_operation('ListTables')
+    def list_tables(self, **params):
+        with self.lock:
+            return self._response(TableNames=sorted(self.tables))
+
+    # items
+
+    def _check_condition(self, expressions, expression, item):
+        condition = expressions.condition(expression)
+        if condition is not None and not _evaluate(condition, item or {}):
+            raise _error('ConditionalCheckFailedException',
+                         'The conditional request failed')
+
+    @_operation('GetItem')
+    def get_item(self, TableName, Key, **params):
+        with self.lock:
+            table = self.table(TableName)
+            expressions = _Expressions(params)
+            projection = expressions.projection(
+                params.get('ProjectionExpression'))
+            expressions.check()
+            item = table.get(table.check_key(_load_item(Key)))
+            response = {}
+            if item is not None:
+                response['Item'] = copy.deepcopy(
+                    _project(item, projection) if projection else item)
+            capacity = _capacity(TableName, _read_units(
+                _item_size(item), params.get('ConsistentRead')), params)
+            if capacity:
+                response['ConsumedCapacity'] = capacity
+            return self._response(**response)
+
+    @_operation('PutItem')
+    def put_item(self, TableName, Item, **params):
+        with self.lock:
+            table = self.table(TableName)
+            item = _load_item(Item)
+            pk = table.check_item(item)
+            expressions = _Expressions(params)
+            old = table.get(pk)
+            self._check_condition(expressions,
+                                  params.get('ConditionExpression'), old)
+            expressions.check()
+            table.put(item)
+            response = {}
+            if old is not None and params.get('ReturnValues') == 'ALL_OLD':
+                response['Attributes'] = old
+            capacity = _capacity(TableName, _write_units(item, old), params)
+            if capacity:
+                response['ConsumedCapacity'] = capacity
+            return self._response(**response)
+
+    @_operation('DeleteItem')
+    def delete_item(self, TableName, Key, **params):
+        with self.lock:
+            table = self.table(TableName)
+            pk = table.check_key(_load_item(Key))
+            expressions = _Expressions(params)
+            old = table.get(pk)
+            self._check_condition(expressions,
+                                  params.get('ConditionExpression'), old)
+            expressions.check()
+            response = {}
+            if old is not None:
+                table.remove(old)
+                if params.get('ReturnValues') == 'ALL_OLD':
+                    response['Attributes'] = old
+            capacity = _capacity(TableName, _write_units(old or {}), params)
+            if capacity:
+                response['ConsumedCapacity'] = capacity
+            return self._response(**response)
+
+    @_operation('UpdateItem')
+    def update_item(self, TableName, Key, **params):
+        with self.lock:
+            table = self.table(TableName)
+            key = _load_item(Key)
+            pk = table.check_key(key)
+            expressions = _Expressions(params)
+            actions = expressions.update(params.get('UpdateExpression'))
+            old = table.get(pk)
+            self._check_condition(expressions,
+                                  params.get('ConditionExpression'), old)
+            expressions.check()
+            for clause, path, operand in actions:
+                if path[1][0] in key:
+                    raise _validation('One or more parameter values were '
+                                      'invalid: Cannot update attribute %s. '
+                                      'This attribute is part of the key'
+                                      % path[1][0])
+            item, updated = _apply_update(old or key, actions)
+            table.check_item(item)
+            table.put(item)
+            response = {}
+            ReturnValues = params.get('ReturnValues', 'NONE')
+            if ReturnValues == 'ALL_NEW':
+                response['Attributes'] = copy.deepcopy(item)
+            elif ReturnValues == 'ALL_OLD' and old is not None:
+                response['Attributes'] = old
+            elif ReturnValues == 'UPDATED_NEW':
+                response['Attributes'] = dict(
+                    (k, copy.deepcopy(item[k])) for k in updated if k in item)
+            elif ReturnValues == 'UPDATED_OLD' and old is not None:
+                response['Attributes'] = dict(
+                    (k, old[k]) for k in updated if k in old)
+            capacity = _capacity(TableName, _write_units(item, old or {}),
+                                 params)
+            if capacity:
+                response['ConsumedCapacity'] = capacity
+            return self._response(**response)
+
+    # reads
+
+    def _index(self, table, params):
+        name = params.get('IndexName')
+        if not name:
+            return table.primary
+        index = table.indexes.get(name)
+        if index is None:
+            raise _validation('The table does not have the specified index: '
+                              '%s' % name)
+        return index
+
+    def _output(self, table, index, item, projection, select):
+        if index.name is not None:
+            if select == 'ALL_ATTRIBUTES' or (projection and not index.is_global):
+                if index.is_global and \
+                        index.projection.get('ProjectionType') != 'ALL':
+                    raise _validation('One or more parameter values were '
+                                      'invalid: Select type ALL_ATTRIBUTES is '
+                                      'not supported for global secondary '
+                                      'index %s because its projection type '
+                                      'is not ALL' % index.name)
+            else:
+                item = index.projected(item)
+        if projection:
+            item = _project(item, projection)
+        return copy.deepcopy(item)
+
+    def _start_key(self, table, index, params):
+        start = params.get('ExclusiveStartKey')
+        if not start:
+            return None
+        start = _load_item(start)
+        table.check_key(dict((k, start[k]) for k in
+                             [table.hash_key, table.range_key] if k and
+                             k in start), exact=False)
+        key = index.sort_key(start)
+        if key is None:
+            raise _validation('The provided starting key is invalid')
+        return _sort_value(start[index.hash_key]), key
+
+    def _read(self, table, index, entries, params, expressions, filter_node):
+        # entries: iterator of primary keys in read order
+        limit = params.get('Limit')
+        if limit is not None and limit < 1:
+            raise _validation('Limit must be greater than or equal to 1')
+        page_size = self.page_size
+        if page_size and (limit is None or page_size < limit):
+            limit = page_size
+        projection = expressions.projection(params.get('ProjectionExpression'))
+        expressions.check()
+        select = params.get('Select')
+        items = []
+        count = scanned = size = 0
+        last = None
+        more = False
+        for pk in entries:
+            if limit is not None and scanned >= limit:
+                more = True
+                break
+            item = table.items[pk]
+            scanned += 1
+            size += _item_size(item)
+            last = item
+            if filter_node is not None and not _evaluate(filter_node, item):
+                continue
+            count += 1
+            if select != 'COUNT':
+                items.append(self._output(table, index, item, projection,
+                                          select))
+        response = {'Count': count, 'ScannedCount': scanned}
+        if select != 'COUNT':
+            response['Items'] = items
+        if more and last is not None:
+            response['LastEvaluatedKey'] = dict(
+                (k, last[k]) for k in index.key_names())
+        capacity = _capacity(table.name, _read_units(
+            size, params.get('ConsistentRead')), params)
+        if capacity:
+            response['ConsumedCapacity'] = capacity
+        return self._response(**response)
+
+    @_operation('Query')
+    def query(self, TableName, **params):
+        with self.lock:
+            table = self.table(TableName)
+            index = self._index(table, params)
+            expressions = _Expressions(params)
+            if not params.get('KeyConditionExpression'):
+                raise _validation('Either the KeyConditions or '
+                                  'KeyConditionExpression parameter must be '
+                                  'specified in the request.')
+            key_node = expressions.condition(params['KeyConditionExpression'])
+            filter_node = expressions.condition(params.get('FilterExpression'))
+            hash_value = self._hash_value(key_node, index)
+            forward = params.get('ScanIndexForward', True)
+            keys, pks = index.partitions.get(_sort_value(hash_value), ([], []))
+            start = self._start_key(table, index, params)
+            lo, hi = 0, len(keys)
+            if start is not None:
+                if forward:
+                    lo = bisect_right(keys, start[1])
+                else:
+                    hi = bisect_left(keys, start[1])
+            positions = range(lo, hi) if forward else range(hi - 1, lo - 1, -1)
+            entries = (pks[i] for i in positions
+                       if _evaluate(key_node, table.items[pks[i]]))
+            return self._read(table, index, entries, params, expressions,
+                              filter_node)
+
+    def _hash_value(self, node, index):
+        # the hash key equality of a key condition
+        if node[0] == 'and':
+            for sub in node[1:]:
+                value = self._hash_value_or_none(sub, index)
+                if value is not None:
+                    return value
+        value = self._hash_value_or_none(node, index)
+        if value is None:
+            raise _validation('Query condition missed key schema element: %s'
+                              % index.hash_key)
+        return value
+
+    def _hash_value_or_none(self, node, index):
+        if node[0] == 'and':
+            for sub in node[1:]:
+                value = self._hash_value_or_none(sub, index)
+                if value is not None:
+                    return value
+        if node[0] == 'cmp' and node[1] == '=':
+            for path, value in ((node[2], node[3]), (node[3], node[2])):
+                if path[0] == 'path' and path[1] == [index.hash_key] and \
+                        value[0] == 'value':
+                    return value[1]
+        return None
+
+    @_operation('Scan')
+    def scan(self, TableName, **params):
+        with self.lock:
+            table = self.table(TableName)
+            index = self._index(table, params)
+            expressions = _Expressions(params)
+            filter_node = expressions.condition(params.get('FilterExpression'))
+            segment = params.get('Segment')
+            total = params.get('TotalSegments')
+            if (segment is None) != (total is None) or \
+                    (total is not None and not 0 <= segment < total):
+                raise _validation('The Segment parameter is required but was '
+                                  'not present in the request when parameter '
+                                  'TotalSegments is present')
+            start = self._start_key(table, index, params)
+            hashes = index.hashes()
+            first = 0
+            if start is not None:
+                first = bisect_left(hashes, start[0])
+
+            def entries():
+                for i in range(first, len(hashes)):
+                    hash_value = hashes[i]
+                    if total and _segment_of(hash_value, total) != segment:
+                        continue
+                    keys, pks = index.partitions[hash_value]
+                    lo = 0
+                    if start is not None and hash_value == start[0]:
+                        lo = bisect_right(keys, start[1])
+                    for j in range(lo, len(keys)):
+                        yield pks[j]
+            return self._read(table, index, entries(), params, expressions,
+                              filter_node)
+
+    # batches
+
+    @_operation('BatchGetItem')
+    def batch_get_item(self, RequestItems, **params):
+        with self.lock:
+            total = sum(len(r['Keys']) for r in RequestItems.values())
+            if total > 100:
+                raise _validation('Too many items requested for the '
+                                  'BatchGetItem call')
+            # the keys from processed on are left for the next call
+            processed = total - (self._fault(self.unprocessed,
+                                             'BatchGetItem') or 0)
+            responses = {}
+            unprocessed = {}
+            capacities = []
+            for name, request in RequestItems.items():
+                table = self.table(name)
+                expressions = _Expressions(request)
+                projection = expressions.projection(
+                    request.get('ProjectionExpression'))
+                expressions.check()
+                seen = set()
+                items = []
+                size = 0
+                for key in request['Keys']:
+                    pk = table.check_key(_load_item(key))
+                    if pk in seen:
+                        raise _validation('Provided list of item keys '
+                                          'contains duplicates')
+                    seen.add(pk)
+                    processed -= 1
+                    if processed < 0:
+                        unprocessed.setdefault(
+                            name, dict(request, Keys=[]))['Keys'].append(key)
+                        continue
+                    item = table.get(pk)
+                    if item is not None:
+                        size += _item_size(item)
+                        items.append(copy.deepcopy(
+                            _project(item, projection) if projection
+                            else item))
+                responses[name] = items
+                capacity = _capacity(name, _read_units(
+                    size, request.get('ConsistentRead')), params)
+                if capacity:
+                    capacities.append(capacity)
+            response = {'Responses': responses,
+                        'UnprocessedKeys': unprocessed}
+            if capacities:
+                response['ConsumedCapacity'] = capacities
+            return self._response(**response)
+
+    @_operation('BatchWriteItem')
+    def batch_write_item(self, RequestItems, **params):
+        with self.lock:
+            total = sum(len(r) for r in RequestItems.values())
+            if total > 25:
+                raise _validation('Too many items requested for the '
+                                  'BatchWriteItem call')
+            processed = total - (self._fault(self.unprocessed,
+                                             'BatchWriteItem') or 0)
+            capacities = []
+            writes = []
+            unprocessed = {}
+            for name, requests in RequestItems.items():
+                table = self.table(name)
+                seen = set()
+                for request in requests:
+                    if 'PutRequest' in request:
+                        item = _load_item(request['PutRequest']['Item'])
+                        pk = table.check_item(item)
+                    else:
+                        item = None
+                        pk = table.check_key(
+                            _load_item(request['DeleteRequest']['Key']))
+                    if pk in seen:
+                        raise _validation('Provided list of item keys '
+                                          'contains duplicates')
+                    seen.add(pk)
+                    processed -= 1
+                    if processed < 0:
+                        unprocessed.setdefault(name, []).append(request)
+                    else:
+                        writes.append((table, pk, item))
+            units = {}
+            for table, pk, item in writes:
+                old = table.get(pk)
+                if item is None:
+                    if old is not None:
+                        table.remove(old)
+                else:
+                    table.put(item)
+                units[table.name] = units.get(table.name, 0) + \
+                    _write_units(item or {}, old or {})
+            for name, value in units.items():
+                capacity = _capacity(name, value, params)
+                if capacity:
+                    capacities.append(capacity)
+            response = {'UnprocessedItems': unprocessed}
+            if capacities:
+                response['ConsumedCapacity'] = capacities
+            return self._response(**response)
+
+
+def _expand_conditions(params):
+    # boto3 condition objects to expression strings, as the resource
+    # layer does before sending a request
+    from boto3.dynamodb.conditions import (ConditionBase,
+                                           ConditionExpressionBuilder)
+    builder = ConditionExpressionBuilder()
+    params = dict(params)
+    names = dict(params.get('ExpressionAttributeNames') or {})
+    values = dict(params.get('ExpressionAttributeValues') or {})
+    for name in ('ConditionExpression', 'FilterExpression',
+                 'KeyConditionExpression'):
+        condition = params.get(name)
+        if isinstance(condition, ConditionBase):
+            built = builder.build_expression(
+                condition, is_key_condition=name == 'KeyConditionExpression')
+            params[name] = built.condition_expression
+            names.update(built.attribute_name_placeholders)
+            values.update(built.attribute_value_placeholders)
+    if names:
+        params['ExpressionAttributeNames'] = names
+    if values:
+        params['ExpressionAttributeValues'] = values
+    return params
+
+
+class MemoryClient(object):
+    '''
+    The low-level client: requests and responses in the wire format.
+    '''
+
+    def __init__(self, store):
+        self.store = store
+        self.meta = _ClientMeta()
+
+    def _values_in(self, params):
+        params = dict(params)
+        for name in ('Key', 'Item', 'ExclusiveStartKey',
+                     'ExpressionAttributeValues'):
+            if params.get(name):
+                params[name] = _python_item(params[name])
+        return params
+
+    def _out(self, response):
+        for name in ('Item', 'Attributes', 'LastEvaluatedKey'):
+            if name in response:
+                response[name] = _wire_item(response[name])
+        if 'Items' in response:
+            response['Items'] = [_wire_item(i) for i in response['Items']]
+        return response
+
+    def create_table(self, **params):
+        return self.store.create_table(**params)
+
+    def describe_table(self, **params):
+        return self.store.describe_table(**params)
+
+    def delete_table(self, **params):
+        return self.store.delete_table(**params)
+
+    def update_table(self, **params):
+        return self.store.update_table(**params)
+
+    def list_tables(self, **params):
+        return self.store.list_tables(**params)
+
+    def get_item(self, **params):
+        return self._out(self.store.get_item(**self._values_in(params)))
+
+    def put_item(self, **params):
+        return self._out(self.store.put_item(**self._values_in(params)))
+
+    def delete_item(self, **params):
+        return self._out(self.store.delete_item(**self._values_in(params)))
+
+    def update_item(self, **params):
+        return self._out(self.store.update_item(**self._values_in(params)))
+
+    def query(self, **params):
+        return self._out(self.store.query(**self._values_in(params)))
+
+    def scan(self, **params):
+        return self._out(self.store.scan(**self._values_in(params)))
+
+    def batch_get_item(self, RequestItems, **params):
+        requests = {}
+        for name, request in RequestItems.items():
+            request = self._values_in(request)
+            request['Keys'] = [_python_item(k) for k in request['Keys']]
+            requests[name] = request
+        response = self.store.batch_get_item(requests, **params)
+        response['Responses'] = dict(
+            (name, [_wire_item(i) for i in items])
+            for name, items in response['Responses'].items())
+        for name, request in response['UnprocessedKeys'].items():
+            request['Keys'] = [_wire_item(k) for k in request['Keys']]
+        return response
+
+    def batch_write_item(self, RequestItems, **params):
+        requests = {}
+        for name, items in RequestItems.items():
+            requests[name] = []
+            for request in items:
+                if 'PutRequest' in request:
+                    request = {'PutRequest': {'Item': _python_item(
+                        request['PutRequest']['Item'])}}
+                else:
+                    request = {'DeleteRequest': {'Key': _python_item(
+                        request['DeleteRequest']['Key'])}}
+                requests[name].append(request)
+        response = self.store.batch_write_item(requests, **params)
+        for name, items in response['UnprocessedItems'].items():
+            for request in items:
+                for value in request.values():
+                    for k in ('Item', 'Key'):
+                        if k in value:
+                            value[k] = _wire_item(value[k])
+        return response
+
+
+class _ClientMeta(object):
+
+    def __init__(self):
+        self.endpoint_url = 'memory://'
+        self.region_name = 'memory'
+
+
+class _ResourceMeta(object):
+
+    def __init__(self, client):
+        self.client = client
+
+
+class MemoryBatchWriter(object):
+    '''
+    Table.batch_writer(): buffers puts and deletes, 25 a request.
+    '''
+
+    def __init__(self, table, overwrite_by_pkeys=None):
+        self.table = table
+        self.overwrite_by_pkeys = overwrite_by_pkeys
+        self.requests = []
+
+    def _add(self, request, key):
+        if self.overwrite_by_pkeys:
+            pkey = [key.get(k) for k in self.overwrite_by_pkeys]
+            self.requests = [
+                r for r in self.requests
+                if [(r.get('PutRequest', {}).get('Item') or
+                     r['DeleteRequest']['Key']).get(k)
+                    for k in self.overwrite_by_pkeys] != pkey]
+        self.requests.append(request)
+        if len(self.requests) >= 25:
+            self._flush()
+
+    def put_item(self, Item):
+        self._add({'PutRequest': {'Item': Item}}, Item)
+
+    def delete_item(self, Key):
+        self._add({'DeleteRequest': {'Key': Key}}, Key)
+
+    def _flush(self):
+        requests, self.requests = self.requests, []
+        if requests:
+            self.table.store.batch_write_item({self.table.name: requests})
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self._flush()
+
+
+class MemoryTable(object):
+    '''
+    dynamodb.Table(name) of the resource layer.
+    '''
+
+    def __init__(self, store, name):
+        self.store = store
+        self.name = self.table_name = name
+
+    def _call(self, method, **params):
+        return getattr(self.store, method)(TableName=self.name,
+                                           **_expand_conditions(params))
+
+    def _description(self):
+        return self.store.describe_table(TableName=self.name)['Table']
+
+    @property
+    def item_count(self):
+        return self._description()['ItemCount']
+
+    @property
+    def table_status(self):
+        return self._description()['TableStatus']
+
+    @property
+    def key_schema(self):
+        return self._description()['KeySchema']
+
+    def load(self):
+        self._description()
+
+    def wait_until_exists(self):
+        self._description()
+
+    def wait_until_not_exists(self):
+        pass
+
+    def delete(self):
+        return self.store.delete_table(TableName=self.name)
+
+    def update(self, **params):
+        return self.store.update_table(TableName=self.name, **params)
+
+    def get_item(self, **params):
+        return self._call('get_item', **params)
+
+    def put_item(self, **params):
+        return self._call('put_item', **params)
+
+    def delete_item(self, **params):
+        return self._call('delete_item', **params)
+
+    def update_item(self, **params):
+        return self._call('update_item', **params)
+
+    def query(self, **params):
+        return self._call('query', **params)
+
+    def scan(self, **params):
+        return self._call('scan', **params)
+
+    def batch_writer(self, overwrite_by_pkeys=None):
+        return MemoryBatchWriter(self, overwrite_by_pkeys)
+
+
+class MemoryResource(object):
+    '''
+    Stands in for boto3.resource('dynamodb').
+    '''
+
+    def __init__(self, store=None, page_size=None):
+        self.store = store or MemoryStore(page_size=page_size)
+        self.meta = _ResourceMeta(MemoryClient(self.store))
+
+    def Table(self, name):
+        return MemoryTable(self.store, name)
+
+    def create_table(self, **params):
+        self.store.create_table(**params)
+        return self.Table(params['TableName'])
+
+    def batch_get_item(self, **params):
+        return self.store.batch_get_item(**params)
+
+    def batch_write_item(self, **params):
+        return self.store.batch_write_item(**params)
+
+
+_stores = {}
+_stores_lock = RLock()
+
+
+def backend(name='default', page_size=None):
+    '''
+    The MemoryResource of the named store, shared by every thread.
+    '''
+    with _stores_lock:
+        store = _stores.get(name)
+        if store is None:
+            store = _stores[name] = MemoryStore(page_size=page_size)
+        elif page_size is not None:
+            store.page_size = page_size
+    return MemoryResource(store)
+
+
+def reset(name=None):
+    '''
+    Drop the tables of the named store, of every store when None.
+    '''
+    with _stores_lock:
+        for key, store in _stores.items():
+            if name is None or key == name:
+                store.clear()
@@ -3,11 +3,14 @@ import copy
 
 from botocore.exceptions import ClientError
 
-from .table import Table
+from .table import get_table
+from .schema import ModelSchema
 from .query import Query
+from .batch import Put, Delete
 from .fields import Attribute
 from .errors import FieldValidationException, ValidationException, ClientException
-from .helpers import get_items_for_storage, cache_for
+from .connection import DEFAULT_ALIAS
+from .helpers import cache_for
 
 
 def _initialize_attributes(model_class, name, bases, attrs):
@@ -28,6 +31,7 @@ def _initialize_attributes(model_class, name, bases, attrs):
         if isinstance(v, Attribute):
             model_class._attributes[k] = v
             v.name = v.name or k
+            v.attname = '_' + v.name
 
 
 def _initialize_indexes(model_class, name, bases, attrs):
@@ -36,8 +40,9 @@ def _initialize_indexes(model_class, name, bases, attrs):
     """
     model_class._local_indexed_fields = []
     model_class._local_indexes = {}
-    model_class._global_indexed_fields = model_class.__global_index__
-    model_class._global_indexes = {}
+    model_class._global_indexed_fields = list(model_class.__global_index__)
+    model_class._global_indexes = dict(
+        (index.name, index) for index in model_class._global_indexed_fields)
     model_class._hash_key = None
     model_class._range_key = None
     for parent in bases:
@@ -61,6 +66,112 @@ def _initialize_indexes(model_class, name, bases, attrs):
         raise ValidationException('hash_key is required')
 
 
+_UNSET = object()
+# the methods building a model, those of Model once it is declared
+_MODEL_HOOKS = ('__init__', 'update_attributes', '__setattr__')
+_model_hooks = None
+
+# instance attributes of Model besides the field values, slots of compact
+# models
+INSTANCE_ATTRIBUTES = ('errors', '_errors', 'ConditionExpression',
+                       'ExpressionAttributeValues', 'ExpressionAttributeNames')
+
+
+def _compact_slots(bases, attrs):
+    """
+    The __slots__ of a compact model: a slot a field value and the
+    instance attributes, but those of its bases.
+    """
+    inherited = set()
+    for base in bases:
+        for klass in base.__mro__:
+            inherited.update(klass.__dict__.get('__slots__', ()))
+    names = ['_' + (v.name or k) for k, v in sorted(attrs.items())
+             if isinstance(v, Attribute)]
+    return tuple(name for name in names + list(INSTANCE_ATTRIBUTES)
+                 if name not in inherited)
+
+
+def _lookup(klass, name):
+    # the class attribute name of klass, as its __dict__ holds it
+    for base in klass.__mro__:
+        if name in base.__dict__:
+            return base.__dict__[name]
+
+
+def _plain_init(model_class):
+    # the hooks of Model and Attribute.__set__ are not overridden: a model
+    # can be filled in without them
+    if _model_hooks is None:
+        return False
+    if any(_lookup(model_class, name) is not method
+           for name, method in _model_hooks.items()):
+        return False
+    return all(type(field).__set__ == Attribute.__set__
+               for field in model_class._fields)
+
+
+def _compile_storage(model_class):
+    """
+    The field table of the model and its storage functions, built once:
+    from_storage(item) gives the field values of a stored item,
+    to_storage(instance) the storage values of a model (Model.item
+    without the validation), loader(readers) the function building the
+    model of an item in one pass, readers (name: function) turning its
+    values into field values, and load(item) that of a stored item.
+    """
+    attributes = model_class._attributes
+    model_class._fields = tuple(attributes.values())
+    model_class._fields_by_name = dict(
+        (field.name, field) for field in model_class._fields)
+    readers = dict((name, field.typecast_for_read)
+                   for name, field in attributes.items())
+    writers = tuple((name, field.attname, field.typecast_for_storage)
+                    for name, field in attributes.items())
+
+    def from_storage(item):
+        return dict((name, readers[name](value))
+                    for name, value in item.iteritems() if name in readers)
+
+    def to_storage(instance):
+        data = {}
+        for name, attname, typecast in writers:
+            value = getattr(instance, attname, _UNSET)
+            if value is _UNSET:
+                # through the descriptor, the field gets its default
+                value = getattr(instance, name)
+            if value is not None:
+                data[name] = typecast(value)
+        return data
+
+    if _plain_init(model_class):
+        def loader(readers):
+            # the values set as update_attributes() does
+            loaders = dict((name, (attributes[name].attname, reader))
+                           for name, reader in readers.items())
+
+            def load(item):
+                instance = model_class.__new__(model_class)
+                for name, value in item.iteritems():
+                    loader = loaders.get(name)
+                    if loader is not None:
+                        setattr(instance, loader[0], loader[1](value))
+                return instance
+            return load
+    else:
+        def loader(readers):
+            def load(item):
+                return model_class(**dict(
+                    (name, readers[name](value))
+                    for name, value in item.iteritems() if name in readers))
+            return load
+
+    model_class._from_storage = staticmethod(from_storage)
+    model_class._to_storage = staticmethod(to_storage)
+    model_class._loader = staticmethod(loader)
+    model_class._load = staticmethod(loader(readers))
+
+
 class ModelMetaclass(type):
 
     """
@@ -71,16 +182,50 @@ class ModelMetaclass(type):
     __global_index__ = []
     __local_index__ = {}
 
+    def __new__(mcs, name, bases, attrs):
+        compact = attrs.get('__compact__', any(
+            getattr(base, '__compact__', False) for base in bases))
+        if compact and '__slots__' not in attrs:
+            attrs['__slots__'] = _compact_slots(bases, attrs)
+        return super(ModelMetaclass, mcs).__new__(mcs, name, bases, attrs)
+
     def __init__(cls, name, bases, attrs):
         super(ModelMetaclass, cls).__init__(name, bases, attrs)
         name = cls.__table_name__ or name
         _initialize_attributes(cls, name, bases, attrs)
+        _compile_storage(cls)
         _initialize_indexes(cls, name, bases, attrs)
+        cls._slot_names = tuple(
+            slot for klass in cls.__mro__
+            for slot in klass.__dict__.get('__slots__', ()))
+        cls._schema = ModelSchema(cls) if cls._hash_key else None
 
 
 class ModelBase(object):
 
     __metaclass__ = ModelMetaclass
+    # no per instance __dict__ for the models declaring __compact__ = True,
+    # their values are kept in slots
+    __slots__ = ()
+    __compact__ = False
+    __connection__ = DEFAULT_ALIAS
+    # client option overrides, ex: {'max_pool_connections': 64}
+    __connection_options__ = {}
+    # 'resource': boto3 resource layer, 'client': low-level client with
+    # the model's precompiled wire codec (see codec.py)
+    __engine__ = 'resource'
+
+    def __getstate__(self):
+        # compact models keep their values in slots, not in __dict__
+        state = dict(getattr(self, '__dict__', {}))
+        for name in self._slot_names:
+            if hasattr(self, name):
+                state[name] = getattr(self, name)
+        return state
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
 
     @classmethod
     def create(cls, **kwargs):
@@ -88,7 +233,7 @@ class ModelBase(object):
         if not instance.is_valid():
             raise ValidationException(instance.errors)
         try:
-            Table(instance).put_item(instance.item)
+            get_table(instance).put_item(instance.item)
             item = cls(**instance.item)
             return item
         except ClientError as e:
@@ -130,47 +275,71 @@ class ModelBase(object):
         if not self.validate_attrs(**kwargs):
             raise FieldValidationException(self._errors)
         for k, v in kwargs.items():
-            field = self.attributes[k]
+            field = self._attributes[k]
             update_fields[k] = field.typecast_for_storage(v)
         # use storage value
-        item = Table(self).update_item(
+        table = get_table(self)
+        item = table.update_item(
             update_fields, *args, **params)
-        value_for_read = self._get_values_for_read(item)
+        value_for_read = table.read_values(item)
         for k, v in value_for_read.items():
             setattr(self, k, v)
         return self
 
+    @classmethod
+    def _table(cls):
+        # the Table of the model, on an instance without values
+        return get_table(cls.__new__(cls))
+
     @classmethod
     def get(cls, **primary_key):
-        instance = cls(**primary_key)
-        item = Table(instance).get_item()
+        table = cls._table()
+        item = table.get_item(Key=table._get_primary_key(**primary_key))
         if not item:
             return None
-        value_for_read = instance._get_values_for_read(item)
-        return cls(**value_for_read)
+        return table.load(item)
 
     @classmethod
-    def batch_get(cls, *primary_keys):
-        instance = cls()
-        items = Table(instance).batch_get_item(*primary_keys)
-        results = []
-        for item in items:
-            value_for_read = instance._get_values_for_read(item)
-            results.append(cls(**value_for_read))
-        return results
+    def batch_get(cls, *primary_keys, **kwargs):
+        '''
+        Models of primary_keys in the same order, None for missing items;
+        with raw=True dicts of the read values instead of models.
+        kwargs: concurrency, consistent, max_attempts (see batch.batch_get)
+        '''
+        raw = kwargs.pop('raw', False)
+        table = cls._table()
+        items = table.batch_get_item(*primary_keys, **kwargs)
+        load = table.read_values if raw else table.load
+        return [None if item is None else load(item) for item in items]
 
     @classmethod
-    def batch_write(cls, kwargs, overwrite=False):
+    def batch_write(cls, kwargs, overwrite=False, **options):
         '''
-        kwargs: items list
+        kwargs: items, any iterable of field values dicts or batch.Delete
+        options: workers, max_attempts (see batch.batch_write)
+        returns a batch.BatchWriteStats
         '''
-        items = get_items_for_storage(cls, kwargs)
+        def requests():
+            for item in kwargs:
+                if isinstance(item, Delete):
+                    yield item
+                else:
+                    yield Put(cls(**item).item)
         instance = cls()
-        return Table(instance).batch_write(items, overwrite=overwrite)
+        return get_table(instance).batch_write(requests(),
+                                               overwrite=overwrite, **options)
+
+    @classmethod
+    def batch_delete(cls, primary_keys, **options):
+        '''
+        primary_keys: any iterable of primary key dicts
+        '''
+        return cls.batch_write((Delete(**key) for key in primary_keys),
+                               **options)
 
     def delete(self):
         # delete an item
-        return Table(self).delete_item()
+        return get_table(self).delete_item()
 
     @classmethod
     def query(cls, *args):
@@ -178,17 +347,32 @@ class ModelBase(object):
         return Query(instance, *args)
 
     @classmethod
-    def scan(cls):
-        instance = cls()
-        return Table(instance).scan()
+    def scan(cls, *args, **kwargs):
+        '''
+        Iterate over the models of the table, args: where() conditions
+        kwargs: segments, workers, start_keys, buffer_size (see
+        scan.ParallelScan), fields (projection), consistent; with
+        processes, map or reduce the segments are scanned in worker
+        processes (see scan.ProcessScan)
+        ex: Movies.scan(Movies.rating.gt(7), segments=8)
+        '''
+        query = cls.query(*kwargs.pop('fields', ())).scan
+        if kwargs.pop('consistent', False):
+            query = query.consistent
+        if args:
+            query = query.where(*args)
+        segments = kwargs.pop('segments', 1)
+        if set(kwargs) & set(('processes', 'map', 'reduce')):
+            return query.processes(segments, **kwargs)
+        return query.parallel(segments, **kwargs)
 
     @classmethod
     def item_count(cls):
         instance = cls()
-        return Table(instance).item_count()
+        return get_table(instance).item_count()
 
     def write(self):
-        item = Table(self).put_item(self.item)
+        item = get_table(self).put_item(self.item)
         return item
 
     def save(self, overwrite=False):
@@ -200,9 +384,11 @@ class ModelBase(object):
 
 class Model(ModelBase):
 
+    __slots__ = ()
+    projections = ()
+
     def __init__(self, **kwargs):
         self.update_attributes(**kwargs)
-        self.projections = []
 
     def is_valid(self):
         """
@@ -228,7 +414,7 @@ class Model(ModelBase):
         You may want to use ``validate`` described below to validate your model
         """
         self.errors = []
-        for field in self.fields:
+        for field in self._fields:
             try:
                 field.validate(self)
             except FieldValidationException as e:
@@ -239,7 +425,7 @@ class Model(ModelBase):
     def validate_attrs(self, **kwargs):
         self._errors = []
         for attr, value in kwargs.iteritems():
-            field = self.attributes.get(attr)
+            field = self._attributes.get(attr)
             if not field:
                 raise ValidationException('Field not found: %s' % attr)
             instance = copy.deepcopy(self)
@@ -284,11 +470,12 @@ class Model(ModelBase):
         'Tesla'
         """
         params = {}
-        attrs = self.attributes.values()
-        for att in attrs:
-            if att.name in kwargs:
-                att.__set__(self, kwargs[att.name])
-                params[att.name] = kwargs[att.name]
+        fields = self._fields_by_name
+        for name, value in kwargs.iteritems():
+            field = fields.get(name)
+            if field is not None:
+                field.__set__(self, value)
+                params[name] = value
         return params
 
     @property
@@ -302,28 +489,19 @@ class Model(ModelBase):
     @property
     def fields(self):
         """Returns the list of field names of the model."""
-        return self.attributes.values()
+        return list(self._fields)
 
     def _get_values_for_read(self, values):
-        read_values = {}
-        for att, value in values.iteritems():
-            if att not in self.attributes:
-                continue
-            descriptor = self.attributes[att]
-            _value = descriptor.typecast_for_read(value)
-            read_values[att] = _value
-        return read_values
+        return self._from_storage(values)
 
     def _get_values_for_storage(self):
-        data = {}
         if not self.is_valid():
             raise FieldValidationException(self.errors)
-        for attr, field in self.attributes.iteritems():
-            value = getattr(self, attr)
-            if value is not None:
-                data[attr] = field.typecast_for_storage(value)
-        return data
+        return self._to_storage(self)
 
     @property
     def item(self):
         return self._get_values_for_storage()
+
+
+_model_hooks = dict((name, _lookup(Model, name)) for name in _MODEL_HOOKS)
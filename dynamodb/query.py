@@ -1,124 +1,421 @@
 #! -*- coding: utf-8 -*-
 from __future__ import print_function
 
-import copy
+import threading
 
-from .table import Table
+from six.moves import queue
+
+from .table import get_table
 from .fields import Fields
-from .connection import db
-from .errors import FieldValidationException
+from .expression import Bind
+from .errors import FieldValidationException, ParameterException
 
 
 class Paginator(object):
+    '''
+    Pages of a query as raw responses, like the boto3 paginator:
+
+        paginator = Paginator(Movies())
+        for response in paginator.query(KeyConditionExpression=...,
+                                        PageSize=20, MaxItems=100):
+            response['Items'], response.get('NextToken')
+
+    NextToken is a cursor (see cursor.py), pass it back as StartingToken
+    to go on from there. The Items are those of the resource layer on
+    both engines.
+    '''
 
     def __init__(self, model_object):
         self.model_object = model_object
 
     def query(self, **kwargs):
         '''
-        response_iterator = paginator.paginate(
-            TableName='string',
-            IndexName='string',
-            Select='ALL_ATTRIBUTES'|'ALL_PROJECTED_ATTRIBUTES'|'SPECIFIC_ATTRIBUTES'|'COUNT',
-            ConsistentRead=True|False,
-            ScanIndexForward=True|False,
-            ReturnConsumedCapacity='INDEXES'|'TOTAL'|'NONE',
-            ProjectionExpression='string',
-            FilterExpression='string',
-            KeyConditionExpression='string',
-            ExpressionAttributeNames={
-                'string': 'string'
-            },
-            ExpressionAttributeValues={
-                'string': {
-                    'S': 'string',
-                    'N': 'string',
-                    'B': b'bytes',
-                    'SS': [
-                        'string',
-                    ],
-                    'NS': [
-                        'string',
-                    ],
-                    'BS': [
-                        b'bytes',
-                    ],
-                    'M': {
-                        'string': {'... recursive ...'}
-                    },
-                    'L': [
-                        {'... recursive ...'},
-                    ],
-                    'NULL': True|False,
-                    'BOOL': True|False
-                }
-            },
-            PaginationConfig={
-                'MaxItems': 123,
-                'PageSize': 123,
-                'StartingToken': 'string'
-            }
-        )
+        kwargs: the parameters of Table.query, with the pagination options
+        MaxItems (total), PageSize (Limit of a request), StartingToken
+        (a NextToken) and secret (to sign the tokens)
         '''
-        client = db.meta.client
-        paginator = client.get_paginator('query')
-        limit = kwargs.pop('Limit', None)
-        kwargs['TableName'] = self.model_object.__table_name__
-        if limit is not None:
-            pagination_config = {
-                'MaxItems': limit,
-                'PageSize': limit,
-                'StaringToken': '123232'
-            }
-            kwargs['PaginationConfig'] = pagination_config
-        # response = paginator.paginate(**kwargs).build_full_result()
-        response = paginator.paginate(**kwargs)
-        for item in response:
-            pass
-        return item
+        return self._paginate('query', **kwargs)
+
+    def scan(self, **kwargs):
+        return self._paginate('scan', **kwargs)
+
+    def _paginate(self, method, **kwargs):
+        from .cursor import encode_cursor, decode_cursor
+        max_items = kwargs.pop('MaxItems', kwargs.pop('Limit', None))
+        page_size = kwargs.pop('PageSize', None)
+        secret = kwargs.pop('secret', None)
+        token = kwargs.pop('StartingToken', None)
+        if token:
+            kwargs['ExclusiveStartKey'] = decode_cursor(
+                token, self.model_object.__class__, secret=secret)
+        table = get_table(self.model_object)
+        func = getattr(table, method)
+        count = 0
+        while True:
+            limit = page_size
+            if max_items:
+                left = max_items - count
+                limit = min(limit, left) if limit else left
+            if limit:
+                kwargs['Limit'] = limit
+            response = func(**kwargs)
+            response['Items'] = [table.plain_item(item)
+                                 for item in response['Items']]
+            count += len(response['Items'])
+            LastEvaluatedKey = response.get('LastEvaluatedKey')
+            if LastEvaluatedKey:
+                response['NextToken'] = encode_cursor(LastEvaluatedKey,
+                                                      secret=secret)
+            yield response
+            if not LastEvaluatedKey or (max_items and count >= max_items):
+                return
+            kwargs['ExclusiveStartKey'] = LastEvaluatedKey
+
+
+class QueryIterator(object):
+    '''
+    Models of a query or scan, following LastEvaluatedKey. One page is
+    held at a time and its items become models as they are consumed; a
+    limit() caps the total. last_evaluated_key is where to start again
+    (see Query.start_key), None once everything has been read.
+    With prefetch (Query.prefetch) a thread reads up to that many pages
+    ahead of the consumer, it stops when the iterator is closed.
+    The pages of a KEYS_ONLY or INCLUDE index are read again from the
+    table (BatchGetItem) for full models, in the index order.
+    '''
+
+    def __init__(self, query, prefetch=0, params=None):
+        self.query = query
+        self.model_class = query.model_class
+        if params is None:
+            params = query._get_query_params()
+        self.params = dict(params)
+        self.method = 'scan' if query.Scan else 'query'
+        self.hydrate = query._hydrates(self.params)
+        if self.hydrate:
+            # the index gives the keys, the table the attributes
+            self.params.pop('ProjectionExpression', None)
+        self.Limit = self.params.get('Limit')
+        self.prefetch = prefetch
+        self.count = 0
+        self.scanned_count = 0
+        self.key_names = query._start_key_names(self.params)
+        self._table = None
+        self._last_item = None
+        self._next_key = self.params.get('ExclusiveStartKey')
+        self._iterator = self._iterate()
+
+    @property
+    def last_evaluated_key(self):
+        if self._last_item is not None:
+            # stopped within a page: resume after the last model handed out
+            return self._table.item_key(self._last_item, self.key_names)
+        return self._next_key
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._iterator)
+
+    next = __next__
+
+    def close(self):
+        # stops the read-ahead thread
+        self._iterator.close()
+
+    def _pages(self, table, stop=None):
+        # (items, LastEvaluatedKey, ScannedCount) of every page
+        func = getattr(table, self.method)
+        Limit = self.Limit
+        params = dict(self.params)
+        fetched = 0
+        while stop is None or not stop.is_set():
+            if Limit:
+                # no need to read more than what is left
+                params['Limit'] = Limit - fetched
+            response = func(**params)
+            items = response['Items']
+            fetched += len(items)
+            if self.hydrate:
+                items = table.hydrate(
+                    items, consistent=params.get('ConsistentRead', False))
+            LastEvaluatedKey = response.get('LastEvaluatedKey')
+            yield items, LastEvaluatedKey, response.get('ScannedCount', 0)
+            if not LastEvaluatedKey or (Limit and fetched >= Limit):
+                return
+            params['ExclusiveStartKey'] = LastEvaluatedKey
+
+    def _read_ahead(self, pages, stop):
+        table = get_table(self.query.instance)
+        try:
+            for page in self._pages(table, stop):
+                _put(pages, page, stop)
+        except Exception as e:
+            _put(pages, _Error(e), stop)
+        else:
+            _put(pages, None, stop)
+
+    def _prefetched(self):
+        stop = threading.Event()
+        pages = queue.Queue(self.prefetch)
+        thread = threading.Thread(target=self._read_ahead, args=(pages, stop))
+        thread.daemon = True
+        thread.start()
+        try:
+            while True:
+                page = pages.get()
+                if page is None:
+                    return
+                if isinstance(page, _Error):
+                    raise page.error
+                yield page
+        finally:
+            # consumer gone or done: the thread stops after its request
+            stop.set()
+            thread.join()
+
+    def _iterate(self):
+        self._table = table = get_table(self.query.instance)
+        load, Limit = self.query._results(table), self.Limit
+        if self.prefetch:
+            pages = self._prefetched()
+        else:
+            pages = self._pages(table)
+        try:
+            for items, LastEvaluatedKey, scanned in pages:
+                self.scanned_count += scanned
+                last = len(items) - 1
+                for position, item in enumerate(items):
+                    self.count += 1
+                    self._last_item = item if position < last else None
+                    if self._last_item is None:
+                        self._next_key = LastEvaluatedKey
+                    yield load(item)
+                    if Limit and self.count >= Limit:
+                        return
+                self._last_item = None
+                self._next_key = LastEvaluatedKey
+        finally:
+            pages.close()
+
+
+class _Error(object):
+
+    def __init__(self, error):
+        self.error = error
+
+
+def _put(pages, page, stop):
+    # wait for room in the queue, or for the consumer to leave
+    while not stop.is_set():
+        try:
+            pages.put(page, timeout=0.1)
+            return
+        except queue.Full:
+            continue
+
+
+def count_pages(func, params):
+    # (Count, ScannedCount) summed over the pages of func (query or scan)
+    params = dict(params)
+    count = scanned = 0
+    while True:
+        response = func(**params)
+        count += response.get('Count', 0)
+        scanned += response.get('ScannedCount', 0)
+        LastEvaluatedKey = response.get('LastEvaluatedKey')
+        if not LastEvaluatedKey:
+            return count, scanned
+        params['ExclusiveStartKey'] = LastEvaluatedKey
+
+
+def _page(query, params, size, cursor, secret):
+    from .cursor import encode_cursor, decode_cursor
+    params = dict(params, Limit=size)
+    params.pop('ExclusiveStartKey', None)
+    if cursor:
+        params['ExclusiveStartKey'] = decode_cursor(
+            cursor, query.model_class, secret=secret)
+    iterator = QueryIterator(query, params=params)
+    items = list(iterator)
+    return items, encode_cursor(iterator.last_evaluated_key, secret=secret)
+
+
+class PreparedQuery(object):
+    '''
+    A query compiled once: the condition expressions and their name and
+    value placeholders are built by Query.prepare(), a run only fills in
+    the values of the bind() placeholders.
+
+        by_year = (Movies.query()
+                   .where(Movies.year.eq(bind('year')))
+                   .order_by(Movies.rating, asc=False)
+                   .limit(10)
+                   .prepare())
+        movies = by_year.all(year=1992)
+    '''
+
+    def __init__(self, query):
+        from boto3.dynamodb.conditions import (ConditionBase,
+                                               ConditionExpressionBuilder)
+        self.query = query
+        self.method = 'scan' if query.Scan else 'query'
+        params = query._get_query_params(binds=True)
+        builder = ConditionExpressionBuilder()
+        names, values = {}, {}
+        for name in ('KeyConditionExpression', 'FilterExpression'):
+            condition = params.get(name)
+            if isinstance(condition, ConditionBase):
+                built = builder.build_expression(
+                    condition,
+                    is_key_condition=name == 'KeyConditionExpression')
+                params[name] = built.condition_expression
+                names.update(built.attribute_name_placeholders)
+                values.update(built.attribute_value_placeholders)
+        if names:
+            params['ExpressionAttributeNames'] = names
+        self.binds = tuple((label, value) for label, value in values.items()
+                           if isinstance(value, Bind))
+        self.bind_names = frozenset(value.name for _, value in self.binds)
+        self.values = dict((label, value) for label, value in values.items()
+                           if not isinstance(value, Bind))
+        self._params = params
+
+    def params(self, **values):
+        '''
+        request parameters with values for the bind() placeholders
+        '''
+        if set(values) != self.bind_names:
+            missing = self.bind_names.difference(values)
+            if missing:
+                raise ParameterException('missing bind values: %s'
+                                         % ', '.join(sorted(missing)))
+            raise ParameterException('unknown bind values: %s' % ', '.join(
+                sorted(set(values).difference(self.bind_names))))
+        params = dict(self._params)
+        attribute_values = dict(self.values)
+        for label, placeholder in self.binds:
+            value = values[placeholder.name]
+            if placeholder.field is not None:
+                value = placeholder.field.typecast_for_storage(value)
+            attribute_values[label] = value
+        if attribute_values:
+            params['ExpressionAttributeValues'] = attribute_values
+        return params
+
+    def iter(self, **values):
+        return QueryIterator(self.query, prefetch=self.query.Prefetch,
+                             params=self.params(**values))
+
+    all = iter
+
+    def first(self, **values):
+        params = dict(self.params(**values), Limit=1)
+        return next(QueryIterator(self.query, params=params), None)
+
+    def page(self, size, cursor=None, secret=None, **values):
+        return _page(self.query, self.params(**values), size, cursor, secret)
+
+    def count(self, scanned=False, **values):
+        params = self.params(**values)
+        for name in ('ProjectionExpression', 'Limit'):
+            params.pop(name, None)
+        params['Select'] = 'COUNT'
+        table = get_table(self.query.instance)
+        result = count_pages(getattr(table, self.method), params)
+        return result if scanned else result[0]
+
+
+# key condition operators, the more selective first
+KEY_OPERATORS = {'eq': 4, 'between': 3, 'begins_with': 2,
+                 'gt': 1, 'gte': 1, 'lt': 1, 'lte': 1}
+
+
+class QueryPlan(object):
+    '''
+    How a query runs (Query.plan()): the operation, the index (None for
+    the table), its sort key, the fields of the key condition and of the
+    filter, and why the index was chosen.
+    '''
+
+    def __init__(self, operation, index_name, sort_key, key_conditions,
+                 filters, reason, partitions=0):
+        self.operation = operation
+        self.index_name = index_name
+        self.sort_key = sort_key
+        self.key_conditions = key_conditions
+        self.filters = filters
+        self.reason = reason
+        self.partitions = partitions
+
+    def __repr__(self):
+        return ('<QueryPlan %s index=%s sort_key=%s key_conditions=%s '
+                'filters=%s partitions=%s: %s>' % (
+                    self.operation, self.index_name, self.sort_key,
+                    self.key_conditions, self.filters, self.partitions,
+                    self.reason))
 
 
 class Query(object):
+    '''
+    Query builder. A query does not change once built: where(), limit(),
+    order_by()... return a new Query sharing everything but what they
+    set, the defaults are class attributes.
+    '''
+
+    Scan = False
+    ProjectionExpression = ()  # names, see table._projection
+    ReturnConsumedCapacity = 'TOTAL'  # 'INDEXES'|'TOTAL'|'NONE'
+    ConsistentRead = False
+    FilterExpression = None
+    ExclusiveStartKey = None  # 起始查询的key，就是上一页的最后一条数据
+    KeyConditionExpression = None
+    ExpressionAttributeNames = {}
+    ExpressionAttributeValues = {}
+    ScanIndexForward = None    # True|False, None: not sent
+    ConditionalOperator = None  # 'AND'|'OR'
+    IndexName = None
+    Select = 'ALL_ATTRIBUTES'  # 'ALL_ATTRIBUTES'|'ALL_PROJECTED_ATTRIBUTES'|'SPECIFIC_ATTRIBUTES'|'COUNT'
+    Offset = None
+    Limit = None
+    filter_args = ()   # filter expression args
+    filter_index_field = None  # index field name
+    Prefetch = 0  # pages read ahead by iter()
+    hash_values = ()  # hash key is_in: a query a partition
+    value_names = None  # values()/values_list(): the fields returned
+    value_mode = None  # None: models, 'dict'|'tuple'|'flat'
+    AnyOrder = False  # the planner may ignore the index of order_by()
 
     def __init__(self, model_object, *args, **kwargs):
-        self.Scan = False
         self.model_object = model_object
         self.model_class = self.model_object.__class__
-        self.instance = self.model_class()
-        self.ProjectionExpression = self._projection_expression(*args)
-        self.ReturnConsumedCapacity = 'TOTAL'  # 'INDEXES'|'TOTAL'|'NONE'
-        self.ConsistentRead = False
-        self.FilterExpression = None
-        self.ExclusiveStartKey = None  # 起始查询的key，就是上一页的最后一条数据
-        self.KeyConditionExpression = None
-        self.ExpressionAttributeNames = {}
-        self.ExpressionAttributeValues = {}
-        self.ScanIndexForward = False    # True|False
-        self.ConditionalOperator = None  # 'AND'|'OR'
-        self.IndexName = None
-        self.Select = 'ALL_ATTRIBUTES'  # 'ALL_ATTRIBUTES'|'ALL_PROJECTED_ATTRIBUTES'|'SPECIFIC_ATTRIBUTES'|'COUNT'
-        self.Offset = None
-        self.Limit = None
-        self.scaned_count = 0
-        self.count = 0
-        self.query_params = {}
-        self.filter_args = []   # filter expression args
-        self.filter_index_field = None  # index field name
+        self.instance = model_object
+        if args:
+            self.ProjectionExpression = self._projection_expression(*args)
+
+    def _replace(self, **changes):
+        # a copy of the query with changes, the values are shared
+        query = self.__class__.__new__(self.__class__)
+        query.__dict__ = dict(self.__dict__, **changes)
+        return query
 
     @property
     def consistent(self):
-        self.ConsistentRead = True
-        return copy.deepcopy(self)
+        return self._replace(ConsistentRead=True)
 
     @property
     def scan(self):
-        self.Scan = True
-        return copy.deepcopy(self)
+        return self._replace(Scan=True)
+
+    @property
+    def any_order(self):
+        # results in the order of the key the planner chooses, even with
+        # an order_by() on another one
+        return self._replace(AnyOrder=True)
 
     def start_key(self, **kwargs):
-        self.ExclusiveStartKey = kwargs
-        self.query_params['ExclusiveStartKey'] = self.ExclusiveStartKey
-        return copy.deepcopy(self)
+        return self._replace(ExclusiveStartKey=kwargs)
 
     def _projection_expression(self, *args):
         instance = self.model_object
@@ -131,31 +428,126 @@ class Query(object):
                 projections.append(name)
             else:
                 raise FieldValidationException('Bad type must be Attribute type')
-        ProjectionExpression = ",".join(projections)
-        return ProjectionExpression
+        return tuple(projections)
 
-    def _get_primary_key(self):
-        hash_key, range_key = self.instance._hash_key, self.instance._range_key
+    def _get_primary_key(self, instance):
+        hash_key, range_key = instance._hash_key, instance._range_key
         key = {
-            hash_key: getattr(self.instance, hash_key)
+            hash_key: getattr(instance, hash_key)
         }
-        _range_key = getattr(self.instance, range_key, None)
+        _range_key = getattr(instance, range_key, None)
         if range_key and not _range_key:
             raise FieldValidationException('Invalid range key value type')
         elif range_key:
             key[range_key] = _range_key
         return key
 
-    def _filter_expression(self, *args):
+    def _choose_index(self):
+        # (index range key field, index name, why): the planner
+        schema = self.instance._schema
+        ranks = {}  # field name: rank of its best key condition
+        for field_inst, exp, is_key, op, values in self.filter_args:
+            rank = KEY_OPERATORS.get(op)
+            if rank and isinstance(field_inst, Fields):
+                name = field_inst.name
+                ranks[name] = max(rank, ranks.get(name, 0))
+        eq = KEY_OPERATORS['eq']
+        partition = bool(self.hash_values) or ranks.get(schema.hash_key) == eq
+        # global indexes its hash key has an eq condition on, the best
+        # condition on their range key first
+        global_indexes = sorted(
+            (-ranks.get(range_key, 0), position, name)
+            for position, (name, (hash_key, range_key)) in enumerate(
+                schema.global_indexes.items())
+            if ranks.get(hash_key) == eq)
+        if self.filter_index_field and not self.AnyOrder:
+            name = self.filter_index_field
+            reason = 'order_by(%s)' % name
+            local = name == schema.range_key or name in schema.local_indexes
+            ordered = [index for index in global_indexes
+                       if schema.global_indexes[index[2]][1] == name]
+            if ordered and not (partition and local):
+                return name, ordered[0][2], reason
+            if not local:
+                for index_name, (_, range_key) in \
+                        schema.global_indexes.items():
+                    if range_key == name:
+                        return name, index_name, reason
+            return name, schema.local_indexes.get(name), reason
+        if self.Scan:
+            return None, None, 'scan'
+        # a global index has no other attributes to filter on
+        global_indexes = [index for index in global_indexes
+                          if not self._unprojected(index[2])]
+        if global_indexes and not partition:
+            index_name = global_indexes[0][2]
+            hash_key, range_key = schema.global_indexes[index_name]
+            return (range_key, index_name,
+                    'eq condition on %s, the hash key of the global index' %
+                    hash_key)
+        best = None
+        table_rank = ranks.get(schema.range_key, 0)
+        for field_inst, exp, is_key, op, values in self.filter_args:
+            rank = KEY_OPERATORS.get(op)
+            if not rank or not isinstance(field_inst, Fields):
+                continue
+            name = field_inst.name
+            if name in schema.local_indexes and (
+                    best is None or rank > best[0]):
+                best = (rank, name, op)
+        if best is not None and best[0] > table_rank:
+            rank, name, op = best
+            return (name, schema.local_indexes[name],
+                    '%s condition on the indexed field %s' % (op, name))
+        if table_rank:
+            return None, None, 'condition on the range key'
+        return None, None, 'no condition on an index key'
+
+    def _unprojected(self, index_name):
+        # fields of the conditions that the items of index_name lack
+        attributes = self.instance._schema.index_attributes(index_name)
+        if attributes is None:
+            return []
+        return sorted(set(getattr(field_inst, 'name', field_inst)
+                          for field_inst, _, _, _, _ in self.filter_args)
+                      - attributes)
+
+    def _hydrates(self, params):
+        # full models of a KEYS_ONLY or INCLUDE index: the items are read
+        # again from the table
+        attributes = self.instance._schema.index_attributes(
+            params.get('IndexName'))
+        if attributes is None or params.get('Select') == 'COUNT':
+            return False
+        ProjectionExpression = params.get('ProjectionExpression')
+        return not (ProjectionExpression and
+                    set(ProjectionExpression) <= attributes)
+
+    def _conditions(self, index_name):
+        # (name, condition, is_key) of the where() conditions
+        from boto3.dynamodb.conditions import Key, Attr
+        hash_key, range_key = self.instance._schema.index_keys(index_name)
+        keys = set()
+        for field_inst, exp, is_key, op, values in self.filter_args:
+            name = getattr(field_inst, 'name', field_inst)
+            if op and name in (range_key, hash_key) and \
+                    name not in keys and KEY_OPERATORS.get(op):
+                if not is_key:
+                    exp, is_key = getattr(Key(name), op)(*values), True
+            elif is_key and op:
+                # a key of another index, or a second condition on a
+                # key: DynamoDB takes one a key
+                exp, is_key = getattr(Attr(name), op)(*values), False
+            if is_key:
+                keys.add(name)
+            yield name, exp, is_key
+
+    def _filter_expression(self, index_name=None):
         # get filter expression and key condition expression
         FilterExpression = None
         KeyConditionExpression = None
         params = {}
-        for field_inst, exp, is_key in args:
-            # field_inst = field_instance
-            if field_inst.name == self.filter_index_field:
-                _, exp, is_key = field_inst._expression_func(
-                    field_inst.op, *field_inst.express_args, use_key=True)
+        for name, exp, is_key in self._conditions(index_name):
             if is_key:
                 if not KeyConditionExpression:
                     KeyConditionExpression = exp
@@ -172,40 +564,231 @@ class Query(object):
             params['KeyConditionExpression'] = KeyConditionExpression
         return params
 
-    def _get_query_params(self):
-        # get filter params
+    def plan(self):
+        '''
+        How the query runs, see QueryPlan
+        '''
+        _, index_name, reason = self._choose_index()
+        if self.Scan:
+            return QueryPlan('scan', None, None, [],
+                             [name for name, _, _ in self._conditions(None)],
+                             reason)
+        key_conditions, filters = [], []
+        for name, exp, is_key in self._conditions(index_name):
+            if is_key:
+                key_conditions.append(name)
+            else:
+                filters.append(name)
+        if self.hash_values:
+            key_conditions.insert(0, self.instance._schema.hash_key)
+        return QueryPlan(
+            'query', index_name, self.instance._schema.index_keys(index_name)[1],
+            key_conditions, filters, reason, partitions=len(self.hash_values))
+
+    def _get_query_params(self, binds=False):
+        # request parameters, a new dict every call; binds: bind()
+        # placeholders allowed, for PreparedQuery
+        if not binds:
+            for _, _, _, _, values in self.filter_args:
+                for value in values:
+                    if isinstance(value, Bind):
+                        raise ParameterException(
+                            '%r needs a prepared query, see Query.prepare()'
+                            % value)
         params = {}
         # update filter expression
-        filter_params = self._filter_expression(*self.filter_args)
+        _, index_name, _ = self._choose_index()
+        filter_params = self._filter_expression(index_name)
         FilterExpression = filter_params.get('FilterExpression')
         if FilterExpression:
             params['FilterExpression'] = FilterExpression
         KeyConditionExpression = filter_params.get('KeyConditionExpression')
-        if KeyConditionExpression:
+        if KeyConditionExpression and self.Scan:
+            # scans have no key condition, the keys are filtered too
+            if FilterExpression:
+                KeyConditionExpression = KeyConditionExpression & FilterExpression
+            params['FilterExpression'] = KeyConditionExpression
+        elif KeyConditionExpression:
             params['KeyConditionExpression'] = KeyConditionExpression
-        if self.ProjectionExpression:
-            params['ProjectionExpression'] = self.ProjectionExpression
+        unprojected = index_name in self.instance._schema.global_indexes \
+            and self._unprojected(index_name)
+        if unprojected:
+            raise FieldValidationException(
+                '%s not projected by the global index %s' % (
+                    ', '.join(unprojected), index_name))
         if self.ConsistentRead:
+            if index_name in self.instance._schema.global_indexes:
+                raise FieldValidationException(
+                    'Consistent reads are not supported on the global '
+                    'index %s' % index_name)
             params['ConsistentRead'] = self.ConsistentRead
         if self.ReturnConsumedCapacity:
             params['ReturnConsumedCapacity'] = self.ReturnConsumedCapacity
-        self.query_params.update(params)
-        return self.query_params
+        if self.ExclusiveStartKey:
+            params['ExclusiveStartKey'] = self.ExclusiveStartKey
+        if self.Limit:
+            params['Limit'] = self.Limit
+        if index_name:
+            params['IndexName'] = index_name
+        if self.value_names or self.ProjectionExpression:
+            # the keys too, they are where the next page starts
+            names = list(self.value_names or self.ProjectionExpression)
+            names.extend(name for name in self._start_key_names(params)
+                         if name not in names)
+            params['ProjectionExpression'] = tuple(names)
+        if self.ScanIndexForward is not None:
+            params['ScanIndexForward'] = self.ScanIndexForward
+        if self.hash_values and self.Scan:
+            from boto3.dynamodb.conditions import Attr
+            condition = Attr(self.instance._schema.hash_key).is_in(
+                list(self.hash_values))
+            if params.get('FilterExpression'):
+                condition = params['FilterExpression'] & condition
+            params['FilterExpression'] = condition
+        return params
+
+    def _partitions(self):
+        # a query a value of the hash key is_in
+        from boto3.dynamodb.conditions import Key
+        name = self.instance._schema.hash_key
+        field = self.model_class._attributes[name]
+        for value in self.hash_values:
+            condition = (field, Key(name).eq(value), True, 'eq', (value,))
+            yield self._replace(hash_values=(),
+                                filter_args=self.filter_args + (condition,))
+
+    def _single_partition(self, name):
+        if self.hash_values and not self.Scan:
+            raise FieldValidationException(
+                '%s() does not support is_in on the hash key' % name)
 
     def where(self, *args):
         # Find by any number of matching criteria... though presently only
         # "where" is supported.
-        self.filter_args.extend(args)
-        return copy.deepcopy(self)
+        filter_args = []
+        changes = {}
+        for condition in args:
+            field_inst, exp, is_key = condition
+            # what the condition was built from, to build it again on an
+            # index (see Condition)
+            op = getattr(condition, 'op', None)
+            values = getattr(condition, 'values', ())
+            if exp is None and op == 'is_in':
+                changes['hash_values'] = values
+                continue
+            filter_args.append((field_inst, exp, is_key, op, values))
+        return self._replace(filter_args=self.filter_args + tuple(filter_args),
+                             **changes)
+
+    def _value_names(self, fields):
+        names = []
+        for field in fields:
+            name = getattr(field, 'name', field)
+            if name not in self.model_class._attributes:
+                raise FieldValidationException('%s not found' % name)
+            names.append(name)
+        return tuple(names)
+
+    def values(self, *fields):
+        '''
+        Results as dicts of the read values of fields instead of models,
+        None for a missing attribute; only those fields (and the keys) are
+        read. Without fields: every stored attribute.
+        '''
+        return self._replace(value_names=self._value_names(fields) or None,
+                             value_mode='dict')
+
+    def values_list(self, *fields, **kwargs):
+        '''
+        Results as tuples of the read values of fields instead of models;
+        with flat=True and one field, the values themselves.
+        '''
+        flat = kwargs.pop('flat', False)
+        if kwargs:
+            raise FieldValidationException(
+                'unexpected arguments: %s' % ', '.join(sorted(kwargs)))
+        if not fields:
+            raise FieldValidationException('values_list() needs fields')
+        if flat and len(fields) > 1:
+            raise FieldValidationException('flat needs a single field')
+        return self._replace(value_names=self._value_names(fields),
+                             value_mode='flat' if flat else 'tuple')
+
+    def _results(self, table):
+        # the function turning a stored item into a result of the query
+        if self.value_mode is None:
+            return table.load
+        if not self.value_names:
+            return table.read_values
+        read = table.value_reader(self.value_names)
+        if self.value_mode == 'tuple':
+            return read
+        if self.value_mode == 'flat':
+            return lambda item: read(item)[0]
+        names = self.value_names
+        return lambda item: dict(zip(names, read(item)))
 
     def limit(self, limit):
-        self.Limit = limit
-        self.query_params['Limit'] = limit
-        return copy.deepcopy(self)
+        return self._replace(Limit=limit)
+
+    def prefetch(self, pages=1):
+        '''
+        read up to pages pages ahead of the consumer in a thread
+        '''
+        return self._replace(Prefetch=pages)
 
-    def _get_item_params(self):
+    def parallel(self, segments, workers=None, start_keys=None, **kwargs):
+        '''
+        Scan in segments on worker threads, see scan.ParallelScan
+        '''
+        from .scan import ParallelScan
+        if not self.Scan:
+            raise FieldValidationException('parallel() needs a scan')
+        return ParallelScan(self, segments, workers=workers,
+                            start_keys=start_keys, **kwargs)
+
+    def processes(self, segments, processes=None, **kwargs):
+        '''
+        Scan in segments in worker processes, see scan.ProcessScan
+        '''
+        from .scan import ProcessScan
+        if not self.Scan:
+            raise FieldValidationException('processes() needs a scan')
+        return ProcessScan(self, segments, processes=processes, **kwargs)
+
+    def count(self, segments=1, workers=None, scanned=False):
+        '''
+        Number of items matching the query, counted by DynamoDB (Select
+        COUNT) over every page, no item is transferred. A scan can be
+        counted in segments on worker threads. With scanned: (Count,
+        ScannedCount), the items read before the filter was applied.
+        '''
+        if self.hash_values and not self.Scan:
+            from .fanout import get_executor
+            futures = [get_executor().submit(query.count, scanned=True)
+                       for query in self._partitions()]
+            results = [future.result() for future in futures]
+            result = (sum(count for count, _ in results),
+                      sum(scanned for _, scanned in results))
+            return result if scanned else result[0]
+        params = dict(self.any_order._get_query_params())
+        for name in ('ProjectionExpression', 'Limit'):
+            params.pop(name, None)
+        params['Select'] = 'COUNT'
+        if segments > 1:
+            from .scan import parallel_count
+            if not self.Scan:
+                raise FieldValidationException('segments needs a scan')
+            result = parallel_count(self, params, segments, workers=workers)
+        else:
+            method = 'scan' if self.Scan else 'query'
+            result = count_pages(getattr(get_table(self.instance), method),
+                                 params)
+        return result if scanned else result[0]
+
+    def _get_item_params(self, instance):
         params = {
-            'Key': self._get_primary_key()
+            'Key': self._get_primary_key(instance)
         }
         if self.ProjectionExpression:
             params['ProjectionExpression'] = self.ProjectionExpression
@@ -215,76 +798,66 @@ class Query(object):
 
     def get(self, **primary_key):
         # get directly by primary key
-        self.instance = self.model_class(**primary_key)
-        params = self._get_item_params()
-        item = Table(self.instance).get_item(**params)
+        instance = self.model_class(**primary_key)
+        params = self._get_item_params(instance)
+        table = get_table(instance)
+        item = table.get_item(**params)
         if not item:
             return None
-        value_for_read = self.instance._get_values_for_read(item)
+        value_for_read = table.read_values(item)
         return value_for_read
 
     def first(self):
-        response = self.limit(1).all()
-        items = response['Items']
-        return items[0] if items else None
+        return next(self.limit(1).iter(), None)
 
     def order_by(self, index_field, asc=True):
         if isinstance(index_field, Fields):
             name = index_field.name
-            index_name = self.instance._local_indexes.get(name)
-            if not (index_name or index_field.range_key):
+            schema = self.instance._schema
+            index_name = schema.local_indexes.get(name)
+            if not (index_name or index_field.range_key or name in [
+                    range_key for _, range_key in
+                    schema.global_indexes.values()]):
                 raise FieldValidationException('index not found')
-            self.filter_index_field = name
-            if index_name:
-                self.query_params['IndexName'] = index_name
-            self.query_params['ScanIndexForward'] = asc
+            return self._replace(filter_index_field=name,
+                                 IndexName=index_name or None,
+                                 ScanIndexForward=asc)
         else:
             raise FieldValidationException('%s not a field' % index_field)
-        return copy.deepcopy(self)
 
-    def _yield_all(self, method):
-        if method == 'scan':
-            func = getattr(Table(self.instance), 'scan')
-        elif method == 'query':
-            func = getattr(Table(self.instance), 'query')
-        else:
-            return
-        result_count = 0
-        response = func(**self.query_params)
-        while True:
-            metadata = response.get('ResponseMetadata', {})
-            for item in response['Items']:
-                result_count += 1
-                yield item
-                if self.Limit > 0 and result_count >= self.Limit:
-                    return
-            LastEvaluatedKey = response.get('LastEvaluatedKey')
-            if LastEvaluatedKey:
-                self.query_params['ExclusiveStartKey'] = LastEvaluatedKey
-                response = func(**self.query_params)
-            else:
-                break
+    def _start_key_names(self, params):
+        # attributes of the LastEvaluatedKey of a request
+        schema = self.instance._schema
+        names = schema.key_names
+        for name in schema.index_keys(params.get('IndexName')):
+            if name and name not in names:
+                names += (name,)
+        return names
 
-    def _yield(self):
-        if self.Scan:
-            return self._yield_all('scan')
-        else:
-            return self._yield_all('query')
+    def iter(self):
+        '''
+        Iterator over the models of every page, see QueryIterator; with
+        is_in on the hash key the partitions merged, see FanOutIterator
+        '''
+        if self.hash_values and not self.Scan:
+            from .fanout import FanOutIterator
+            return FanOutIterator(self)
+        return QueryIterator(self, prefetch=self.Prefetch)
 
     def all(self):
-        self._get_query_params()
-        if self.Scan:
-            func = getattr(Table(self.instance), 'scan')
-            return self._yield_all('scan')
-        else:
-            func = getattr(Table(self.instance), 'query')
-        response = func(**self.query_params)
-        items = response['Items']
-        results = []
-        for item in items:
-            _instance = self.model_class(**item)
-            value_for_read = _instance._get_values_for_read(item)
-            instance = self.model_class(**value_for_read)
-            results.append(instance)
-        response['Items'] = results
-        return response
+        return self.iter()
+
+    def page(self, size, cursor=None, secret=None):
+        '''
+        (models, cursor of the next page or None): at most size models
+        after cursor (see cursor.py), secret signs and checks the cursors
+        '''
+        self._single_partition('page')
+        return _page(self, self._get_query_params(), size, cursor, secret)
+
+    def prepare(self):
+        '''
+        The query compiled once, see PreparedQuery
+        '''
+        self._single_partition('prepare')
+        return PreparedQuery(self)
@@ -0,0 +1,356 @@
+#! -*- coding: utf-8 -*-
+'''
+Parallel scans.
+
+A scan reads one page after the other. With Segment/TotalSegments the
+table is split in segments scanned at the same time; ParallelScan runs
+them on `workers` threads and merges their pages in one iterator, a
+segment stops reading ahead when `buffer_size` of its pages wait to be
+consumed.
+
+    for movie in Movies.scan(Movies.rating.gt(7), segments=16, workers=8):
+        ...
+
+The keys to resume from are in last_evaluated_keys, one per segment not
+done yet; the items consumed so far are not read again, a segment left
+halfway through a page resumes after its last item:
+
+    scan = Movies.scan(segments=16)
+    ...
+    Movies.scan(segments=16, start_keys=scan.last_evaluated_keys)
+
+Turning items into models is CPU bound and threads share the GIL.
+ProcessScan scans every segment in a worker process that builds the
+models and applies `map` there; only the values it returns (None drops
+the item) come back to the parent, or with `reduce` one value a page:
+
+    titles = Movies.scan(segments=16, processes=8, map=lambda m: m.title)
+    total = Movies.scan(segments=16, map=lambda m: m.rank,
+                        reduce=operator.add, initial=0).aggregate()
+'''
+from __future__ import print_function
+
+import threading
+import traceback
+
+from six.moves import queue, cPickle as pickle
+
+from .table import get_table
+from .errors import ClientException, ParameterException
+
+__all__ = ['ParallelScan', 'ProcessScan', 'parallel_count']
+
+# scan pages of a segment read ahead of the consumer
+BUFFER_SIZE = 2
+WORKERS = 8
+# worker processes of a ProcessScan, None: one a CPU
+PROCESSES = None
+
+_DONE = object()
+
+
+class _Error(object):
+
+    def __init__(self, error):
+        self.error = error
+
+
+class ParallelScan(object):
+    '''
+    Iterates over the models matching query (a Query in scan mode), its
+    table scanned in `segments` segments by `workers` threads.
+    start_keys: {segment: ExclusiveStartKey or None}, the segments left
+    out are done.
+    '''
+
+    def __init__(self, query, segments=1, workers=None, start_keys=None,
+                 buffer_size=BUFFER_SIZE):
+        if segments < 1:
+            raise ParameterException('segments must be >= 1')
+        self.query = query
+        self.model_class = query.model_class
+        self.params = dict(query._get_query_params())
+        self.params.pop('ExclusiveStartKey', None)
+        self.Limit = query.Limit
+        self.segments = segments
+        self.workers = min(workers or WORKERS, segments)
+        self.buffer_size = buffer_size
+        if start_keys is None:
+            start_keys = dict((segment, None) for segment in range(segments))
+        self.last_evaluated_keys = dict(start_keys)
+        self.scanned_count = 0
+        self.count = 0
+
+    def __iter__(self):
+        stop = threading.Event()
+        pages = queue.Queue()
+        slots = dict((segment, queue.Queue(self.buffer_size))
+                     for segment in self.last_evaluated_keys)
+        todo = queue.Queue()
+        for segment in sorted(self.last_evaluated_keys):
+            todo.put(segment)
+        threads = []
+        for _ in range(min(self.workers, len(slots))):
+            thread = threading.Thread(target=self._work,
+                                      args=(todo, pages, slots, stop))
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+        table = get_table(self.query.instance)
+        results = self.query._results(table)
+        key_names = self.query._start_key_names(self.params)
+        remaining = len(slots)
+        # (segment, item) of a page being consumed
+        partial = None
+        try:
+            while remaining:
+                segment, items, LastEvaluatedKey, scanned = pages.get()
+                self.scanned_count += scanned
+                if items is _DONE:
+                    remaining -= 1
+                    continue
+                if isinstance(items, _Error):
+                    raise items.error
+                for item in items:
+                    if self.Limit and self.count >= self.Limit:
+                        return
+                    self.count += 1
+                    partial = (segment, item)
+                    yield results(item)
+                partial = None
+                if LastEvaluatedKey:
+                    self.last_evaluated_keys[segment] = LastEvaluatedKey
+                else:
+                    self.last_evaluated_keys.pop(segment, None)
+                slots[segment].get_nowait()
+        finally:
+            if partial is not None:
+                # stopped in the middle of a page: after its last item
+                segment, item = partial
+                self.last_evaluated_keys[segment] = table.item_key(
+                    item, key_names)
+            # consumer gone or done: the workers stop after their request
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+    def _work(self, todo, pages, slots, stop):
+        table = get_table(self.query.instance)
+        while not stop.is_set():
+            try:
+                segment = todo.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                self._scan_segment(table, segment, pages, slots[segment], stop)
+            except Exception as e:
+                pages.put((segment, _Error(e), None, 0))
+                return
+            pages.put((segment, _DONE, None, 0))
+
+    def _scan_segment(self, table, segment, pages, slots, stop):
+        params = dict(self.params)
+        if self.segments > 1:
+            params['Segment'] = segment
+            params['TotalSegments'] = self.segments
+        ExclusiveStartKey = self.last_evaluated_keys.get(segment)
+        while not stop.is_set():
+            if ExclusiveStartKey:
+                params['ExclusiveStartKey'] = ExclusiveStartKey
+            response = table.scan(**params)
+            # wait for a free slot of the segment buffer
+            while not stop.is_set():
+                try:
+                    slots.put(None, timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+            else:
+                return
+            ExclusiveStartKey = response.get('LastEvaluatedKey')
+            pages.put((segment, response['Items'], ExclusiveStartKey,
+                       response.get('ScannedCount', 0)))
+            if not ExclusiveStartKey:
+                return
+
+
+def parallel_count(query, params, segments, workers=None):
+    '''
+    (Count, ScannedCount) of a Select COUNT scan (params), its segments
+    counted by `workers` threads
+    '''
+    from .query import count_pages
+    todo = queue.Queue()
+    for segment in range(segments):
+        todo.put(segment)
+    results = []
+    errors = []
+
+    def work():
+        table = get_table(query.instance)
+        while not errors:
+            try:
+                segment = todo.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                results.append(count_pages(
+                    table.scan, dict(params, Segment=segment,
+                                     TotalSegments=segments)))
+            except Exception as e:
+                errors.append(e)
+    threads = [threading.Thread(target=work)
+               for _ in range(min(workers or WORKERS, segments))]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+    return (sum(count for count, _ in results),
+            sum(scanned for _, scanned in results))
+
+
+class ProcessScan(object):
+    '''
+    Scans the segments of query (a Query in scan mode) in `processes`
+    worker processes, one segment at a time each. Every model goes
+    through map (identity by default) in the worker, the values that are
+    not None come back in pages; with reduce the values of a page are
+    folded in the worker and aggregate() folds the pages with combine
+    (reduce by default), from initial when it is not None. map, reduce and combine cross the process
+    boundary by fork, they must be picklable where processes are spawned.
+    last_evaluated_keys works as in ParallelScan.
+    '''
+
+    def __init__(self, query, segments=1, processes=PROCESSES, map=None,
+                 reduce=None, initial=None, combine=None, start_keys=None,
+                 buffer_size=BUFFER_SIZE):
+        if segments < 1:
+            raise ParameterException('segments must be >= 1')
+        import multiprocessing
+        self.query = query
+        self.model_class = query.model_class
+        self.params = dict(query._get_query_params())
+        self.params.pop('ExclusiveStartKey', None)
+        self.Limit = query.Limit
+        self.segments = segments
+        self.processes = min(processes or multiprocessing.cpu_count(),
+                             segments)
+        self.map = map
+        self.reduce = reduce
+        self.initial = initial
+        self.combine = combine or reduce
+        self.buffer_size = buffer_size
+        if start_keys is None:
+            start_keys = dict((segment, None) for segment in range(segments))
+        self.last_evaluated_keys = dict(start_keys)
+        self.scanned_count = 0
+        self.count = 0
+
+    def __iter__(self):
+        import multiprocessing
+        todo = multiprocessing.Queue()
+        for segment in sorted(self.last_evaluated_keys):
+            todo.put((segment, self.last_evaluated_keys[segment]))
+        processes = min(self.processes, len(self.last_evaluated_keys))
+        for _ in range(processes):
+            todo.put(None)
+        pages = multiprocessing.Queue(processes * self.buffer_size)
+        workers = []
+        for _ in range(processes):
+            worker = multiprocessing.Process(target=self._work,
+                                             args=(todo, pages))
+            worker.daemon = True
+            worker.start()
+            workers.append(worker)
+        remaining = processes
+        try:
+            while remaining:
+                kind, segment, values, LastEvaluatedKey, scanned = pages.get()
+                if kind == 'done':
+                    remaining -= 1
+                    continue
+                if kind == 'error':
+                    raise values
+                self.scanned_count += scanned
+                for value in values:
+                    # with reduce: the page folded, if it had values
+                    if self.reduce is None:
+                        if self.Limit and self.count >= self.Limit:
+                            return
+                        self.count += 1
+                    yield value
+                if LastEvaluatedKey:
+                    self.last_evaluated_keys[segment] = LastEvaluatedKey
+                else:
+                    self.last_evaluated_keys.pop(segment, None)
+        finally:
+            # the workers only read, stopping them early loses nothing
+            for worker in workers:
+                if worker.is_alive():
+                    worker.terminate()
+                worker.join()
+
+    def aggregate(self):
+        '''
+        the pages folded with combine, requires reduce
+        '''
+        if self.reduce is None:
+            raise ParameterException('aggregate() needs a reduce function')
+        values = iter(self)
+        result = self.initial
+        if result is None:
+            result = next(values, None)
+        for value in values:
+            result = self.combine(result, value)
+        return result
+
+    def _work(self, todo, pages):
+        # runs in the worker process, it connects on its own
+        table = get_table(self.query.instance)
+        while True:
+            task = todo.get()
+            if task is None:
+                break
+            segment, ExclusiveStartKey = task
+            try:
+                self._scan_segment(table, segment, ExclusiveStartKey, pages)
+            except Exception as e:
+                try:
+                    pickle.dumps(e)
+                except Exception:
+                    e = ClientException('segment %s: %s' % (
+                        segment, traceback.format_exc()))
+                pages.put(('error', segment, e, None, 0))
+                break
+        pages.put(('done', None, None, None, 0))
+
+    def _scan_segment(self, table, segment, ExclusiveStartKey, pages):
+        params = dict(self.params)
+        if self.segments > 1:
+            params['Segment'] = segment
+            params['TotalSegments'] = self.segments
+        load, func, reduce = self.query._results(table), self.map, self.reduce
+        while True:
+            if ExclusiveStartKey:
+                params['ExclusiveStartKey'] = ExclusiveStartKey
+            response = table.scan(**params)
+            values = []
+            for item in response['Items']:
+                value = load(item)
+                if func is not None:
+                    value = func(value)
+                    if value is None:
+                        continue
+                if reduce is None or not values:
+                    values.append(value)
+                else:
+                    # initial is folded in once, by aggregate()
+                    values[0] = reduce(values[0], value)
+            ExclusiveStartKey = response.get('LastEvaluatedKey')
+            pages.put(('page', segment, values, ExclusiveStartKey,
+                       response.get('ScannedCount', 0)))
+            if not ExclusiveStartKey:
+                return
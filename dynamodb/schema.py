@@ -0,0 +1,234 @@
+#! -*- coding: utf-8 -*-
+'''
+Table schema of a model, built once by ModelMetaclass.
+
+Key names, key schema, attribute definitions and index names do not
+change after the class is declared, so Table reads them from
+Model._schema instead of recomputing them on every call. The boto3 Table
+handle needs a connection, it is created on first use and then reused
+for that connection (connections are per thread, see connection.py).
+
+Global secondary indexes are declared in the model's __global_index__:
+
+    class Posts(Model):
+        __global_index__ = [
+            GlobalIndex('posts_by_tag', 'tag', 'created_at'),
+            GlobalIndex('posts_by_author', 'author', projection='INCLUDE',
+                        include=['title'], read_capacity=5),
+        ]
+
+Local secondary indexes (fields declared indexed=True) project every
+attribute unless __local_index__ gives their projection, a projection
+type or the fields to include:
+
+    class Posts(Model):
+        __local_index__ = {'created_at': 'KEYS_ONLY', 'rank': ['title']}
+
+A query of a KEYS_ONLY or INCLUDE index for full models reads the items
+again from the table, see Query.
+'''
+import copy
+from threading import local
+from collections import OrderedDict
+
+import six
+
+from .helpers import get_attribute_type
+from .errors import ValidationException
+
+__all__ = ['ModelSchema', 'GlobalIndex']
+
+PROJECTIONS = ('ALL', 'KEYS_ONLY', 'INCLUDE')
+
+
+def _field_name(field):
+    # a field or its name
+    return getattr(field, 'name', field)
+
+
+class GlobalIndex(object):
+    '''
+    A global secondary index: its name, hash and range key fields (or
+    field names), projection ('ALL', 'KEYS_ONLY' or 'INCLUDE' the fields
+    of include) and throughput, the model's by default.
+    '''
+
+    def __init__(self, name, hash_key, range_key=None, projection='ALL',
+                 include=(), read_capacity=None, write_capacity=None):
+        if projection not in PROJECTIONS:
+            raise ValidationException('Invalid projection: %s' % projection)
+        if include and projection != 'INCLUDE':
+            raise ValidationException('include needs the INCLUDE projection')
+        self.name = name
+        self.hash_key = hash_key
+        self.range_key = range_key
+        self.projection = projection
+        self.include = tuple(include)
+        self.read_capacity = read_capacity
+        self.write_capacity = write_capacity
+
+    def __repr__(self):
+        return '<GlobalIndex %s>' % self.name
+
+
+class ModelSchema(object):
+
+    def __init__(self, model_class):
+        self.model_class = model_class
+        self.table_name = model_class.__table_name__
+        self.hash_key = model_class._hash_key
+        self.range_key = model_class._range_key
+        self.key_names = tuple(k for k in (self.hash_key, self.range_key) if k)
+        self.local_indexed_fields = tuple(model_class._local_indexed_fields)
+        self.local_indexes = dict(
+            (field, '{table_name}_ix_{field}'.format(
+                table_name=self.table_name, field=field))
+            for field in self.local_indexed_fields)
+        # {index name: (projection type, included fields)}
+        self.projections = self._local_projections()
+        # {index name: (hash key, range key or None)} in declaration order
+        self.global_indexes = self._global_indexes()
+        self.key_schema = self._key_schema(self.range_key)
+        self.attribute_definitions = self._attribute_definitions()
+        self.local_index_params = self._local_index_params()
+        self.global_index_params = self._global_index_params()
+        self._handles = local()
+
+    def _global_indexes(self):
+        attributes = self.model_class._attributes
+        indexes = OrderedDict()
+        for index in self.model_class._global_indexed_fields:
+            keys = (_field_name(index.hash_key),
+                    _field_name(index.range_key) if index.range_key else None)
+            for name in keys + tuple(_field_name(f) for f in index.include):
+                if name and name not in attributes:
+                    raise ValidationException(
+                        'Field not found: %s (index %s)' % (name, index.name))
+            if index.name in indexes:
+                raise ValidationException(
+                    'Duplicate index name: %s' % index.name)
+            indexes[index.name] = keys
+            self.projections[index.name] = (
+                index.projection, tuple(_field_name(f) for f in index.include))
+        return indexes
+
+    def _local_projections(self):
+        attributes = self.model_class._attributes
+        projections = {}
+        declared = self.model_class.__local_index__
+        for field, projection in declared.items():
+            if field not in self.local_indexes:
+                raise ValidationException('Index not found: %s' % field)
+            include = ()
+            if not isinstance(projection, six.string_types):
+                projection, include = 'INCLUDE', tuple(projection)
+            if projection not in PROJECTIONS:
+                raise ValidationException('Invalid projection: %s' % projection)
+            for name in include:
+                if name not in attributes:
+                    raise ValidationException(
+                        'Field not found: %s (index %s)' % (name, field))
+            projections[self.local_indexes[field]] = (projection, include)
+        return projections
+
+    def _projection(self, index_name):
+        projection, include = self.projections.get(index_name, ('ALL', ()))
+        params = {'ProjectionType': projection}
+        if include:
+            params['NonKeyAttributes'] = list(include)
+        return params
+
+    def index_attributes(self, index_name):
+        '''
+        names of the attributes of the items of an index, None for all
+        of them
+        '''
+        projection, include = self.projections.get(index_name, ('ALL', ()))
+        if projection == 'ALL':
+            return None
+        return frozenset(self.key_names + self.index_keys(index_name) +
+                         include) - frozenset([None])
+
+    def index_keys(self, index_name):
+        '''
+        (hash key, range key or None) of the table (index_name None) or of
+        one of its indexes
+        '''
+        if not index_name:
+            return self.hash_key, self.range_key
+        if index_name in self.global_indexes:
+            return self.global_indexes[index_name]
+        for field, name in self.local_indexes.items():
+            if name == index_name:
+                return self.hash_key, field
+        raise ValidationException('Index not found: %s' % index_name)
+
+    def _key_schema(self, range_key, hash_key=None):
+        key_schema = [{'AttributeName': hash_key or self.hash_key,
+                       'KeyType': 'HASH'}]
+        if range_key:
+            key_schema.append({'AttributeName': range_key, 'KeyType': 'RANGE'})
+        return key_schema
+
+    def _attribute_definitions(self):
+        attributes = self.model_class._attributes
+        definitions = []
+        names = self.key_names + self.local_indexed_fields
+        for keys in self.global_indexes.values():
+            names += keys
+        for name in names:
+            if not name or name in [d['AttributeName'] for d in definitions]:
+                continue
+            definitions.append({
+                'AttributeName': name,
+                'AttributeType': get_attribute_type(attributes[name]),
+            })
+        return definitions
+
+    def _local_index_params(self):
+        indexes = []
+        for field in self.local_indexed_fields:
+            indexes.append({
+                'IndexName': self.local_indexes[field],
+                'KeySchema': self._key_schema(field),
+                'Projection': self._projection(self.local_indexes[field]),
+            })
+        return indexes
+
+    def _global_index_params(self):
+        model_class = self.model_class
+        indexes = []
+        for index in model_class._global_indexed_fields:
+            hash_key, range_key = self.global_indexes[index.name]
+            params = {
+                'IndexName': index.name,
+                'KeySchema': self._key_schema(range_key, hash_key),
+                'Projection': self._projection(index.name),
+            }
+            throughput = {
+                'ReadCapacityUnits': (
+                    index.read_capacity or
+                    getattr(model_class, 'ReadCapacityUnits', None)),
+                'WriteCapacityUnits': (
+                    index.write_capacity or
+                    getattr(model_class, 'WriteCapacityUnits', None)),
+            }
+            if all(throughput.values()):
+                params['ProvisionedThroughput'] = throughput
+            indexes.append(params)
+        return indexes
+
+    def params(self, name):
+        # a copy of a request parameter, boto3 may keep what it is given
+        return copy.deepcopy(getattr(self, name))
+
+    def table(self, db, key=None):
+        '''
+        The boto3 Table handle of db. key identifies the connection (alias
+        and options); a new connection of the same key replaces the handle.
+        '''
+        handles = self._handles.__dict__.setdefault('tables', {})
+        cached = handles.get(key)
+        if cached is None or cached[0] is not db:
+            cached = handles[key] = (db, db.Table(self.table_name))
+        return cached[1]
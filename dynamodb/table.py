@@ -1,86 +1,49 @@
 #! -*- coding: utf-8 -*-
 from __future__ import print_function
 
+import time
 import pprint
 
 from decimal import Decimal
 from botocore.exceptions import ClientError
 from botocore.vendored.requests.exceptions import ConnectionError
 
-from .connection import db
-from .helpers import get_attribute_type
+from .connection import get_db, DEFAULT_ALIAS
+from .codec import codec_for
 from .errors import ClientException, ConnectionException, ParameterException
 
 pp = pprint.PrettyPrinter(indent=4)
 pprint = pp.pprint
 
-__all__ = ['Table']
+__all__ = ['Table', 'ClientTable', 'get_table']
 
 
 class Table(object):
 
     def __init__(self, instance):
         self.instance = instance
-        self.table_name = instance.__table_name__
-        self.table = db.Table(self.table_name)
+        self.schema = instance._schema
+        self.table_name = self.schema.table_name
+        alias = getattr(instance, '__connection__', DEFAULT_ALIAS)
+        options = getattr(instance, '__connection_options__', {})
+        self.db = get_db(alias, **options)
+        self.table = self.schema.table(
+            self.db, (alias, repr(sorted(options.items()))))
 
     def info(self):
         try:
-            response = db.meta.client.describe_table(TableName=self.table_name)
+            response = self.db.meta.client.describe_table(TableName=self.table_name)
         except ClientError as e:
             raise ClientException(e.response['Error']['Message'])
         else:
             table_info = response['Table']
         return table_info
 
-    def _prepare_hash_key(self):
-        hash_key = self.instance._hash_key
-        param = {
-            'AttributeName': hash_key,
-            'KeyType': 'HASH'
-        }
-        return param
-
-    def _prepare_range_key(self, range_key=None):
-        if not range_key:
-            range_key = self.instance._range_key
-        if range_key:
-            param = {
-                'AttributeName': range_key,
-                'KeyType': 'RANGE'
-            }
-            return param
-        return {}
-
     def _prepare_key_schema(self):
-        KeySchema = []
-        hash_key_param = self._prepare_hash_key()
-        KeySchema.append(hash_key_param)
-        range_key_param = self._prepare_range_key()
-        if range_key_param:
-            KeySchema.append(range_key_param)
-        return KeySchema
+        return self.schema.params('key_schema')
 
     def _prepare_attribute_definitions(self):
-        AttributeDefinitions = []
-        attributes = self.instance.attributes
-        hash_key = self.instance._hash_key
-        AttributeDefinitions.append({
-            'AttributeName': hash_key,
-            'AttributeType': get_attribute_type(attributes[hash_key]),
-        })
-        range_key = self.instance._range_key
-        if range_key:
-            AttributeDefinitions.append({
-                'AttributeName': range_key,
-                'AttributeType': get_attribute_type(attributes[range_key]),
-            })
-        for field in self.instance._local_indexed_fields:
-            AttributeDefinitions.append({
-                'AttributeName': field,
-                'AttributeType': get_attribute_type(attributes[field]),
-            })
-        return AttributeDefinitions
+        return self.schema.params('attribute_definitions')
 
     def _prepare_primary_key(self, params):
         params['KeySchema'] = self._prepare_key_schema()
@@ -88,25 +51,10 @@ class Table(object):
         return params
 
     def _prepare_local_indexes(self):
-        indexes = []
-        for field in self.instance._local_indexed_fields:
-            index_name = '{table_name}_ix_{field}'.format(
-                table_name=self.table_name, field=field)
-            KeySchema = [self._prepare_hash_key()]
-            range_key_param = self._prepare_range_key(field)
-            if range_key_param:
-                KeySchema.append(range_key_param)
-            indexes.append({
-                'IndexName': index_name,
-                'KeySchema': KeySchema,
-                'Projection': {
-                    'ProjectionType': 'ALL'
-                }
-            })
-        return indexes
+        return self.schema.params('local_index_params')
 
     def _prepare_global_indexes(self):
-        return []
+        return self.schema.params('global_index_params')
 
     def _prepare_create_table_params(self):
         # TableName
@@ -210,7 +158,7 @@ class Table(object):
         '''
         try:
             params = self._prepare_create_table_params()
-            return db.create_table(**params)
+            return self.db.create_table(**params)
         except ClientError as e:
             raise ClientException(e.response['Error']['Message'])
         except ConnectionError:
@@ -230,9 +178,52 @@ class Table(object):
         # TODO
         pass
 
-    def _update_global_indexes(self):
-        # TODO
-        pass
+    def _wait_until_active(self, delay=5, max_attempts=120):
+        # UpdateTable is refused while the table or an index is changing
+        for _ in range(max_attempts):
+            table_info = self.info()
+            indexes = table_info.get('GlobalSecondaryIndexes') or []
+            if table_info['TableStatus'] == 'ACTIVE' and all(
+                    index.get('IndexStatus') == 'ACTIVE' for index in indexes):
+                return table_info
+            time.sleep(delay)
+        raise ClientException('Table %s is not active' % self.table_name)
+
+    def _global_index_updates(self, table_info):
+        # the GlobalSecondaryIndexUpdates from the table to the model
+        declared = dict((index['IndexName'], index)
+                        for index in self._prepare_global_indexes())
+        existing = dict((index['IndexName'], index) for index in
+                        table_info.get('GlobalSecondaryIndexes') or [])
+        deletes, updates = [], []
+        for name, index in sorted(existing.items()):
+            wanted = declared.get(name)
+            if wanted is None or not _same_index(index, wanted):
+                # the keys and the projection of an index are fixed
+                deletes.append(name)
+                continue
+            throughput = index.get('ProvisionedThroughput') or {}
+            wanted = wanted.get('ProvisionedThroughput') or {}
+            if any(throughput.get(k) != wanted[k] for k in wanted):
+                updates.append({'Update': {'IndexName': name,
+                                           'ProvisionedThroughput': wanted}})
+        creates = [{'Create': index} for name, index in sorted(declared.items())
+                   if name not in existing or name in deletes]
+        deletes = [{'Delete': {'IndexName': name}} for name in deletes]
+        return deletes + creates + updates
+
+    def _update_global_indexes(self, table_info):
+        # one index created or deleted an UpdateTable call
+        for update in self._global_index_updates(table_info):
+            params = {'GlobalSecondaryIndexUpdates': [update]}
+            if 'Create' in update:
+                params['AttributeDefinitions'] = \
+                    self._prepare_attribute_definitions()
+            self._wait_until_active()
+            try:
+                self.table.update(**params)
+            except ClientError as e:
+                raise ClientException(e.response['Error']['Message'])
 
     def update(self):
         '''
@@ -307,6 +298,8 @@ class Table(object):
         table_info = self.info()
         ProvisionedThroughput = table_info['ProvisionedThroughput']
         self._update_throughput(ProvisionedThroughput)
+        # global secondary indexes: removed, created, throughput changed
+        self._update_global_indexes(table_info)
 
     def delete(self):
         # delete table
@@ -317,9 +310,37 @@ class Table(object):
         except ConnectionError:
             raise ConnectionException('Connection refused')
 
+    def read_values(self, item):
+        # stored item to field values
+        return self.instance._from_storage(item)
+
+    def load(self, item):
+        # the model of a stored item, built once
+        return self.instance._load(item)
+
+    def plain_item(self, item):
+        # a stored item as the resource layer returns it
+        return item
+
+    def value_reader(self, names):
+        '''
+        function of a stored item returning the tuple of the read values
+        of names, None for missing attributes
+        '''
+        attributes = self.instance._attributes
+        readers = tuple((name, attributes[name].typecast_for_read)
+                        for name in names)
+
+        def read(item):
+            return tuple(None if item.get(name) is None else reader(item[name])
+                         for name, reader in readers)
+        return read
+
     def _get_primary_key(self, **kwargs):
-        hash_key, range_key = self.instance._hash_key, self.instance._range_key
-        hash_value = kwargs.get(hash_key) or getattr(self.instance, hash_key)
+        hash_key, range_key = self.schema.hash_key, self.schema.range_key
+        hash_value = kwargs.get(hash_key)
+        if hash_value is None:
+            hash_value = getattr(self.instance, hash_key)
         if isinstance(hash_value, (int, float)):
             hash_value = Decimal(hash_value)
         key = {
@@ -327,8 +348,10 @@ class Table(object):
         }
         if not range_key:
             return key
-        range_value = kwargs.get(range_key) or getattr(self.instance, range_key, None)
-        if range_key and not range_value:
+        range_value = kwargs.get(range_key)
+        if range_value is None:
+            range_value = getattr(self.instance, range_key, None)
+        if range_key and range_value in (None, ''):
             raise ParameterException('Invalid range key value type')
         elif range_key:
             if isinstance(range_value, (int, float)):
@@ -342,7 +365,7 @@ class Table(object):
         """
         kwargs['Key'] = kwargs.get('Key') or self._get_primary_key()
         try:
-            response = self.table.get_item(**kwargs)
+            response = self.table.get_item(**_projection(kwargs))
         except ClientError as e:
             if e.response['Error']['Code'] == 'ValidationException':
                 return None
@@ -351,45 +374,82 @@ class Table(object):
             item = response.get('Item')
         return item
 
-    def batch_get_item(self, *primary_keys):
+    def batch_get_item(self, *primary_keys, **kwargs):
         """
         primary_key: params: primary_keys list
+        Any number of keys, see batch.batch_get for the options. Returns
+        the items in the order of primary_keys, None for missing ones.
         """
-        _primary_keys = []
-        for primary_key in primary_keys:
-            key = self._get_primary_key(**primary_key)
-            _primary_keys.append(key)
-        params = {
-            'RequestItems': {
-                self.table_name: {
-                    'Keys': _primary_keys
-                }
-            },
-            'ReturnConsumedCapacity': 'TOTAL'
-        }
-        try:
-            response = db.batch_get_item(**params)
-        except ClientError as e:
-            raise ClientException(e.response['Error']['Message'])
-        else:
-            items = response['Responses'][self.table_name]
-        return items
+        from .batch import batch_get
+        return batch_get(self, primary_keys, **kwargs)
+
+    def hydrate(self, items, consistent=False):
+        '''
+        The table items of index items (KEYS_ONLY or INCLUDE projection)
+        read with BatchGetItem, in the same order; items deleted since
+        the index was read are left out.
+        '''
+        if not items:
+            return items
+        keys = [self.item_key(item, self.schema.key_names) for item in items]
+        return [item for item in self.batch_get_item(*keys,
+                                                     consistent=consistent)
+                if item is not None]
+
+    def key_identity(self, item):
+        # hashable primary key of a request key or of an item
+        return tuple(item[k] for k in self.schema.key_names)
+
+    def encode_batch_key(self, primary_key):
+        return self._get_primary_key(**primary_key)
+
+    def item_key(self, item, names):
+        # ExclusiveStartKey resuming after item, names: its key attributes
+        return dict((k, item[k]) for k in names if k in item)
+
+    def batch_get_chunk(self, keys, **params):
+        """
+        One BatchGetItem request, returns (items, unprocessed keys).
+        """
+        request = dict(params, Keys=keys)
+        response = self.db.batch_get_item(
+            RequestItems={self.table_name: request},
+            ReturnConsumedCapacity='TOTAL')
+        items = response['Responses'].get(self.table_name, [])
+        unprocessed = response.get('UnprocessedKeys', {}).get(self.table_name)
+        return items, (unprocessed or {}).get('Keys', [])
 
     def put_item(self, item):
         self.table.put_item(Item=item)
         return True
 
-    def batch_write(self, items, overwrite=False):
-        pkeys = []
-        if overwrite:
-            instance = self.instance
-            pkeys = [instance._hash_key, instance._range_key]
-        try:
-            with self.table.batch_writer(overwrite_by_pkeys=pkeys) as batch:
-                for item in items:
-                    batch.put_item(Item=item)
-        except ClientError as e:
-            raise ClientException(e.response['Error']['Message'])
+    def batch_write(self, items, overwrite=False, **kwargs):
+        """
+        items: storage items to put, or batch.Put / batch.Delete requests
+        Streams items to BatchWriteItem on worker threads, see
+        batch.batch_write for the options. Returns a BatchWriteStats.
+        """
+        from .batch import batch_write
+        return batch_write(self, items, overwrite=overwrite, **kwargs)
+
+    def encode_write_request(self, request):
+        if request.action == 'put':
+            return {'PutRequest': {'Item': request.item}}
+        return {'DeleteRequest': {'Key': self._get_primary_key(**request.item)}}
+
+    def write_request_key(self, request):
+        (name, value), = request.items()
+        return self.key_identity(value.get('Item') or value.get('Key'))
+
+    def batch_write_chunk(self, requests):
+        """
+        One BatchWriteItem request, returns (unprocessed requests,
+        consumed write capacity units).
+        """
+        response = self.db.batch_write_item(
+            RequestItems={self.table_name: requests},
+            ReturnConsumedCapacity='TOTAL')
+        return _write_response(self.table_name, response)
 
     def query(self, **kwargs):
         """
@@ -427,14 +487,14 @@ class Table(object):
         ExpressionAttributeValues: 提供值替换功能
         """
         try:
-            response = self.table.query(**kwargs)
+            response = self.table.query(**_projection(kwargs))
         except ClientError as e:
             raise ClientException(e.response['Error']['Message'])
         return response
 
     def scan(self, **kwargs):
         try:
-            response = self.table.scan(**kwargs)
+            response = self.table.scan(**_projection(kwargs))
         except ClientError as e:
             raise ClientException(e.response['Error']['Message'])
         return response
@@ -585,3 +645,187 @@ class Table(object):
 
     def item_count(self):
         return self.table.item_count
+
+
+class ClientTable(Table):
+    '''
+    Data operations on the low-level client with the model's wire codec,
+    see Model.__engine__. Items are decoded straight to field values, the
+    resource layer and its Decimal conversion are skipped.
+    '''
+
+    def __init__(self, instance):
+        super(ClientTable, self).__init__(instance)
+        self.client = self.db.meta.client
+        self.codec = codec_for(instance.__class__)
+
+    def read_values(self, item):
+        return self.codec.decode(item)
+
+    def load(self, item):
+        return self.codec.load(item)
+
+    def plain_item(self, item):
+        return self.codec.decode_key(item)
+
+    def value_reader(self, names):
+        decoders = self.codec.decoders
+        readers = tuple((name, decoders[name]) for name in names)
+
+        def read(item):
+            return tuple(None if name not in item else decoder(item[name])
+                         for name, decoder in readers)
+        return read
+
+    def _prepare_request(self, params):
+        from boto3.dynamodb.conditions import (ConditionBase,
+                                               ConditionExpressionBuilder)
+        params = dict(_projection(params), TableName=self.table_name)
+        builder = ConditionExpressionBuilder()
+        names = dict(params.get('ExpressionAttributeNames') or {})
+        values = dict(params.get('ExpressionAttributeValues') or {})
+        for name in ('ConditionExpression', 'FilterExpression',
+                     'KeyConditionExpression'):
+            condition = params.get(name)
+            if isinstance(condition, ConditionBase):
+                built = builder.build_expression(
+                    condition,
+                    is_key_condition=name == 'KeyConditionExpression')
+                params[name] = built.condition_expression
+                names.update(built.attribute_name_placeholders)
+                values.update(built.attribute_value_placeholders)
+        if names:
+            params['ExpressionAttributeNames'] = names
+        if values:
+            params['ExpressionAttributeValues'] = self.codec.encode_key(values)
+        for name in ('Key', 'ExclusiveStartKey'):
+            if params.get(name):
+                params[name] = self.codec.encode_key(params[name])
+        return params
+
+    def _read_response(self, response):
+        LastEvaluatedKey = response.get('LastEvaluatedKey')
+        if LastEvaluatedKey:
+            response['LastEvaluatedKey'] = self.codec.decode_key(LastEvaluatedKey)
+        return response
+
+    def get_item(self, **kwargs):
+        kwargs['Key'] = kwargs.get('Key') or self._get_primary_key()
+        try:
+            response = self.client.get_item(**self._prepare_request(kwargs))
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ValidationException':
+                return None
+            raise ClientException(e.response['Error']['Message'])
+        else:
+            item = response.get('Item')
+        return item
+
+    def key_identity(self, item):
+        key = self.codec.decode_key(
+            dict((k, item[k]) for k in self.schema.key_names))
+        return tuple(key[k] for k in self.schema.key_names)
+
+    def encode_batch_key(self, primary_key):
+        return self.codec.encode_key(self._get_primary_key(**primary_key))
+
+    def item_key(self, item, names):
+        return self.codec.decode_key(
+            dict((k, item[k]) for k in names if k in item))
+
+    def batch_get_chunk(self, keys, **params):
+        request = dict(params, Keys=keys)
+        response = self.client.batch_get_item(
+            RequestItems={self.table_name: request},
+            ReturnConsumedCapacity='TOTAL')
+        items = response['Responses'].get(self.table_name, [])
+        unprocessed = response.get('UnprocessedKeys', {}).get(self.table_name)
+        return items, (unprocessed or {}).get('Keys', [])
+
+    def put_item(self, item):
+        self.client.put_item(TableName=self.table_name,
+                             Item=self.codec.encode(item))
+        return True
+
+    def encode_write_request(self, request):
+        if request.action == 'put':
+            return {'PutRequest': {'Item': self.codec.encode(request.item)}}
+        return {'DeleteRequest': {'Key': self.encode_batch_key(request.item)}}
+
+    def batch_write_chunk(self, requests):
+        response = self.client.batch_write_item(
+            RequestItems={self.table_name: requests},
+            ReturnConsumedCapacity='TOTAL')
+        return _write_response(self.table_name, response)
+
+    def query(self, **kwargs):
+        try:
+            response = self.client.query(**self._prepare_request(kwargs))
+        except ClientError as e:
+            raise ClientException(e.response['Error']['Message'])
+        return self._read_response(response)
+
+    def scan(self, **kwargs):
+        try:
+            response = self.client.scan(**self._prepare_request(kwargs))
+        except ClientError as e:
+            raise ClientException(e.response['Error']['Message'])
+        return self._read_response(response)
+
+    def update_item(self, update_fields, *args, **kwargs):
+        params = self._prepare_update_item_params(update_fields, *args, **kwargs)
+        try:
+            item = self.client.update_item(**self._prepare_request(params))
+            attributes = item.get('Attributes')
+            return attributes
+        except ClientError as e:
+            raise ClientException(e.response['Error']['Message'])
+
+    def delete_item(self, **kwargs):
+        key = self._get_primary_key()
+        try:
+            self.client.delete_item(
+                **self._prepare_request({'Key': key}))
+        except ClientError as e:
+            if e.response['Error']['Code'] == "ConditionalCheckFailedException":
+                raise ClientException(e.response['Error']['Message'])
+        return True
+
+
+def _projection(params):
+    # a ProjectionExpression given as a tuple of names (see Query): '#pN'
+    # placeholders, a name may be a reserved word
+    names = params.get('ProjectionExpression')
+    if not isinstance(names, (tuple, list)):
+        return params
+    labels = ['#p%d' % position for position in range(len(names))]
+    attribute_names = dict(params.get('ExpressionAttributeNames') or {})
+    attribute_names.update(zip(labels, names))
+    return dict(params, ProjectionExpression=','.join(labels),
+                ExpressionAttributeNames=attribute_names)
+
+
+def _write_response(table_name, response):
+    unprocessed = response.get('UnprocessedItems', {}).get(table_name, [])
+    units = sum(capacity.get('CapacityUnits', 0)
+                for capacity in response.get('ConsumedCapacity') or [])
+    return unprocessed, units
+
+
+def _same_index(index, declared):
+    # same keys and projection, as described by DescribeTable
+    def projection(index):
+        projection = index.get('Projection') or {}
+        return (projection.get('ProjectionType', 'ALL'),
+                sorted(projection.get('NonKeyAttributes') or []))
+    return (index['KeySchema'] == declared['KeySchema'] and
+            projection(index) == projection(declared))
+
+
+def get_table(instance):
+    '''
+    Table of the model instance, on the engine it asks for.
+    '''
+    if getattr(instance, '__engine__', 'resource') == 'client':
+        return ClientTable(instance)
+    return Table(instance)
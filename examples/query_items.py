@@ -128,77 +128,66 @@ def query_with_paginator_by_boto3():
 
 def query_without_index():
     # query_by_boto3()
-    response = Movies.query().where(Movies.year.eq(year)).all()
-    items = response['Items']
+    items = Movies.query().where(Movies.year.eq(year)).all()
     print("Movies from %s" % year)
     for i in items:
         print(i.year, ":", i.title)
 
     # query_with_limit_by_boto3()
-    response = Movies.query().where(Movies.year.eq(1985)).limit(10).all()
-    items = response['Items']
+    items = Movies.query().where(Movies.year.eq(1985)).limit(10).all()
     print("Movies from %s limit 10" % year)
     for i in items:
         print(i.year, ":", i.title)
 
     # query_with_filter_by_boto3()
-    response = (Movies.query()
-                .where(Movies.year.eq(1992),
-                       Movies.title.between('A', 'L'))
-                .all())
-    items = response['Items']
+    items = (Movies.query()
+             .where(Movies.year.eq(1992),
+                    Movies.title.between('A', 'L'))
+             .all())
     print("Movies from 1992 - titles A-L, with genres and lead actor")
     for i in items:
         print(i.year, ":", i.title)
 
     # query_with_limit_and_filter_by_boto3()
-    response = (Movies.query()
-                .where(Movies.year.eq(1992),
-                       Movies.title.between('A', 'L'),
-                       Movies.rating.eq('7.0'))
-                .all())
-    items = response['Items']
+    items = (Movies.query()
+             .where(Movies.year.eq(1992),
+                    Movies.title.between('A', 'L'),
+                    Movies.rating.eq('7.0'))
+             .all())
     print("Movies from 1992 - titles A-L, with genres and lead actor")
     for i in items:
         print(i.year, ":", i.title)
 
 
 def query_with_index():
-    response = (Movies.query()
-                .where(Movies.year.eq(1992),
-                       Movies.rating.between(6.0, 7.9))
-                .order_by(Movies.rating)  # use rating as range key by local index
-                .all())
-    items = response['Items']
+    items = (Movies.query()
+             .where(Movies.year.eq(1992),
+                    Movies.rating.between(6.0, 7.9))
+             .order_by(Movies.rating)  # use rating as range key by local index
+             .all())
     print("Movies from 1992 - rating 6.0-7.9, with genres and lead actor")
     for i in items:
         print(i.year, ":", i.title, i.rating)
 
 
 def query_with_paginator():
-    response = (Movies.query()
-                .where(Movies.year.eq(1992))
-                .limit(20)
-                .all())
-    items = response['Items']
-    print(response)
-    LastEvaluatedKey = response['LastEvaluatedKey']
-    print(LastEvaluatedKey)
+    items = (Movies.query()
+             .where(Movies.year.eq(1992))
+             .limit(20)
+             .all())
     for i in items:
         print(i.year, ":", i.title)
+    LastEvaluatedKey = items.last_evaluated_key
+    print(LastEvaluatedKey)
 
-    # response = (Movies.query()
-    #             .start_key(**LastEvaluatedKey)
-    #             .where(Movies.year.eq(1992),
-    #                    Movies.title.between('A', 'L'))
-    #             .limit(20)
-    #             .all())
-    # items = response['Items']
-    # print(response)
-    # LastEvaluatedKey = response['LastEvaluatedKey')
-    # print(LastEvaluatedKey)
-    # for i in items:
-    #     print(i.year, ":", i.title)
+    if LastEvaluatedKey:
+        items = (Movies.query()
+                 .start_key(**LastEvaluatedKey)
+                 .where(Movies.year.eq(1992))
+                 .limit(20)
+                 .all())
+        for i in items:
+            print(i.year, ":", i.title)
 
 
 if __name__ == '__main__':
@@ -5,11 +5,12 @@ setup(name="dynamodb-py",
       version="0.1.01.12",
       description="A simple DynamoDB ORM for python, based on boto3",
       license="BSD",
-      install_requires=["simplejson", "six", "chardet"],
+      install_requires=["simplejson", "six", "chardet",
+                        'futures; python_version < "3"'],
       author="gusibi",
       author_email="cacique1103@gmail.com",
       url="https://github.com/gusibi/dynamodb-py",
       download_url="https://github.com/gusibi/dynamodb-py/archive/master.zip",
-      packages=find_packages(),
+      packages=find_packages(exclude=['tests']),
       keywords=["dynamodb", "amazon", "orm", "database", "nosql"],
       zip_safe=True)
@@ -6,6 +6,7 @@ from datetime import datetime
 
 import decimal
 
+from dynamodb import connection
 from dynamodb.model import Model
 from dynamodb.fields import (CharField, IntegerField, FloatField, Attribute,
                              DateTimeField, DictField, ListField)
@@ -165,7 +166,9 @@ def batch_add_and_get_item():
         {'realname': 'gs9', 'score': 99},
     ]
     _items = Test.batch_get(*primary_keys)
-    for item in _items:
+    assert len(_items) == len(primary_keys)
+    assert _items[2] is None
+    for item in _items[:2]:
         print item.realname, item.score, item.order_score, type(item.doc)
 
 
@@ -191,15 +194,13 @@ def query_without_index():
     item = query.consistent.get(realname='gs100', score=33)
     print item
     query = query.where(Test.realname.eq('gs100'), Test.order_score.lt(34), Test.score.gt(30))
-    response = query.all()
-    items = response['Items']
-    for item in items:
+    for item in query.all():
         print item
 
     query = query.where(Test.realname.eq('gs100'),
                         Test.order_score.between(22, 26))
-    response = query.limit(3).all()
-    items = response['Items']
+    items = list(query.limit(3).all())
+    assert len(items) <= 3
     print 'itmes filter by without index'
     for item in items:
         print item
@@ -217,8 +218,8 @@ def query_with_index():
              .where(Test.realname.eq('gs100'), Test.order_score.between(22, 26))
              .order_by(Test.order_score, asc=True))
     print 'itmes filter by without index'
-    response = query.limit(3).all()
-    items = response['Items']
+    items = list(query.limit(3).all())
+    assert [item.order_score for item in items] == [22, 23, 24]
     for item in items:
         print item
 
@@ -236,9 +237,7 @@ def scan():
     # item = query.consistent.get(realname='gs100', score=33)
     # print item
     # query = query.where(Test.realname.eq('gs100'), Test.order_score.lt(34), Test.score.gt(30))
-    # response = query.all()
-    # items = response['Items']
-    # for item in items:
+    # for item in query.all():
     #     print item
 
     query = query.scan.where(Test.order_score.between(200, 234))
@@ -265,6 +264,11 @@ def main():
 
 
 if __name__ == '__main__':
-    environ['DEBUG'] = '1'
+    if environ.get('DEV_END'):
+        # DynamoDB Local at DEV_END
+        environ['DEBUG'] = '1'
+    else:
+        connection.configure(mode='memory')
+        create_table()
     print environ.get('DEBUG')
     main()
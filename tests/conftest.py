@@ -0,0 +1,34 @@
+#! -*- coding: utf-8 -*-
+'''
+Every test runs against a fresh in-memory store (see dynamodb.memory)
+paging every PAGE_SIZE items, on both engines when it takes `engine`.
+'''
+import pytest
+
+from dynamodb import connection, memory, batch
+from dynamodb.table import get_table
+
+from .models import MODELS
+
+STORE = 'tests'
+PAGE_SIZE = 5
+
+connection.configure(mode='memory', endpoint=STORE)
+
+
+@pytest.fixture(autouse=True)
+def store(monkeypatch):
+    # no wait between retries
+    monkeypatch.setattr(batch, 'backoff', lambda attempt: 0)
+    memory.reset(STORE)
+    resource = memory.backend(STORE, page_size=PAGE_SIZE)
+    for model in MODELS:
+        get_table(model()).create()
+    return resource.store
+
+
+@pytest.fixture(params=['resource', 'client'])
+def engine(request, monkeypatch):
+    for model in MODELS:
+        monkeypatch.setattr(model, '__engine__', request.param)
+    return request.param
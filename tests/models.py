@@ -0,0 +1,91 @@
+#! -*- coding: utf-8 -*-
+'''
+Models of the tests, their tables are created again for every test.
+'''
+from dynamodb.model import Model
+from dynamodb.fields import (CharField, IntegerField, FloatField,
+                             DateTimeField, DictField, ListField)
+from dynamodb.schema import GlobalIndex
+
+
+class Post(Model):
+
+    __table_name__ = 'posts'
+    ReadCapacityUnits = 10
+    WriteCapacityUnits = 10
+
+    author = CharField(name='author', hash_key=True)
+    pid = IntegerField(name='pid', range_key=True)
+    title = CharField(name='title')
+    score = FloatField(name='score', indexed=True)
+    hits = IntegerField(name='hits', default=0)
+    tags = ListField(name='tags', default=[])
+    extra = DictField(name='extra', default={})
+    created = DateTimeField(name='created')
+
+
+class Article(Model):
+    # lean projections: keys only for the local and the global index
+
+    __table_name__ = 'articles'
+    ReadCapacityUnits = 10
+    WriteCapacityUnits = 10
+    __local_index__ = {'rating': 'KEYS_ONLY'}
+    __global_index__ = [
+        GlobalIndex('article_by_topic', 'topic', 'rating',
+                    projection='KEYS_ONLY'),
+        GlobalIndex('article_by_editor', 'editor', projection='INCLUDE',
+                    include=['headline']),
+    ]
+
+    uid = CharField(name='uid', hash_key=True)
+    aid = IntegerField(name='aid', range_key=True)
+    topic = CharField(name='topic')
+    editor = CharField(name='editor')
+    headline = CharField(name='headline')
+    rating = IntegerField(name='rating', indexed=True)
+    body = CharField(name='body')
+    year = IntegerField(name='year')  # a reserved word
+
+
+class Note(Model):
+
+    __table_name__ = 'notes'
+    __compact__ = True
+    ReadCapacityUnits = 10
+    WriteCapacityUnits = 10
+
+    owner = CharField(name='owner', hash_key=True)
+    nid = IntegerField(name='nid', range_key=True)
+    text = CharField(name='text', default=u'')
+    stars = IntegerField(name='stars', default=0)
+
+
+MODELS = (Post, Article, Note)
+
+
+def posts(authors=('a', 'b', 'c'), count=20):
+    # rows of Post: pid 0..count-1 for every author, scores out of order
+    return [dict(author=author, pid=pid, title=u'%s %d' % (author, pid),
+                 score=float((pid * 7 + position) % 50), hits=pid * 10,
+                 tags=[author], extra={'n': pid})
+            for position, author in enumerate(authors)
+            for pid in range(count)]
+
+
+def of(rows, author):
+    # the rows of author
+    return [row for row in rows if row['author'] == author]
+
+
+def keys(author, pids):
+    # primary keys of Post
+    return [dict(author=author, pid=pid) for pid in pids]
+
+
+def articles(count=30):
+    return [dict(uid='u%d' % (aid % 3), aid=aid, topic='t%d' % (aid % 4),
+                 editor='e%d' % (aid % 2), headline=u'h%d' % aid,
+                 rating=(aid * 37) % 101, body=u'b%d' % aid,
+                 year=2000 + aid % 5)
+            for aid in range(count)]
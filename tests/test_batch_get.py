@@ -0,0 +1,44 @@
+#! -*- coding: utf-8 -*-
+import pytest
+
+from dynamodb.batch import batch_get
+from dynamodb.table import get_table
+from dynamodb.errors import ClientException, ParameterException
+
+from .models import Post, posts, keys
+
+
+def test_batch_get_order_and_missing(engine):
+    Post.batch_write(posts(authors=('a',), count=150))
+    wanted = keys('a', [149, 3, 500, 3] + list(range(100, 140)))
+    results = Post.batch_get(*wanted, concurrency=3)
+    assert len(results) == len(wanted)
+    assert results[2] is None
+    assert [post.pid for post in results if post is not None] == \
+        [149, 3, 3] + list(range(100, 140))
+
+
+def test_batch_get_retries_unprocessed_and_throttled(engine, store):
+    Post.batch_write(posts(authors=('a',), count=30))
+    store.leave_unprocessed('BatchGetItem', 10, times=2)
+    store.fail('BatchGetItem', times=2)
+    results = Post.batch_get(*keys('a', range(30)), consistent=True)
+    assert [post.pid for post in results] == list(range(30))
+    assert not store.errors['BatchGetItem']
+    assert not store.unprocessed['BatchGetItem']
+
+
+def test_batch_get_gives_up(engine, store):
+    Post.batch_write(posts(authors=('a',), count=5))
+    store.leave_unprocessed('BatchGetItem', 1, times=4)
+    with pytest.raises(ClientException) as error:
+        Post.batch_get(*keys('a', range(5)), max_attempts=3)
+    assert 'unprocessed' in str(error.value)
+    store.fail('BatchGetItem', error='ValidationException')
+    with pytest.raises(ClientException):
+        Post.batch_get(*keys('a', range(5)))
+
+
+def test_batch_get_chunk_size():
+    with pytest.raises(ParameterException):
+        batch_get(get_table(Post()), keys('a', [1]), chunk_size=101)
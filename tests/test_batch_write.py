@@ -0,0 +1,48 @@
+#! -*- coding: utf-8 -*-
+import pytest
+
+from dynamodb.batch import Delete
+from dynamodb.errors import ClientException, ParameterException
+
+from .models import Post, posts, keys
+
+
+def test_batch_write_stats_and_retries(engine, store):
+    store.leave_unprocessed('BatchWriteItem', 5, times=3)
+    store.fail('BatchWriteItem', times=2)
+    stats = Post.batch_write(posts(authors=('a', 'b'), count=40), workers=3)
+    assert stats.items_written == 80
+    assert stats.retries == 5 and stats.throttles == 2
+    assert Post.query().scan.count() == 80
+
+
+def test_batch_write_gives_up(engine, store):
+    store.leave_unprocessed('BatchWriteItem', 1, times=10)
+    with pytest.raises(ClientException):
+        Post.batch_write(posts(authors=('a',), count=3), max_attempts=2)
+
+
+def test_batch_write_keeps_the_order_of_a_key(engine):
+    rows = [dict(author='a', pid=pid % 3, hits=number)
+            for number, pid in enumerate(range(30))]
+    Post.batch_write(rows, workers=4)
+    assert sorted((post.pid, post.hits) for post in
+                  Post.query().where(Post.author.eq('a')).all()) == \
+        [(0, 27), (1, 28), (2, 29)]
+
+
+def test_batch_write_overwrite_and_delete(engine):
+    Post.batch_write(posts(authors=('a',), count=10))
+    stats = Post.batch_write([dict(author='a', pid=1, title=u'x'),
+                              dict(author='a', pid=1, title=u'y'),
+                              Delete(author='a', pid=2)], overwrite=True)
+    assert stats.items_written == 2
+    assert Post.get(author='a', pid=1).title == u'y'
+    assert Post.get(author='a', pid=2) is None
+    Post.batch_delete(keys('a', range(10)))
+    assert Post.query().scan.count() == 0
+
+
+def test_batch_write_workers():
+    with pytest.raises(ParameterException):
+        Post.batch_write([], workers=0)
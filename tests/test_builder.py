@@ -0,0 +1,29 @@
+#! -*- coding: utf-8 -*-
+import pytest
+
+from .models import Post, posts
+
+
+@pytest.fixture
+def rows():
+    rows = posts()
+    Post.batch_write(rows)
+    return rows
+
+
+def test_conditions_keep_their_arguments(engine, rows):
+    # built ahead of where(): the field holds no state of its conditions
+    below, above = Post.pid.lt(3), Post.pid.gt(15)
+    query = Post.query().where(Post.author.eq('a'), below)
+    assert [post.pid for post in query.all()] == [0, 1, 2]
+    assert (below.op, below.values) == ('lt', (3,))
+    assert (above.op, above.values) == ('gt', (15,))
+
+
+def test_builder_is_copy_on_write(rows):
+    query = Post.query().where(Post.author.eq('a'))
+    limited = query.limit(2)
+    later = query.where(Post.pid.gt(15))
+    assert len(list(query.all())) == 20
+    assert len(list(limited.all())) == 2
+    assert [post.pid for post in later.all()] == [16, 17, 18, 19]
@@ -0,0 +1,46 @@
+#! -*- coding: utf-8 -*-
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+from dynamodb.codec import codec_for
+from dynamodb.errors import ClientException
+
+from .models import Post
+
+
+def test_create_get_update_delete(engine):
+    Post.create(author='a', pid=1, title=u'first', score=1.5,
+                tags=[u'x'], extra={'k': u'v'}, created=datetime(2020, 1, 2))
+    post = Post.get(author='a', pid=1)
+    assert (post.title, post.score, post.hits) == (u'first', 1.5, 0)
+    assert post.tags == [u'x'] and post.extra == {'k': u'v'}
+    assert isinstance(post.created, datetime)
+    post.update(Post.hits.add(3), title=u'renamed')
+    assert (post.hits, post.title) == (3, u'renamed')
+    assert Post.get(author='a', pid=1).hits == 3
+    post.delete()
+    assert Post.get(author='a', pid=1) is None
+
+
+def test_update_condition(engine):
+    Post.create(author='a', pid=1, score=1.0)
+    with pytest.raises(ClientException):
+        Post(author='a', pid=1).condition(Post.score.eq(2.0)).update(
+            title=u'no')
+    post = Post(author='a', pid=1).condition(Post.score.eq(1.0)).update(
+        title=u'yes')
+    assert post.title == u'yes'
+
+
+def test_codec():
+    codec = codec_for(Post)
+    item = codec.encode({'author': u'a', 'pid': 1, 'score': Decimal('2.5'),
+                         'tags': [u'x'], 'extra': {'n': 1}})
+    assert item['author'] == {'S': u'a'} and item['pid'] == {'N': '1'}
+    assert item['tags'] == {'L': [{'S': u'x'}]}
+    values = codec.decode(item)
+    assert values['pid'] == 1 and values['score'] == 2.5
+    assert values['extra'] == {'n': 1}
+    assert codec.decode_key(codec.encode_key({'pid': 1})) == {'pid': 1}
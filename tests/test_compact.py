@@ -0,0 +1,62 @@
+#! -*- coding: utf-8 -*-
+import pickle
+
+import pytest
+
+from dynamodb.fields import CharField, IntegerField
+from dynamodb.model import Model, _plain_init
+
+from .models import Note
+
+
+class LoggedNote(Model):
+
+    __table_name__ = 'notes'
+    updates = []
+
+    owner = CharField(name='owner', hash_key=True)
+    nid = IntegerField(name='nid', range_key=True)
+    text = CharField(name='text', default=u'')
+
+    def update_attributes(self, **kwargs):
+        LoggedNote.updates.append(sorted(kwargs))
+        return super(LoggedNote, self).update_attributes(**kwargs)
+
+
+class TracedNote(Model):
+
+    __table_name__ = 'notes'
+    names = []
+
+    owner = CharField(name='owner', hash_key=True)
+    nid = IntegerField(name='nid', range_key=True)
+    text = CharField(name='text', default=u'')
+
+    def __setattr__(self, name, value):
+        TracedNote.names.append(name)
+        super(TracedNote, self).__setattr__(name, value)
+
+
+def test_compact_models(engine):
+    note = Note.create(owner='o', nid=1, text=u'hi')
+    assert not hasattr(note, '__dict__')
+    with pytest.raises(AttributeError):
+        note.unknown = 1
+    note = Note.get(owner='o', nid=1)
+    assert (note.text, note.stars) == (u'hi', 0)
+    copy = pickle.loads(pickle.dumps(note, 0))
+    assert (copy.owner, copy.nid, copy.text) == ('o', 1, u'hi')
+
+
+def test_load_through_the_hooks(engine, monkeypatch):
+    monkeypatch.setattr(LoggedNote, 'updates', [])
+    monkeypatch.setattr(TracedNote, 'names', [])
+    Note.create(owner='o', nid=1, text=u'hi')
+    assert (_plain_init(Note), _plain_init(LoggedNote),
+            _plain_init(TracedNote)) == (True, False, False)
+    note = LoggedNote.get(owner='o', nid=1)
+    assert note.text == u'hi'
+    assert LoggedNote.updates == [['nid', 'owner', 'text']]
+    note = TracedNote.get(owner='o', nid=1)
+    assert note.text == u'hi'
+    assert '_text' in TracedNote.names
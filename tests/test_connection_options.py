@@ -0,0 +1,39 @@
+#! -*- coding: utf-8 -*-
+import pytest
+
+from dynamodb import connection
+from dynamodb.errors import ParameterException
+
+
+def test_options():
+    with pytest.raises(ParameterException):
+        connection.configure('other', mode='nowhere')
+    with pytest.raises(ParameterException):
+        connection.configure('other', mode='memory', retry_mode='never')
+    with pytest.raises(ParameterException):
+        connection.configure('other', mode='memory', max_pool_connections=0)
+    with pytest.raises(ParameterException):
+        connection.connect('not configured')
+    db = connection.connect()
+    assert connection.connect(max_attempts=2) is not db
+
+
+def test_options_from_environ(monkeypatch):
+    monkeypatch.setenv('DYNAMODB_MAX_POOL_CONNECTIONS', '64')
+    monkeypatch.setenv('DYNAMODB_TCP_KEEPALIVE', 'yes')
+    assert connection.options_from_environ() == {
+        'max_pool_connections': 64, 'tcp_keepalive': True}
+    monkeypatch.setenv('DYNAMODB_READ_TIMEOUT', 'soon')
+    with pytest.raises(ParameterException):
+        connection.options_from_environ()
+
+
+def test_client_config():
+    manager = connection.ConnectionManager(mode='memory', endpoint='tests')
+    config = manager.getClientConfig(max_pool_connections=64,
+                                     retry_mode='adaptive', max_attempts=5)
+    assert config.max_pool_connections == 64
+    assert config.retries == {'mode': 'adaptive', 'max_attempts': 5}
+    # service defaults, botocore's in local mode
+    assert (config.connect_timeout, config.read_timeout) == (1, 2)
+    assert manager.getClientConfig(local=True).read_timeout == 60
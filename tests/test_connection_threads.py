@@ -0,0 +1,62 @@
+#! -*- coding: utf-8 -*-
+import os
+import threading
+
+from dynamodb import connection
+
+from .models import Post
+
+
+def in_thread(func):
+    result = []
+    thread = threading.Thread(target=lambda: result.append(func()))
+    thread.start()
+    thread.join()
+    return result[0]
+
+
+def test_a_connection_per_thread():
+    db = connection.connect()
+    assert connection.connect() is db
+    assert in_thread(connection.connect) is not db
+    # the threads share the tables
+    Post.create(author='a', pid=1)
+    assert in_thread(lambda: Post.get(author='a', pid=1)).pid == 1
+
+
+def test_disconnect_rebuilds():
+    db = connection.connect()
+    connection.disconnect()
+    assert connection.connect() is not db
+
+
+def test_disconnect_drops_one_alias():
+    connection.configure('other', mode='memory', endpoint='tests')
+    db, other = connection.connect(), connection.connect('other')
+    in_thread(lambda: connection.disconnect('other'))
+    assert connection.connect() is db
+    assert connection.connect('other') is not other
+
+
+def test_fork_rebuilds():
+    registry = connection.ConnectionRegistry()
+    registry.configure('local', mode='local')
+    db = registry.connect('local')
+    session = registry._sessions[('local',)]
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        # the child: its own session and connection
+        try:
+            rebuilt = (registry.connect('local') is not db and
+                       registry._sessions[('local',)] is not session)
+        except Exception:
+            rebuilt = False
+        os.write(write, b'1' if rebuilt else b'0')
+        os._exit(0)
+    os.close(write)
+    rebuilt = os.read(read, 1)
+    os.close(read)
+    os.waitpid(pid, 0)
+    assert rebuilt == b'1'
+    assert registry.connect('local') is db
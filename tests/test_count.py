@@ -0,0 +1,20 @@
+#! -*- coding: utf-8 -*-
+import pytest
+
+from .models import Post, posts
+
+
+@pytest.fixture
+def rows():
+    rows = posts()
+    Post.batch_write(rows)
+    return rows
+
+
+def test_count(engine, rows):
+    query = Post.query().where(Post.author.eq('a'), Post.hits.gte(100))
+    assert query.count() == 10
+    assert query.count(scanned=True) == (10, 20)
+    assert Post.query().scan.count() == 60
+    assert Post.query().scan.count(segments=3) == 60
+    assert Post.query().where(Post.author.is_in(['a', 'c'])).count() == 40
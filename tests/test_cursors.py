@@ -0,0 +1,47 @@
+#! -*- coding: utf-8 -*-
+from decimal import Decimal
+
+import pytest
+
+from dynamodb.query import Paginator
+from dynamodb.errors import ParameterException
+
+from .models import Post, posts
+
+
+@pytest.fixture
+def rows():
+    rows = posts()
+    Post.batch_write(rows)
+    return rows
+
+
+def test_page_cursors(engine, rows):
+    query = Post.query().where(Post.author.eq('a'))
+    seen, cursor = [], None
+    while True:
+        items, cursor = query.page(6, cursor=cursor)
+        seen.extend(post.pid for post in items)
+        if cursor is None:
+            break
+    assert seen == list(range(20))
+    items, cursor = query.page(3, secret='s')
+    items, _ = query.page(3, cursor=cursor, secret='s')
+    assert [post.pid for post in items] == [3, 4, 5]
+    with pytest.raises(ParameterException):
+        query.page(3, cursor=cursor[:-2] + 'xx', secret='s')
+
+
+def test_paginator(engine, rows):
+    pages = list(Paginator(Post()).query(
+        KeyConditionExpression=Post.author.eq('a')[1], PageSize=4,
+        MaxItems=14))
+    assert [len(page['Items']) for page in pages] == [4, 4, 4, 2]
+    token = pages[0]['NextToken']
+    page = next(Paginator(Post()).query(
+        KeyConditionExpression=Post.author.eq('a')[1], PageSize=2,
+        StartingToken=token))
+    assert [item['pid'] for item in page['Items']] == [4, 5]
+    # the same items on both engines
+    assert page['Items'][0] == dict(rows[4],
+                                    score=Decimal(str(rows[4]['score'])))
@@ -0,0 +1,50 @@
+#! -*- coding: utf-8 -*-
+import pytest
+
+from dynamodb import fanout
+from dynamodb.errors import FieldValidationException
+
+from .models import Post, posts, of
+
+
+@pytest.fixture
+def rows():
+    rows = posts()
+    Post.batch_write(rows)
+    return rows
+
+
+def test_fan_out_merges_on_the_range_key(engine, rows):
+    query = Post.query().where(Post.author.is_in(['c', 'a']),
+                               Post.pid.lt(4))
+    results = [(post.pid, post.author) for post in query.all()]
+    assert [pid for pid, _ in results] == [0, 0, 1, 1, 2, 2, 3, 3]
+    assert query.plan().partitions == 2
+
+
+def test_fan_out_projection_without_the_sort_key(engine, rows):
+    query = (Post.query(Post.title).where(Post.author.is_in(['a', 'b']))
+             .order_by(Post.score, asc=False))
+    assert [post.title for post in query.all()] == [
+        row['title'] for row in sorted(
+            of(rows, 'a') + of(rows, 'b'),
+            key=lambda row: (-row['score'], row['author'] == 'b'))]
+
+
+def test_fan_out_order_by_and_limit(engine, rows, monkeypatch):
+    requests = []
+    fetch = fanout._fetch
+
+    def counted(instance, params, hydrate):
+        requests.append(params.get('Limit'))
+        return fetch(instance, params, hydrate)
+    monkeypatch.setattr(fanout, '_fetch', counted)
+    query = (Post.query().where(Post.author.is_in(['a', 'b', 'c']))
+             .order_by(Post.score, asc=False).limit(12))
+    scores = [post.score for post in query.all()]
+    assert scores == sorted((row['score'] for row in rows),
+                            reverse=True)[:12]
+    # every partition reads at most the limit
+    assert requests and all(limit <= 12 for limit in requests)
+    with pytest.raises(FieldValidationException):
+        query.page(3)
@@ -0,0 +1,63 @@
+#! -*- coding: utf-8 -*-
+import pytest
+
+from dynamodb.model import Model
+from dynamodb.fields import CharField, IntegerField
+from dynamodb.schema import GlobalIndex
+from dynamodb.errors import FieldValidationException
+from dynamodb.table import get_table
+
+from .models import Article, articles
+
+
+def test_global_index_declarations():
+    info = get_table(Article()).info()
+    indexes = dict((index['IndexName'], index['KeySchema'])
+                   for index in info['GlobalSecondaryIndexes'])
+    assert indexes == {
+        'article_by_topic': [{'AttributeName': 'topic', 'KeyType': 'HASH'},
+                             {'AttributeName': 'rating',
+                              'KeyType': 'RANGE'}],
+        'article_by_editor': [{'AttributeName': 'editor',
+                               'KeyType': 'HASH'}]}
+
+
+def test_plan_uses_a_global_index(engine):
+    Article.batch_write(articles())
+    query = Article.query().where(Article.topic.eq('t1'),
+                                  Article.rating.gt(50))
+    plan = query.plan()
+    assert (plan.index_name, plan.sort_key, plan.key_conditions) == (
+        'article_by_topic', 'rating', ['topic', 'rating'])
+    expected = sorted(row['rating'] for row in articles()
+                      if row['topic'] == 't1' and row['rating'] > 50)
+    results = list(query.all())
+    assert [article.rating for article in results] == expected
+    # KEYS_ONLY index: the items are read again from the table
+    assert all(article.body for article in results)
+    with pytest.raises(FieldValidationException):
+        list(query.consistent.all())
+
+
+def test_update_global_indexes():
+    class Articles(Model):
+        # the articles table, without article_by_editor, with author
+        __table_name__ = 'articles'
+        ReadCapacityUnits = 10
+        WriteCapacityUnits = 10
+        __global_index__ = [
+            GlobalIndex('article_by_topic', 'topic', 'rating',
+                        projection='KEYS_ONLY'),
+            GlobalIndex('article_by_author', 'author'),
+        ]
+        uid = CharField(name='uid', hash_key=True)
+        aid = IntegerField(name='aid', range_key=True)
+        topic = CharField(name='topic')
+        author = CharField(name='author')
+        rating = IntegerField(name='rating')
+
+    table = get_table(Articles())
+    table.update()
+    names = sorted(index['IndexName']
+                   for index in table.info()['GlobalSecondaryIndexes'])
+    assert names == ['article_by_author', 'article_by_topic']
@@ -0,0 +1,16 @@
+#! -*- coding: utf-8 -*-
+from dynamodb.table import get_table
+
+from .models import Post
+
+
+def test_load_builds_one_model(engine):
+    Post.create(author='a', pid=1, title=u't', score=2.0)
+    table = get_table(Post())
+    item = table.get_item(Key={'author': 'a', 'pid': 1})
+    post = table.load(item)
+    assert isinstance(post, Post)
+    assert table.read_values(item)['score'] == post.score == 2.0
+    # fields the item lacks get their default
+    assert post.tags == [] and post.hits == 0
+    assert Post.batch_get(dict(author='a', pid=1))[0].score == 2.0
@@ -0,0 +1,32 @@
+#! -*- coding: utf-8 -*-
+import subprocess
+import sys
+
+from dynamodb import connection
+
+from .models import Post
+
+
+def test_import_builds_nothing():
+    code = ('import sys\n'
+            'from dynamodb.model import Model\n'
+            'from dynamodb.fields import CharField\n'
+            'class Movies(Model):\n'
+            '    __table_name__ = "Movies"\n'
+            '    title = CharField(name="title", hash_key=True)\n'
+            'print("boto3" in sys.modules)\n')
+    output = subprocess.check_output([sys.executable, '-c', code])
+    assert output.strip() == b'False'
+
+
+def test_connects_on_first_use():
+    registry = connection.ConnectionRegistry()
+    registry.configure(mode='memory', endpoint='tests')
+    assert registry._thread_connections() == {}
+    db = registry.connect()
+    assert registry.connect() is db
+    lazy = connection.LazyConnection()
+    assert repr(lazy) == '<LazyConnection default>'
+    Post.create(author='a', pid=1)
+    assert lazy.Table('posts').get_item(
+        Key={'author': 'a', 'pid': 1})['Item']['pid'] == 1
@@ -0,0 +1,30 @@
+#! -*- coding: utf-8 -*-
+from dynamodb.table import get_table
+
+from .models import Article, articles
+
+
+def test_index_projections():
+    info = get_table(Article()).info()
+    local = dict((index['IndexName'], index['Projection'])
+                 for index in info['LocalSecondaryIndexes'])
+    assert local == {'articles_ix_rating': {'ProjectionType': 'KEYS_ONLY'}}
+    indexes = dict((index['IndexName'], index['Projection'])
+                   for index in info['GlobalSecondaryIndexes'])
+    assert indexes == {
+        'article_by_topic': {'ProjectionType': 'KEYS_ONLY'},
+        'article_by_editor': {'ProjectionType': 'INCLUDE',
+                              'NonKeyAttributes': ['headline']}}
+
+
+def test_lean_index_projection(engine):
+    Article.batch_write(articles())
+    query = Article.query().where(Article.editor.eq('e1'))
+    assert query.plan().index_name == 'article_by_editor'
+    results = list(query.all())
+    assert len(results) == 15 and all(article.body for article in results)
+    # only fields of the index: no second read
+    results = list(Article.query(Article.headline)
+                   .where(Article.editor.eq('e1')).all())
+    assert all(article.headline and not article.body
+               for article in results)
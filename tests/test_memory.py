@@ -0,0 +1,142 @@
+#! -*- coding: utf-8 -*-
+from decimal import Decimal
+
+import pytest
+from botocore.exceptions import ClientError
+
+from dynamodb import memory
+from dynamodb.errors import ParameterException
+
+from .conftest import STORE
+
+
+@pytest.fixture
+def table(store):
+    store.create_table(
+        TableName='events',
+        KeySchema=[{'AttributeName': 'user', 'KeyType': 'HASH'},
+                   {'AttributeName': 'seq', 'KeyType': 'RANGE'}],
+        AttributeDefinitions=[{'AttributeName': 'user', 'AttributeType': 'S'},
+                              {'AttributeName': 'seq', 'AttributeType': 'N'},
+                              {'AttributeName': 'level', 'AttributeType': 'N'}],
+        LocalSecondaryIndexes=[{
+            'IndexName': 'by_level',
+            'KeySchema': [{'AttributeName': 'user', 'KeyType': 'HASH'},
+                          {'AttributeName': 'level', 'KeyType': 'RANGE'}],
+            'Projection': {'ProjectionType': 'ALL'}}],
+        ProvisionedThroughput={'ReadCapacityUnits': 1,
+                               'WriteCapacityUnits': 1})
+    table = memory.backend(STORE).Table('events')
+    for seq in range(12):
+        table.put_item(Item={'user': 'u', 'seq': seq, 'level': (seq * 5) % 7,
+                             'year': 2000 + seq})
+    return table
+
+
+def query(table, **params):
+    return table.query(KeyConditionExpression='#u = :u',
+                       ExpressionAttributeNames=dict(
+                           params.pop('ExpressionAttributeNames', {}),
+                           **{'#u': 'user'}),
+                       ExpressionAttributeValues={':u': 'u'}, **params)
+
+
+def test_query_pages_by_limit_and_page_size(table):
+    seqs, params = [], {}
+    pages = 0
+    while True:
+        response = query(table, **params)
+        pages += 1
+        seqs.extend(item['seq'] for item in response['Items'])
+        if 'LastEvaluatedKey' not in response:
+            break
+        params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    assert seqs == list(range(12))
+    assert pages == 3  # PAGE_SIZE items a page
+    response = query(table, Limit=2)
+    assert [item['seq'] for item in response['Items']] == [0, 1]
+    assert response['LastEvaluatedKey'] == {'user': 'u', 'seq': 1}
+
+
+def test_local_index_order(table):
+    response = query(table, IndexName='by_level', ScanIndexForward=False,
+                     Limit=4)
+    levels = [item['level'] for item in response['Items']]
+    assert levels == sorted(levels, reverse=True)
+    assert set(response['LastEvaluatedKey']) == set(['user', 'seq', 'level'])
+
+
+def test_reserved_words_need_placeholders(table):
+    with pytest.raises(ClientError) as error:
+        query(table, ProjectionExpression='seq, year')
+    assert 'reserved keyword: year' in str(error.value)
+    with pytest.raises(ClientError):
+        query(table, FilterExpression='year > :u')
+    response = query(table, ProjectionExpression='seq, #y',
+                     ExpressionAttributeNames={'#y': 'year'}, Limit=1)
+    assert response['Items'] == [{'seq': 0, 'year': 2000}]
+
+
+def test_injected_errors(store, table):
+    store.fail('GetItem', times=2, error='ThrottlingException')
+    for _ in range(2):
+        with pytest.raises(ClientError) as error:
+            table.get_item(Key={'user': 'u', 'seq': 1})
+        assert error.value.response['Error']['Code'] == 'ThrottlingException'
+        assert error.value.operation_name == 'GetItem'
+    assert table.get_item(Key={'user': 'u', 'seq': 1})['Item']['seq'] == 1
+
+
+def test_injected_unprocessed_keys(store, table):
+    resource = memory.backend(STORE)
+    keys = [{'user': 'u', 'seq': seq} for seq in range(5)]
+    store.leave_unprocessed('BatchGetItem', 2)
+    response = resource.batch_get_item(RequestItems={
+        'events': {'Keys': keys, 'ConsistentRead': True}})
+    assert sorted(item['seq'] for item in
+                  response['Responses']['events']) == [0, 1, 2]
+    assert response['UnprocessedKeys'] == {
+        'events': {'Keys': keys[3:], 'ConsistentRead': True}}
+    response = resource.batch_get_item(RequestItems={
+        'events': {'Keys': keys}})
+    assert response['UnprocessedKeys'] == {}
+
+
+def test_injected_unprocessed_items(store, table):
+    client = memory.backend(STORE).meta.client
+    requests = [{'PutRequest': {'Item': {'user': {'S': 'w'},
+                                         'seq': {'N': str(seq)}}}}
+                for seq in range(4)]
+    store.leave_unprocessed('BatchWriteItem', 3)
+    response = client.batch_write_item(RequestItems={'events': requests})
+    assert response['UnprocessedItems'] == {'events': requests[1:]}
+    item = client.get_item(TableName='events',
+                           Key={'user': {'S': 'w'}, 'seq': {'N': '0'}})
+    assert item['Item']['seq'] == {'N': '0'}
+    item = client.get_item(TableName='events',
+                           Key={'user': {'S': 'w'}, 'seq': {'N': '1'}})
+    assert 'Item' not in item
+
+
+def test_unprocessed_needs_a_batch_operation(store):
+    with pytest.raises(ParameterException):
+        store.leave_unprocessed('Query', 1)
+
+
+def test_add_needs_a_set_of_the_same_type(table):
+    key = {'user': 'u', 'seq': 1}
+    table.update_item(Key=key, UpdateExpression='ADD tags :t',
+                      ExpressionAttributeValues={':t': set(['a'])})
+    with pytest.raises(ClientError) as error:
+        table.update_item(Key=key, UpdateExpression='ADD tags :t',
+                          ExpressionAttributeValues={':t': set([1])})
+    assert 'incorrect data type' in str(error.value)
+    table.update_item(Key=key, UpdateExpression='ADD tags :t',
+                      ExpressionAttributeValues={':t': set(['b'])})
+    assert table.get_item(Key=key)['Item']['tags'] == set(['a', 'b'])
+
+
+def test_numbers_come_back_as_decimal(table):
+    item = table.get_item(Key={'user': 'u', 'seq': 3})['Item']
+    assert item['level'] == Decimal(1)
+    assert isinstance(item['level'], Decimal)
@@ -0,0 +1,34 @@
+#! -*- coding: utf-8 -*-
+import pytest
+
+from dynamodb.errors import ParameterException
+
+from .models import Post, posts
+
+
+@pytest.fixture
+def rows():
+    rows = posts(authors=('a', 'b', 'c', 'd', 'e', 'f'), count=10)
+    Post.batch_write(rows)
+    return rows
+
+
+def test_parallel_scan(engine, rows):
+    scan = Post.scan(segments=4, workers=2)
+    assert sorted((post.author, post.pid) for post in scan) == \
+        sorted((row['author'], row['pid']) for row in rows)
+    assert scan.last_evaluated_keys == {}
+    with pytest.raises(ParameterException):
+        Post.scan(segments=0)
+
+
+def test_parallel_scan_resumes(engine, rows):
+    scan = Post.scan(segments=3, workers=3, buffer_size=1)
+    iterator = iter(scan)
+    seen = [(post.author, post.pid) for _, post in zip(range(22), iterator)]
+    iterator.close()
+    resumed = Post.scan(segments=3, start_keys=scan.last_evaluated_keys)
+    seen.extend((post.author, post.pid) for post in resumed)
+    # stopped in the middle of pages: nothing is read twice
+    assert sorted(seen) == sorted((row['author'], row['pid'])
+                                  for row in rows)
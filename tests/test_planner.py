@@ -0,0 +1,96 @@
+#! -*- coding: utf-8 -*-
+import pytest
+
+from dynamodb.errors import FieldValidationException
+
+from .models import Post, posts, of
+
+
+@pytest.fixture
+def rows():
+    rows = posts()
+    Post.batch_write(rows)
+    return rows
+
+
+def test_where_on_the_range_key(engine, rows):
+    query = Post.query().where(Post.author.eq('b'), Post.pid.between(3, 6))
+    assert [post.pid for post in query.all()] == [3, 4, 5, 6]
+    query = Post.query().where(Post.author.eq('b'), Post.pid.gte(17),
+                               Post.hits.lt(190))
+    assert [post.pid for post in query.all()] == [17, 18]
+
+
+def test_order_by_local_index(engine, rows):
+    query = (Post.query().where(Post.author.eq('a'))
+             .order_by(Post.score, asc=False).limit(5))
+    scores = [post.score for post in query.all()]
+    assert scores == sorted((row['score'] for row in of(rows, 'a')),
+                            reverse=True)[:5]
+    with pytest.raises(FieldValidationException):
+        Post.query().order_by(Post.title)
+
+
+def test_plan_uses_the_table_range_key(rows):
+    plan = Post.query().where(Post.author.eq('a'), Post.pid.gt(3)).plan()
+    assert (plan.index_name, plan.key_conditions, plan.filters) == (
+        None, ['author', 'pid'], [])
+    plan = Post.query().where(Post.author.eq('a'), Post.hits.gt(3)).plan()
+    assert (plan.index_name, plan.key_conditions, plan.filters) == (
+        None, ['author'], ['hits'])
+
+
+def test_two_conditions_on_the_range_key(engine, rows):
+    query = Post.query().where(Post.author.eq('a'), Post.pid.gt(10),
+                               Post.pid.lt(14))
+    assert [post.pid for post in query.all()] == [11, 12, 13]
+    plan = query.plan()
+    assert (plan.key_conditions, plan.filters) == (['author', 'pid'], ['pid'])
+
+
+def test_two_conditions_on_a_local_index(engine, rows):
+    query = (Post.query().where(Post.author.eq('a'), Post.score.between(3, 20),
+                                Post.score.gt(5), Post.score.lt(8))
+             .order_by(Post.score))
+    assert [post.score for post in query.all()] == sorted(
+        row['score'] for row in of(rows, 'a') if 5 < row['score'] < 8)
+    plan = query.plan()
+    assert (plan.index_name, plan.key_conditions, plan.filters) == (
+        'posts_ix_score', ['author', 'score'], ['score', 'score'])
+
+
+def test_where_on_a_local_index(engine, rows, monkeypatch):
+    sent = []
+    table = type(Post._table())
+    query_table = table.query
+
+    def spy(self, **params):
+        sent.append(params)
+        return query_table(self, **params)
+    monkeypatch.setattr(table, 'query', spy)
+    query = Post.query().where(Post.author.eq('a'), Post.score.between(5, 30))
+    plan = query.plan()
+    assert (plan.index_name, plan.key_conditions, plan.filters) == (
+        'posts_ix_score', ['author', 'score'], [])
+    assert [post.score for post in query.all()] == sorted(
+        row['score'] for row in of(rows, 'a') if 5 <= row['score'] <= 30)
+    assert sent[0]['IndexName'] == 'posts_ix_score'
+
+
+def test_any_order_relaxes_order_by(engine, rows):
+    query = (Post.query()
+             .where(Post.author.eq('a'), Post.score.between(5, 30))
+             .order_by(Post.pid, asc=False))
+    plan = query.plan()
+    assert (plan.index_name, plan.filters) == (None, ['score'])
+    assert plan.reason == 'order_by(pid)'
+    assert [post.pid for post in query.all()] == [
+        row['pid'] for row in reversed(of(rows, 'a'))
+        if 5 <= row['score'] <= 30]
+    plan = query.any_order.plan()
+    assert (plan.index_name, plan.key_conditions) == (
+        'posts_ix_score', ['author', 'score'])
+    assert [post.score for post in query.any_order.all()] == sorted(
+        (row['score'] for row in of(rows, 'a') if 5 <= row['score'] <= 30),
+        reverse=True)
+    assert query.count() == len(list(query.all()))
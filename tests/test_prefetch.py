@@ -0,0 +1,20 @@
+#! -*- coding: utf-8 -*-
+import pytest
+
+from .models import Post, posts
+
+
+@pytest.fixture
+def rows():
+    rows = posts()
+    Post.batch_write(rows)
+    return rows
+
+
+def test_prefetch(engine, rows):
+    query = Post.query().where(Post.author.eq('c')).prefetch(2)
+    assert [post.pid for post in query.all()] == list(range(20))
+    iterator = query.iter()
+    next(iterator)
+    iterator.close()
+    assert len(list(Post.query().scan.prefetch(1).all())) == 60
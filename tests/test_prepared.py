@@ -0,0 +1,52 @@
+#! -*- coding: utf-8 -*-
+import pytest
+
+from dynamodb.expression import bind
+from dynamodb.errors import ParameterException
+
+from .models import Post, posts
+
+
+@pytest.fixture
+def rows():
+    rows = posts()
+    Post.batch_write(rows)
+    return rows
+
+
+def test_prepared_query(engine, rows):
+    prepared = (Post.query()
+                .where(Post.author.eq(bind('author')),
+                       Post.pid.lt(bind('pid')))
+                .prepare())
+    assert [post.pid for post in prepared.all(author='b', pid=3)] == [0, 1, 2]
+    assert prepared.first(author='c', pid=10).author == 'c'
+    assert prepared.count(author='a', pid=5) == 5
+    items, cursor = prepared.page(2, author='a', pid=5)
+    items, _ = prepared.page(2, cursor=cursor, author='a', pid=5)
+    assert [post.pid for post in items] == [2, 3]
+    with pytest.raises(ParameterException):
+        prepared.all(author='a')
+    with pytest.raises(ParameterException):
+        prepared.all(author='a', pid=1, other=2)
+
+
+def test_bind_typecast_by_each_field(rows):
+    number = bind('n')
+    prepared = (Post.query()
+                .where(Post.author.eq(bind('author')), Post.pid.lt(number),
+                       Post.title.gt(number))
+                .prepare())
+    params = prepared.params(author='a', n='5')
+    assert sorted(params['ExpressionAttributeValues'].values()) == [
+        5, u'5', u'a']
+    assert [post.pid for post in prepared.all(author='a', n='5')] == [
+        0, 1, 2, 3, 4]
+
+
+def test_bind_needs_a_prepared_query(rows):
+    query = Post.query().where(Post.author.eq(bind('author')))
+    with pytest.raises(ParameterException):
+        list(query.all())
+    with pytest.raises(ParameterException):
+        query.count()
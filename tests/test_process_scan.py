@@ -0,0 +1,41 @@
+#! -*- coding: utf-8 -*-
+import operator
+
+import pytest
+
+from dynamodb.errors import ParameterException
+
+from .models import Post, posts
+
+
+@pytest.fixture
+def rows():
+    rows = posts(authors=('a', 'b', 'c', 'd', 'e', 'f'), count=10)
+    Post.batch_write(rows)
+    return rows
+
+
+def test_process_scan(engine, rows):
+    titles = Post.scan(segments=3, processes=2, map=lambda post: post.title)
+    assert sorted(titles) == sorted(row['title'] for row in rows)
+    dropped = Post.scan(segments=2, processes=2,
+                        map=lambda post: post.pid if post.pid > 7 else None)
+    assert sorted(dropped) == [8] * 6 + [9] * 6
+    total = Post.scan(segments=3, processes=2, map=lambda post: post.hits,
+                      reduce=operator.add, initial=0).aggregate()
+    assert total == sum(row['hits'] for row in rows)
+
+
+def test_process_scan_aggregate_from_initial(engine, rows):
+    count = Post.scan(segments=3, processes=2, map=lambda post: 1,
+                      reduce=operator.add, initial=100).aggregate()
+    assert count == 160
+    pids = Post.scan(segments=2, processes=2, map=lambda post: [post.pid],
+                     reduce=operator.add, initial=[]).aggregate()
+    assert sorted(pids) == sorted(row['pid'] for row in rows)
+    assert Post.scan(processes=2, map=lambda post: post.hits,
+                     reduce=max).aggregate() == 90
+    with pytest.raises(ParameterException):
+        Post.scan(processes=2).aggregate()
+    with pytest.raises(ParameterException):
+        Post.scan(segments=0, processes=2)
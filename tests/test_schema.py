@@ -0,0 +1,23 @@
+#! -*- coding: utf-8 -*-
+from dynamodb import connection
+from dynamodb.table import get_table
+
+from .models import Post
+
+
+def test_schema_is_built_once():
+    schema = Post._schema
+    assert Post()._schema is schema
+    assert schema.key_names == ('author', 'pid')
+    assert schema.key_schema == [
+        {'AttributeName': 'author', 'KeyType': 'HASH'},
+        {'AttributeName': 'pid', 'KeyType': 'RANGE'}]
+    # a copy: boto3 may keep what it is given
+    assert schema.params('key_schema') is not schema.key_schema
+
+
+def test_table_handles_are_reused():
+    handle = get_table(Post()).table
+    assert get_table(Post(author='a')).table is handle
+    connection.disconnect()
+    assert get_table(Post()).table is not handle
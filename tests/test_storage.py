@@ -0,0 +1,18 @@
+#! -*- coding: utf-8 -*-
+from datetime import datetime
+from decimal import Decimal
+
+from .models import Post
+
+
+def test_storage_functions():
+    assert Post._fields_by_name['score'] is Post.score
+    post = Post(author='a', pid=1, score=1.5, created=datetime(2020, 1, 2))
+    item = Post._to_storage(post)
+    assert item['score'] == Decimal('1.5')
+    # defaults are stored, None values are not
+    assert item['hits'] == 0 and 'title' not in item
+    values = Post._from_storage(dict(item, unknown=1))
+    assert values['score'] == 1.5
+    assert values['created'].date() == datetime(2020, 1, 2).date()
+    assert 'unknown' not in values
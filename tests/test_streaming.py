@@ -0,0 +1,44 @@
+#! -*- coding: utf-8 -*-
+import pytest
+
+from .models import Post, posts
+
+
+@pytest.fixture
+def rows():
+    rows = posts()
+    Post.batch_write(rows)
+    return rows
+
+
+def test_iter_follows_every_page(engine, rows):
+    query = Post.query().where(Post.author.eq('a'))
+    assert [post.pid for post in query.all()] == list(range(20))
+    assert [post.pid for post in query.limit(7).all()] == list(range(7))
+    assert query.first().pid == 0
+
+
+def test_start_key_resumes(engine, rows):
+    iterator = Post.query().where(Post.author.eq('a')).iter()
+    first = [next(iterator).pid for _ in range(7)]
+    key = iterator.last_evaluated_key
+    rest = Post.query().where(Post.author.eq('a')).start_key(**key).all()
+    assert first + [post.pid for post in rest] == list(range(20))
+
+
+def test_start_key_of_a_projection(engine, rows):
+    query = Post.query(Post.title).where(Post.author.eq('a'))
+    iterator = query.limit(7).iter()
+    assert [post.title for post in iterator] == [
+        u'a %d' % pid for pid in range(7)]
+    rest = query.start_key(**iterator.last_evaluated_key).all()
+    assert [post.pid for post in rest] == list(range(7, 20))
+    assert all(post.score is None for post in rest)
+
+
+def test_scan(engine, rows):
+    assert len(list(Post.scan())) == 60
+    titles = sorted(post.title for post in Post.scan(Post.hits.gte(80)))
+    assert titles == sorted(row['title'] for row in rows
+                            if row['hits'] >= 80)
+    assert len(list(Post.query().scan.limit(7).all())) == 7
@@ -0,0 +1,63 @@
+#! -*- coding: utf-8 -*-
+import pytest
+
+from dynamodb.errors import FieldValidationException
+
+from .models import Post, Article, posts, articles, of
+
+
+@pytest.fixture
+def rows():
+    rows = posts()
+    Post.batch_write(rows)
+    return rows
+
+
+def test_values(engine, rows):
+    query = Post.query().where(Post.author.eq('a'), Post.pid.lt(3))
+    assert list(query.values(Post.title, 'hits').all()) == [
+        {'title': u'a 0', 'hits': 0}, {'title': u'a 1', 'hits': 10},
+        {'title': u'a 2', 'hits': 20}]
+    assert list(query.values_list(Post.pid, Post.score).all()) == [
+        (row['pid'], row['score']) for row in of(rows, 'a')[:3]]
+    assert list(query.values_list(Post.hits, flat=True).all()) == [0, 10, 20]
+    values = query.values().first()
+    assert values['tags'] == ['a'] and values['extra'] == {'n': 0}
+    with pytest.raises(FieldValidationException):
+        query.values_list()
+    with pytest.raises(FieldValidationException):
+        query.values_list(Post.pid, Post.hits, flat=True)
+    with pytest.raises(FieldValidationException):
+        query.values('nope')
+
+
+def test_projection_of_reserved_words(engine):
+    Article.batch_write(articles())
+    query = Article.query().where(Article.uid.eq('u1'), Article.aid.lt(10))
+    assert list(query.values_list(Article.aid, Article.year).all()) == [
+        (1, 2001), (4, 2004), (7, 2002)]
+    assert [(article.year, article.body) for article in
+            Article.query(Article.year).where(Article.uid.eq('u1'),
+                                              Article.aid.lt(5)).all()] == [
+        (2001, None), (2004, None)]
+    assert Article.query(Article.year).get(uid='u1', aid=4) == {'year': 2004}
+
+
+def test_values_pages(engine, rows):
+    query = Post.query().where(Post.author.eq('b')).values(Post.hits)
+    items, cursor = query.page(4)
+    items2, _ = query.page(4, cursor=cursor)
+    assert items + items2 == [{'hits': pid * 10} for pid in range(8)]
+
+
+def test_values_fan_out(engine, rows):
+    query = (Post.query().where(Post.author.is_in(['a', 'b']))
+             .values_list(Post.pid, flat=True).limit(5))
+    assert list(query.all()) == [0, 0, 1, 1, 2]
+
+
+def test_batch_get_raw(engine, rows):
+    values = Post.batch_get(dict(author='a', pid=1), dict(author='z', pid=1),
+                            raw=True)
+    assert values[1] is None
+    assert values[0]['title'] == u'a 1' and values[0]['hits'] == 10